@@ -0,0 +1,275 @@
+"""Пакетная оценка тендерной документации из каталогов и архивов.
+
+Запуск: python batch_score.py ПУТЬ [ПУТЬ ...] [-o results.jsonl] [--parquet results.parquet]
+                              [--workers N] [--batch 64] [--chunked]
+                              [--duplicates flag|reuse|off] [--metrics stages.json] [--profile-dir каталог]
+ПУТЬ — файл PDF/DOCX, каталог (обходится рекурсивно, вложенные архивы
+тоже) или архив .zip, .tar, .tar.gz/.tgz. Документы разбираются в пуле
+процессов, а тексты оцениваются пачками через predict_batch: эмбеддер
+кодирует одну пачку, пока пул разбирает следующие файлы. На документ —
+строка JSONL с результатом и временем разбора и оценки; --parquet
+дополнительно пишет плоскую таблицу (нужен pyarrow).
+
+Каждый документ проверяется на почти полные копии уже принятых
+(near_duplicates, индекс TENDERAI_DUPLICATES_DB): в записи — поле
+near_duplicate с найденной копией и кластером шаблона. С --duplicates
+reuse копии не оцениваются заново: берётся сохранённый результат
+оригинала (из прошлых запусков или из этого же), запись помечается
+reused_from.
+
+--metrics включает замеры стадий (stage_metrics): в записи документа —
+поле timings, а в конце в файл пишутся гистограммы стадий за весь запуск.
+--profile-dir сохраняет профили cProfile самых медленных пачек.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from document_text import SUPPORTED_EXTENSIONS, extract_text
+import stage_metrics
+from near_duplicates import DUPLICATES_DB_PATH, DuplicateIndex, signature
+from predictor import predict_batch
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet — по желанию, JSONL пишется всегда
+    pyarrow = None
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def _supported(name):
+    return name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def _iter_archive(path):
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _supported(info.filename):
+                    yield f"{path}!{info.filename}", archive.read(info)
+        return
+    with tarfile.open(path) as archive:
+        for member in archive:
+            if member.isfile() and _supported(member.name):
+                yield f"{path}!{member.name}", archive.extractfile(member).read()
+
+
+def iter_documents(paths):
+    """
+    Документы по путям: (метка, путь или байты). Файлы передаются путём —
+    их читает воркер; члены архивов читаются здесь по порядку и
+    передаются байтами (tar.gz не читается вразброс).
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    if _supported(name):
+                        yield full, full
+                    elif name.lower().endswith(ARCHIVE_EXTENSIONS):
+                        yield from _iter_archive(full)
+        elif path.lower().endswith(ARCHIVE_EXTENSIONS):
+            yield from _iter_archive(path)
+        elif _supported(path):
+            yield path, path
+        else:
+            print(f"пропущен {path}: неизвестный формат", file=sys.stderr)
+
+
+def parse_document(label, source, with_signature=False):
+    """
+    Разбор одного документа в воркере: {"path", "text", "parse_seconds",
+    "error", "signature"}. Подпись MinHash считается здесь же, в пуле, если
+    with_signature.
+    """
+    start = time.perf_counter()
+    try:
+        text, error = extract_text(source, name=label), None
+    except Exception as e:  # битый файл не должен останавливать весь пакет
+        text, error = "", f"{type(e).__name__}: {e}"
+    sig = signature(text) if with_signature and text else None
+    return {"path": label, "text": text, "parse_seconds": time.perf_counter() - start, "error": error, "signature": sig}
+
+
+def parse_all(documents, workers, window, with_signature=False):
+    """
+    Разобранные документы по мере готовности (порядок не сохраняется).
+    В работе одновременно не больше window документов, поэтому память
+    не растёт с размером архива.
+    """
+    # spawn, а не fork: к моменту запуска новых воркеров в главном
+    # процессе уже работают потоки torch, и fork может их заблокировать
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = set()
+        for label, source in documents:
+            pending.add(pool.submit(parse_document, label, source, with_signature))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from (future.result() for future in done)
+
+
+def score_documents(parsed, batch_size=32, chunked=False, duplicates=None, reuse=False):
+    """
+    Оценивает пачку разобранных документов одним predict_batch. Время
+    оценки делится поровну между оценёнными документами пачки. duplicates —
+    DuplicateIndex: документы проверяются и добавляются в него, результаты
+    оценки сохраняются; при reuse копии с известным результатом (или
+    оригиналом в этой же пачке) не оцениваются.
+    """
+    ok = [doc for doc in parsed if not doc["error"] and doc["text"].strip()]
+    checks, sources, to_score, scoring = {}, {}, [], {}
+    for doc in ok:
+        check = duplicates.check(doc["text"], name=doc["path"], sig=doc.get("signature")) if duplicates else None
+        checks[id(doc)] = check
+        if reuse and check:
+            # Тот же текст — свой прошлый результат, иначе — результат лучшей копии
+            source = check["key"] if check["known"] else (check["duplicate_of"] or {}).get("key")
+            if source in scoring or (source and duplicates.result(source) is not None):
+                sources[id(doc)] = source
+                continue
+        to_score.append(doc)
+        if check:
+            scoring[check["key"]] = doc
+    start = time.perf_counter()
+    texts = [doc["text"] for doc in to_score]
+    with stage_metrics.profiled(texts):
+        paths = [doc["path"] for doc in to_score]
+        results = predict_batch(texts, batch_size=batch_size, chunked=chunked, sources=paths) if texts else []
+    per_doc = (time.perf_counter() - start) / max(len(to_score), 1)
+    by_doc = {id(doc): result for doc, result in zip(to_score, results)}
+    for doc, result in zip(to_score, results):
+        result.pop("requirement_labels", None)  # одинаковые подписи для всех документов
+        if checks[id(doc)]:
+            duplicates.set_result(checks[id(doc)]["key"], result)
+    records = []
+    for doc in parsed:
+        source = sources.get(id(doc))
+        if source is None:
+            result = by_doc.get(id(doc))
+        else:
+            result = duplicates.result(source)
+        check = checks.get(id(doc))
+        records.append({
+            "path": doc["path"],
+            "error": doc["error"] or (None if result else "пустой текст"),
+            "chars": len(doc["text"]),
+            "parse_seconds": round(doc["parse_seconds"], 4),
+            "score_seconds": round(per_doc, 4) if id(doc) in by_doc else None,
+            "near_duplicate": {name: value for name, value in check.items() if name != "key"} if check else None,
+            "reused_from": source,
+            "result": result,
+        })
+    return records
+
+
+def score_stream(parsed, batch=64, encode_batch=32, chunked=False, duplicates=None, reuse=False):
+    """Записи результатов по мере оценки пачек по batch документов из parsed."""
+    pending = []
+    for doc in parsed:
+        pending.append(doc)
+        if len(pending) >= batch:
+            yield from score_documents(pending, encode_batch, chunked, duplicates, reuse)
+            pending = []
+    if pending:
+        yield from score_documents(pending, encode_batch, chunked, duplicates, reuse)
+
+
+def parquet_row(record):
+    """Плоская строка для Parquet: основные показатели плюс полный результат в JSON."""
+    result = record["result"] or {}
+    return {
+        "path": record["path"],
+        "error": record["error"],
+        "chars": record["chars"],
+        "parse_seconds": record["parse_seconds"],
+        "score_seconds": record["score_seconds"],
+        "risk_score": result.get("risk_score"),
+        "level": result.get("level"),
+        "anomaly": result.get("components", {}).get("Аномальность текста"),
+        "legal_level": result.get("legal_summary", {}).get("level"),
+        "legal_violations": result.get("legal_summary", {}).get("count"),
+        "winner_risk": result.get("winners", {}).get("risk_level"),
+        "duplicate_of": ((record["near_duplicate"] or {}).get("duplicate_of") or {}).get("name"),
+        "template_cluster": (record["near_duplicate"] or {}).get("cluster"),
+        "reused_from": record["reused_from"],
+        "result_json": json.dumps(result, ensure_ascii=False) if result else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="файлы, каталоги или архивы с тендерами")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="файл JSONL с результатами")
+    parser.add_argument("--parquet", help="дополнительно записать таблицу Parquet")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="процессов разбора")
+    parser.add_argument("--batch", type=int, default=64, help="документов в одной пачке predict_batch")
+    parser.add_argument("--encode-batch", type=int, default=32, help="батч эмбеддера внутри пачки")
+    parser.add_argument("--chunked", action="store_true", help="оценивать длинные документы по окнам")
+    parser.add_argument(
+        "--duplicates", choices=("flag", "reuse", "off"), default="flag",
+        help="почти полные копии: только отмечать, брать результат оригинала или не искать",
+    )
+    parser.add_argument("--duplicates-db", default=DUPLICATES_DB_PATH, help="индекс копий (по умолчанию TENDERAI_DUPLICATES_DB)")
+    parser.add_argument("--metrics", help="записать сюда гистограммы стадий (JSON) и добавить timings в записи")
+    parser.add_argument("--profile-dir", help="сохранять профили самых медленных пачек сюда")
+    args = parser.parse_args()
+    if args.parquet and pyarrow is None:
+        parser.error("для --parquet нужен pyarrow: pip install pyarrow")
+    if args.metrics or args.profile_dir:
+        # Режим memory, если он задан в окружении, сохраняется
+        stage_metrics.configure("memory" if os.environ.get("TENDERAI_STAGE_METRICS") == "memory" else "1", args.profile_dir)
+
+    rows = [] if args.parquet else None
+    duplicates = DuplicateIndex(args.duplicates_db) if args.duplicates != "off" else None
+    totals = {"documents": 0, "errors": 0, "duplicates": 0, "reused": 0, "parse_seconds": 0.0, "score_seconds": 0.0}
+    start = last_report = time.perf_counter()
+    # Пул успевает разобрать следующую пачку, пока оценивается текущая
+    parsed = parse_all(iter_documents(args.paths), args.workers, window=2 * max(args.batch, args.workers), with_signature=duplicates is not None)
+    with open(args.output, "w", encoding="utf-8") as out:
+        for record in score_stream(parsed, args.batch, args.encode_batch, args.chunked, duplicates, args.duplicates == "reuse"):
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            totals["documents"] += 1
+            totals["errors"] += record["error"] is not None
+            check = record["near_duplicate"] or {}
+            totals["duplicates"] += bool(check.get("known") or check.get("duplicate_of"))
+            totals["reused"] += record["reused_from"] is not None
+            totals["parse_seconds"] += record["parse_seconds"]
+            totals["score_seconds"] += record["score_seconds"] or 0.0
+            if rows is not None:
+                rows.append(parquet_row(record))
+            now = time.perf_counter()
+            if now - last_report >= 5.0:
+                print(f"{totals['documents']:,} документов, {totals['documents'] / (now - start):.1f} док/с", file=sys.stderr)
+                last_report = now
+
+    if rows is not None:
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), args.parquet)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            json.dump(stage_metrics.summary(), f, ensure_ascii=False, indent=2)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{totals['documents']:,} документов ({totals['errors']} с ошибками, {totals['duplicates']} копий, "
+        f"{totals['reused']} без повторной оценки) за {elapsed:.1f} с — "
+        f"{totals['documents'] / max(elapsed, 1e-9):.1f} док/с; разбор {totals['parse_seconds']:.1f} с "
+        f"суммарно на {args.workers} процессах, оценка {totals['score_seconds']:.1f} с",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
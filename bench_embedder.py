@@ -0,0 +1,101 @@
+"""Сравнение бэкендов эмбеддера: точность оценки аномальности и скорость.
+
+Запуск: python bench_embedder.py [ПУТЬ ...] [--backends torch,onnx,onnx-int8]
+                                 [--docs 300] [--batch 32] [--tolerance 1.0]
+Эталонный корпус — синтетические тендеры разной длины (в том числе
+длиннее лимита токенов) плюс документы PDF/DOCX из ПУТЕЙ. Каждый бэкенд
+кодирует корпус мимо кэша эмбеддингов; аномальность по IsolationForest
+(0–100, как в result["components"]) сравнивается с первым бэкендом
+списка. Расхождение больше tolerance пунктов хотя бы на одном документе —
+ошибка. Итоговый риск меняется на десятую часть этого расхождения.
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from batch_score import iter_documents
+from document_text import extract_text
+from predictor import EMBEDDER_BACKENDS, get_model, get_scaler, load_embedder
+
+FRAGMENTS = [
+    "Ноутбук строго Dell XPS 13 артикул 9310-2021.",
+    "Поставка в течение 1 рабочего дня.",
+    "Исключительно авторизованный дилер Dell Technologies уровня Gold.",
+    "Экран 15.6 дюйма, разрешение 1920x1080, вес 2,5 кг.",
+    "Поставщик ТОО ТехноПарк Астана, БИН 123456789012.",
+    "Модель HP ProBook 450-G9, аналоги не принимаются.",
+    "Бумага офисная формата А4, плотность 80 г/м2, белизна не менее 146%.",
+    "Срок поставки 30 календарных дней с момента заключения договора.",
+    "Требования к товару описаны в техническом задании без ограничений конкуренции.",
+    "Тауарды жеткізу мерзімі шарт жасалған күннен бастап 30 күнтізбелік күн.",
+    "Поставщик обязан предоставить сертификат соответствия и гарантию 12 месяцев.",
+]
+
+
+def reference_corpus(n, paths=(), seed=0):
+    rng = random.Random(seed)
+    corpus = [" ".join(rng.choice(FRAGMENTS) for _ in range(rng.choice((1, 3, 8, 40)))) for _ in range(n)]
+    for label, source in iter_documents(paths):
+        text = extract_text(source, name=label)
+        if text.strip():
+            corpus.append(text)
+    return corpus
+
+
+def anomaly(vecs):
+    """Аномальность в пунктах 0–100 — как в predictor.anomaly_scores, но без кэша."""
+    raw = get_model().decision_function(vecs)
+    return get_scaler().transform(-raw.reshape(-1, 1))[:, 0] * 100
+
+
+def measure(backend, corpus, batch):
+    embedder = load_embedder(backend)
+    embedder.encode(corpus[:batch], batch_size=batch)  # прогрев: аллокации и ленивые инициализации
+    start = time.perf_counter()
+    vecs = np.asarray(embedder.encode(corpus, batch_size=batch), dtype=np.float32)
+    return vecs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="документы или каталоги для эталонного корпуса")
+    parser.add_argument("--backends", default=",".join(EMBEDDER_BACKENDS), help="первый — эталон")
+    parser.add_argument("--docs", type=int, default=300, help="синтетических документов")
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--tolerance", type=float, default=1.0, help="допустимое расхождение аномальности, пунктов")
+    args = parser.parse_args()
+    backends = args.backends.split(",")
+    for backend in backends:
+        if backend not in EMBEDDER_BACKENDS:
+            parser.error(f"неизвестный бэкенд {backend!r}, есть: {', '.join(EMBEDDER_BACKENDS)}")
+
+    corpus = reference_corpus(args.docs, args.paths)
+    print(f"корпус: {len(corpus)} документов, {sum(map(len, corpus)) / 1e6:.1f} МБ текста")
+    reference, failed = None, []
+    for backend in backends:
+        vecs, elapsed = measure(backend, corpus, args.batch)
+        scores = anomaly(vecs)
+        line = f"{backend:>10}: {len(corpus) / elapsed:8.1f} текстов/с"
+        if reference is None:
+            reference = (backend, vecs, scores, elapsed)
+            print(line + "  (эталон)")
+            continue
+        ref_backend, ref_vecs, ref_scores, ref_elapsed = reference
+        diff = np.abs(scores - ref_scores)
+        cosine = (vecs * ref_vecs).sum(axis=1) / (np.linalg.norm(vecs, axis=1) * np.linalg.norm(ref_vecs, axis=1))
+        print(
+            f"{line}  x{ref_elapsed / elapsed:.2f} к {ref_backend}  косинус мин {cosine.min():.4f}  "
+            f"аномальность: макс ±{diff.max():.2f}, сред ±{diff.mean():.3f} пункта"
+        )
+        if diff.max() > args.tolerance:
+            failed.append(f"{backend}: документ {int(diff.argmax())} расходится на {diff.max():.2f} пункта")
+    if failed:
+        sys.exit("ПРЕВЫШЕН ДОПУСК " + str(args.tolerance) + ": " + "; ".join(failed))
+    print(f"OK: аномальность всех бэкендов в пределах ±{args.tolerance} пункта от {reference[0]}")
+
+
+if __name__ == "__main__":
+    main()
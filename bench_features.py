@@ -0,0 +1,100 @@
+"""Бенчмарк extract_features: исходная реализация против скомпилированной.
+
+Запуск: python bench_features.py [--mb 3]
+Сначала проверяет, что обе версии дают одинаковый словарь признаков на
+наборе синтетических документов, затем замеряет время на тексте в N МБ.
+"""
+import argparse
+import random
+import re
+import time
+
+from predictor import extract_features
+
+FRAGMENTS = [
+    "Ноутбук строго Dell XPS 13 артикул 9310-2021.",
+    "Поставка в течение 1 рабочего дня.",
+    "Исключительно авторизованный дилер Dell Technologies уровня Gold.",
+    "Оперативная память строго Hynix DDR4 32GB артикул HMA82GR7CJR4N.",
+    "Экран 15.6 дюйма, разрешение 1920x1080, вес 2,5 кг.",
+    "Программное обеспечение версия 2.1 или выше.",
+    "Поставщик ТОО ТехноПарк Астана, БИН 123456789012.",
+    "ИП Иванов оказывает услуги по доставке.",
+    "Серийный номер SN-44521 указывается в паспорте.",
+    "Модель HP ProBook 450-G9, аналоги не принимаются.",
+    "Официальный представитель производителя обязателен.",
+    "Требования к товару описаны в техническом задании без ограничений.",
+    "Бумага офисная формата А4, плотность 80 г/м2, белизна не менее 146%.",
+    "Срок поставки 30 календарных дней с момента заключения договора.",
+]
+NEUTRAL = "Требования к товару описаны в техническом задании без ограничений конкуренции. "
+
+
+def reference_extract_features(text):
+    """Исходная версия predictor.extract_features — эталон для сравнения."""
+    brand_model_patterns = [
+        r"(Dell|HP|Lenovo|Apple|Samsung|Philips|Siemens|Toyota|BMW|Mercedes)\s+\w+[\s\-]\w+",
+        r"(строго|исключительно|только)\s+[А-ЯA-Z]\w+",
+        r"артикул\s+[\w\-]+",
+        r"серийн\w+\s+номер\s+[\w\-]+",
+        r"модель\s+[A-Z\d][\w\-]+",
+    ]
+    brand_count = sum(len(re.findall(p, text, re.IGNORECASE)) for p in brand_model_patterns)
+    brand_score = min(brand_count / 3, 1.0)
+
+    restriction_words = ["строго","исключительно","только","авторизованный дилер","официальный представитель","аналоги не принимаются"]
+    restriction_score = min(sum(1 for w in restriction_words if w.lower() in text.lower()) / 3, 1.0)
+
+    tight_deadline = bool(re.search(r"(в течени[еи]\s*[1-3]\s*(рабоч|календар)\w+|[1-3]\s*(рабочих|календарных|жұмыс|күнтізбелік)?\s*(дн|день|күн)|за\s*1\s*день|1\s*рабочего\s*дня)", text, re.IGNORECASE))
+
+    precise_patterns = [r"\d+[,.]?\d*\s*(ГГц|МГц|ГБ|МБ|GB|дюйм|мм|кг)", r"версия\s+\d+\.\d+", r"\d{3,}[xX×]\d{3,}", r"артикул\s+[\w\-]{4,}", r"[A-Z]{2,}\d{4,}[\w\-]*"]
+    precise_score = min(sum(len(re.findall(p, text, re.IGNORECASE)) for p in precise_patterns) / 5, 1.0)
+
+    supplier_patterns = [r"ТОО\s+[\w\s]+", r"БИН\s+\d{12}", r"ИП\s+[\w\s]+"]
+    supplier_score = min(sum(len(re.findall(p, text, re.IGNORECASE)) for p in supplier_patterns) / 2, 1.0)
+
+    return {"brand_model": brand_score, "restriction": restriction_score, "tight_deadline": 1.0 if tight_deadline else 0.0, "precise_params": precise_score, "supplier_lock": supplier_score}
+
+
+def random_document(rng):
+    parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 8))]
+    text = " ".join(parts)
+    if rng.random() < 0.5:
+        text = "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+    return text
+
+
+def check_equivalence(n=2000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        doc = random_document(rng)
+        expected, actual = reference_extract_features(doc), extract_features(doc)
+        assert expected == actual, (doc, expected, actual)
+    print(f"OK: {n} документов, признаки совпадают")
+
+
+def timeit(fn, text, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, default=3.0, help="размер тестового текста в МБ")
+    args = parser.parse_args()
+
+    check_equivalence()
+    size = int(args.mb * 1_000_000)
+    rich = (" ".join(FRAGMENTS) + " ") * (size // len(" ".join(FRAGMENTS)))
+    sparse = NEUTRAL * (size // len(NEUTRAL)) + FRAGMENTS[0]
+    for name, text in (("с признаками", rich), ("без признаков", sparse)):
+        old, new = timeit(reference_extract_features, text), timeit(extract_features, text)
+        print(f"{name:>14}: {len(text) / 1e6:.1f} МБ  исходная {old * 1000:8.1f} мс  новая {new * 1000:8.1f} мс  x{old / new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Бенчмарк оценки IsolationForest: sklearn против плоских массивов forest_scorer.
+
+Запуск: python bench_forest.py [--rows 10000] [--repeat 300]
+Сначала проверяет, что decision_function обеих версий побитово совпадает
+на пачке строк и на строках по одной, затем замеряет задержку одной строки
+(как в predict_single) и пропускную способность на пачке rows строк.
+Строки синтетические: каждый признак равномерно в диапазоне порогов леса
+с запасом, чтобы спуск доходил до листьев по обе стороны развилок.
+"""
+import argparse
+import pickle
+import statistics
+import time
+
+import numpy as np
+
+from forest_scorer import FlatIsolationForest
+from predictor import MODEL_PATH
+
+
+def random_rows(flat, n, seed=0):
+    rng = np.random.default_rng(seed)
+    inner = ~np.isnan(flat.threshold)
+    low = np.full(flat.n_features, -1.0)
+    high = np.full(flat.n_features, 1.0)
+    np.minimum.at(low, flat.feature[inner], flat.threshold[inner])
+    np.maximum.at(high, flat.feature[inner], flat.threshold[inner])
+    margin = (high - low) * 0.1
+    return rng.uniform(low - margin, high + margin, (n, flat.n_features)).astype(np.float32)
+
+
+def check_equivalence(forest, flat, X, singles=200):
+    expected, actual = forest.decision_function(X), flat.decision_function(X)
+    assert np.array_equal(expected, actual), np.abs(expected - actual).max()
+    for row in X[:singles]:
+        assert np.array_equal(forest.decision_function(row[None]), flat.decision_function(row[None]))
+    print(f"OK: {len(X)} строк пачкой и {singles} по одной, оценки совпадают побитово")
+
+
+def latency(fn, X, repeat):
+    times = []
+    for i in range(repeat):
+        row = X[i % len(X)][None]
+        start = time.perf_counter()
+        fn(row)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def best_of(fn, X, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="строк в пачке для пропускной способности")
+    parser.add_argument("--repeat", type=int, default=300, help="замеров задержки одной строки")
+    args = parser.parse_args()
+
+    with open(MODEL_PATH, "rb") as f:
+        forest = pickle.load(f)
+    start = time.perf_counter()
+    flat = FlatIsolationForest.from_sklearn(forest)
+    print(
+        f"лес: {len(forest.estimators_)} деревьев, {len(flat.value):,} узлов, глубина {flat.depth}; "
+        f"преобразование {(time.perf_counter() - start) * 1000:.0f} мс"
+    )
+    X = random_rows(flat, args.rows)
+    check_equivalence(forest, flat, X)
+
+    old, new = latency(forest.decision_function, X, args.repeat), latency(flat.decision_function, X, args.repeat)
+    print(f"одна строка: sklearn {old * 1000:8.3f} мс  плоский {new * 1000:8.3f} мс  x{old / new:.1f}")
+    old, new = best_of(forest.decision_function, X), best_of(flat.decision_function, X)
+    print(
+        f"{args.rows:,} строк: sklearn {args.rows / old:9,.0f} строк/с  плоский {args.rows / new:9,.0f} строк/с  x{old / new:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
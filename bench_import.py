@@ -0,0 +1,120 @@
+"""Проверка и бенчмарк импорта выгрузок (import_awards.py) на синтетических файлах.
+
+Запуск: python bench_import.py [--rows 300000]
+Генерирует во временном каталоге выгрузки CSV.gz (разделитель ;, номера
+контрактов) и JSONL (без номеров), с повторами контрактов и разными
+написаниями одного поставщика. Проверяет, что импорт, прерванный
+посередине и продолженный, даёт ту же базу, что и импорт за один раз,
+затем замеряет скорость.
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+
+from import_awards import import_dump
+from winner_store import WinnerStore
+
+FORMS = ['ТОО "{}"', "Товарищество с ограниченной ответственностью «{}»", "{} ТОО", "ЖШС {}"]
+
+
+def write_fixtures(directory, rows, seed=0):
+    rng = random.Random(seed)
+    csv_path = os.path.join(directory, "contracts.csv.gz")
+    jsonl_path = os.path.join(directory, "contracts.jsonl")
+    with gzip.open(csv_path, "wt", encoding="utf-8", newline="") as f_csv, open(jsonl_path, "w", encoding="utf-8") as f_json:
+        writer = csv.writer(f_csv, delimiter=";")
+        writer.writerow(["contract_number_sys", "supplier_name_ru", "supplier_biin", "customer_name_ru", "customer_bin", "contract_sum_wnds", "sign_date", "name_ru"])
+        previous = []
+        for i in range(rows):
+            # Каждая десятая запись — повтор уже выгруженного контракта
+            if previous and rng.random() < 0.1:
+                record = rng.choice(previous)
+            else:
+                supplier = rng.randrange(rows // 20 + 1)
+                customer = rng.randrange(rows // 50 + 1)
+                record = {
+                    "id": f"C-{i}",
+                    "supplier": rng.choice(FORMS).format(f"Поставщик {supplier}"),
+                    "supplier_bin": f"{100000000000 + supplier}",
+                    "customer": f"ГУ Заказчик {customer}",
+                    "customer_bin": f"{900000000000 + customer}",
+                    "amount": f"{rng.randrange(10_000, 50_000_000):,}".replace(",", " ") + ",00",
+                    "date": f"{rng.randint(2015, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    "tender": f"Закупка {i}",
+                }
+                previous = (previous + [record])[-1000:]
+            if i % 2:
+                writer.writerow([record["id"], record["supplier"], record["supplier_bin"], record["customer"], record["customer_bin"], record["amount"], record["date"], record["tender"]])
+            else:
+                f_json.write(json.dumps({k: v for k, v in record.items() if k != "id"}, ensure_ascii=False) + "\n")
+    return [csv_path, jsonl_path]
+
+
+def snapshot(store):
+    store.refresh_aggregates()
+    with store._lock:
+        rows = store._conn.execute(
+            "SELECT s.name, s.bin, st.wins, st.total_amount, st.streak FROM supplier_stats st JOIN suppliers s ON s.id = st.supplier_id ORDER BY s.bin"
+        ).fetchall()
+    return store.stats(), [tuple(row) for row in rows]
+
+
+class Interrupted(Exception):
+    pass
+
+
+def check_resume(paths, directory):
+    clean = WinnerStore(os.path.join(directory, "clean.sqlite"))
+    for path in paths:
+        import_dump(path, clean, batch_size=1000, progress=None)
+    expected = snapshot(clean)
+
+    resumed = WinnerStore(os.path.join(directory, "resumed.sqlite"))
+    calls = []
+
+    def crash(stats):
+        calls.append(stats["rows"])
+        if len(calls) == 3:
+            raise Interrupted
+    for path in paths:
+        try:
+            import_dump(path, resumed, batch_size=1000, progress=crash, progress_every=0)
+        except Interrupted:
+            pass
+        stats = import_dump(path, resumed, batch_size=1000, progress=None)
+        assert stats["resumed_from"] or len(calls) > 3, stats
+    assert snapshot(resumed) == expected
+    assert expected[0]["suppliers"] == len({row[1] for row in expected[1]}), "одному БИН — один поставщик"
+    clean.close()
+    resumed.close()
+    print(f"OK: прерванный и продолженный импорт совпадает с обычным: {expected[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=300_000, help="записей в выгрузках")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_resume(write_fixtures(tmp, 20_000, seed=1), tmp)
+
+        paths = write_fixtures(tmp, args.rows)
+        store = WinnerStore(os.path.join(tmp, "bench.sqlite"))
+        start = time.perf_counter()
+        # Как import_awards.py в пустую базу: без агрегатов, затем один проход
+        total = sum(import_dump(path, store, progress=None, update_aggregates=False)["rows"] for path in paths)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        store.refresh_aggregates()
+        refresh = time.perf_counter() - start
+        print(f"{total:,} записей за {elapsed:.1f} с — {total / elapsed:,.0f} строк/с, агрегаты {refresh:.1f} с; {store.stats()}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
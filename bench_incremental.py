@@ -0,0 +1,110 @@
+"""Бенчмарк инкрементального анализа: полный проход против повторного анализа правки.
+
+Запуск: python bench_incremental.py [--sentences 8000] [--edit 0.01] [--repeat 3]
+Строит длинный черновик из типовых предложений тендера, затем правит его
+два раза: одним куском в середине (доля --edit предложений подряд, как
+переписанный раздел) и в пяти местах по одному предложению. Для каждой
+версии сравнивает predict_incremental с predict_single — результаты
+обязаны совпасть (кроме «похожих» и служебных полей incremental и
+timings) — и печатает время полного прохода, первого инкрементального
+(кэш сегментов пуст; на 8000 предложений — около 5 полных проходов) и
+повторного после правки (около 1% текста — 15–25% полного прохода).
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import predictor
+from incremental import predict_incremental, segment_spans
+
+SENTENCES = [
+    "Ноутбук строго Dell XPS 13 артикул 9310-2021.",
+    "Поставка в течение 1 рабочего дня.",
+    "Исключительно авторизованный дилер Dell Technologies уровня Gold.",
+    "Экран 15.6 дюйма, разрешение 1920x1080, вес 2,5 кг.",
+    "Поставщик ТОО ТехноПарк Астана, БИН 123456789012.",
+    "Бумага офисная формата А4, плотность 80 г/м2, белизна не менее 146%.",
+    "Срок поставки 30 календарных дней с момента заключения договора.",
+    "Требования к товару описаны в техническом задании без ограничений конкуренции.",
+    "Поставщик обязан предоставить сертификат соответствия и гарантию 12 месяцев.",
+    "Опыт работы не менее 3 лет на рынке компьютерной техники.",
+    "Цена за единицу: 850 000 тенге.",
+    "Количество: 15 единиц.",
+    # Совпадения через «. Заглавная»: такая граница сегмента недопустима
+    "Ноутбук арт. XPS 9310-2021.",
+    "Память 16. ГБ DDR4.",
+    "Цена 1 000. Тенге за единицу.",
+    "Поставщик ТОО ТехноПарк. Астана выиграл прошлую закупку.",
+]
+
+
+def draft(count, rng):
+    return [f"Пункт {i + 1}. {rng.choice(SENTENCES)}" for i in range(count)]
+
+
+def comparable(result):
+    result = json.loads(json.dumps(result, ensure_ascii=False, default=str))
+    result.pop("similar", None)
+    result.pop("incremental", None)
+    result.pop("timings", None)
+    return result
+
+
+def timed(fn, text, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sentences", type=int, default=8000)
+    parser.add_argument("--edit", type=float, default=0.01, help="доля предложений в правке одним куском")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    original = draft(args.sentences, rng)
+    block = max(1, int(args.edit * args.sentences))
+    middle = args.sentences // 2
+    one_place = original[:middle] + draft(block, rng) + original[middle + block:]
+    scattered = list(original)
+    for i in rng.sample(range(args.sentences), 5):
+        scattered[i] = f"Пункт {i + 1}. Изменено: {rng.choice(SENTENCES)}"
+
+    text = " ".join(original)
+    predictor.warmup()
+    # Первый анализ черновика: кэш сегментов пуст
+    start = time.perf_counter()
+    first = predict_incremental(text)
+    cold = time.perf_counter() - start
+    full_result, full = timed(predictor.predict_single, text, args.repeat)
+    assert comparable(first) == comparable(full_result), "первый инкрементальный проход разошёлся с полным"
+    print(f"черновик: {len(text):,} символов, {len(segment_spans(text))} сегментов")
+    print(f"полный проход {full * 1000:8.1f} мс;  инкрементальный с пустым кэшем {cold * 1000:8.1f} мс — x{cold / full:.1f}")
+
+    for name, sentences in (
+        (f"правка {block} предложений подряд", one_place),
+        ("правка 5 предложений вразброс", scattered),
+    ):
+        edited = " ".join(sentences)
+        start = time.perf_counter()
+        result = predict_incremental(edited)
+        again = time.perf_counter() - start
+        expected, full = timed(predictor.predict_single, edited, args.repeat)
+        assert comparable(result) == comparable(expected), f"{name}: результат разошёлся с полным проходом"
+        info = result["incremental"]
+        print(
+            f"{name}: пересчитано {info['segments'] - info['reused']} из {info['segments']} сегментов, "
+            f"{again * 1000:.1f} мс — {again / full:.1%} полного прохода ({full * 1000:.1f} мс)"
+        )
+    print("OK: результаты инкрементального анализа совпадают с predict_single")
+
+
+if __name__ == "__main__":
+    main()
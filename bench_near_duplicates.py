@@ -0,0 +1,96 @@
+"""Бенчмарк поиска копий: цена проверки документа и точность MinHash/LSH.
+
+Запуск: python bench_near_duplicates.py [--documents 20000] [--words 800] [--templates 500]
+Строит индекс во временном файле из синтетических документов: каждый —
+один из templates шаблонов с заполненными полями (8 мест по 15 слов —
+разные закупки по одному шаблону). Затем проверяет слегка
+отредактированные копии принятых документов (3 правки по 5 слов) и совсем
+новые тексты: копия обязана найти свой оригинал, новый текст не должен
+получить ни копии, ни шаблона.
+Печатает время подписи и проверки на документ и сравнивает оценку
+сходства с точным коэффициентом Жаккара по шинглам.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from near_duplicates import DUPLICATE_MIN, DuplicateIndex, shingles, signature, similarity
+
+VOCABULARY = [f"слово{i}" for i in range(20000)]
+
+
+def fill(words, starts, length, rng):
+    """Копия words, в которой заменены length слов с каждой позиции starts."""
+    words = list(words)
+    for start in starts:
+        words[start:start + length] = [rng.choice(VOCABULARY) for _ in range(length)]
+    return words
+
+
+def jaccard(first, second):
+    first, second = set(shingles(first).tolist()), set(shingles(second).tolist())
+    return len(first & second) / len(first | second)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=800)
+    parser.add_argument("--templates", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    templates = [[rng.choice(VOCABULARY) for _ in range(args.words)] for _ in range(args.templates)]
+    # Поля шаблона стоят на своих местах
+    fields = [sorted(rng.sample(range(0, args.words - 15, 15), 8)) for _ in range(args.templates)]
+    path = os.path.join(tempfile.mkdtemp(prefix="tenderai-dup-bench-"), "duplicates.sqlite")
+    index = DuplicateIndex(path)
+    texts, sign_times, check_times = [], [], []
+    start = time.perf_counter()
+    for i in range(args.documents):
+        text = " ".join(fill(templates[i % args.templates], fields[i % args.templates], 15, rng))
+        texts.append(text)
+        t = time.perf_counter()
+        sig = signature(text)
+        sign_times.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        index.check(text, name=str(i), sig=sig)
+        check_times.append(time.perf_counter() - t)
+    stats = index.stats()
+    print(f"приём: {args.documents:,} документов за {time.perf_counter() - start:.1f} с; {stats}")
+
+    found, errors = 0, []
+    for i in rng.sample(range(args.documents), args.queries):
+        copy = " ".join(fill(texts[i].split(), rng.sample(range(args.words - 5), 3), 5, rng))
+        check = index.check(copy, add=False)
+        found += bool(check["duplicate_of"]) and check["duplicate_of"]["name"] == str(i)
+        errors.append(abs(similarity(signature(copy), signature(texts[i])) - jaccard(copy, texts[i])))
+    false_copies = false_templates = 0
+    for _ in range(args.queries):
+        check = index.check(" ".join(rng.choice(VOCABULARY) for _ in range(args.words)), add=False)
+        false_copies += check["duplicate_of"] is not None
+        false_templates += check["cluster"] is not None
+    print(
+        f"копии (3 правки): найден оригинал у {found}/{args.queries}; ошибка оценки Жаккара "
+        f"в среднем {statistics.mean(errors):.3f}, максимум {max(errors):.3f}"
+    )
+    print(f"новые тексты: ложных копий {false_copies}, ложных шаблонов {false_templates} из {args.queries}")
+    assert found >= 0.98 * args.queries and false_copies == 0, "точность ниже ожидаемой"
+    assert stats["clusters"] <= 1.1 * args.templates, "документы одного шаблона не собраны в кластер"
+    print(f"OK: порог копии {DUPLICATE_MIN}, кластеров {stats['clusters']} при {args.templates} шаблонах")
+    print(
+        f"на документ {args.words} слов: подпись p50 {statistics.median(sign_times) * 1000:.2f} мс, "
+        f"проверка по индексу p50 {statistics.median(check_times) * 1000:.2f} мс, "
+        f"p99 {sorted(check_times)[int(0.99 * len(check_times))] * 1000:.2f} мс"
+    )
+    index.close()
+    shutil.rmtree(os.path.dirname(path))
+
+
+if __name__ == "__main__":
+    main()
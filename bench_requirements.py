@@ -0,0 +1,171 @@
+"""Бенчмарк extract_requirements: цепочка re.search против словаря документа.
+
+Запуск: python bench_requirements.py [--mb 1] [--fields 0 20 100]
+Сначала проверяет, что результат совпадает с исходной реализацией на
+наборе синтетических документов, затем замеряет время на тексте в N МБ
+и то, как оно растёт с числом полей (к FIELDS добавляются синтетические
+поля, которых в документе нет).
+"""
+import argparse
+import random
+import re
+import time
+
+from extract_requirements import FIELDS, _clean, compile_fields, extract_fields, extract_requirements
+
+LINES = [
+    "Предмет закупки: Ноутбуки для учебных классов",
+    "Модель: Dell XPS 13 Plus",
+    "Артикул: XPS9320-7565SLV-PUS",
+    "Процессор: Intel Core i7-1260P",
+    "Процессор AMD Ryzen 7 5800H",
+    "Оперативная память: 16 GB DDR5 RAM",
+    "ОЗУ 32 ГБ",
+    "Накопитель: SSD 512 GB",
+    "1 TB NVMe",
+    "Видеокарта: GeForce RTX 3060 6 GB",
+    "Radeon RX 6700 XT",
+    "Экран: 15.6 дюйма, разрешение 1920x1080",
+    "Монитор 27\" QHD",
+    "ОС: Windows 11 Pro",
+    "Ubuntu 22.04",
+    "Срок поставки: в течение 1 рабочего дня",
+    "в течение 10 календарных дней",
+    "Срок подачи заявки: в течение 2 календарных дней",
+    "Приём заявок: до 15 марта",
+    "Опыт работы не менее 7 лет",
+    "Опыт работы: обязателен",
+    "Требуется авторизованный дилер Dell Gold/Platinum",
+    "Сертификат соответствия СТ РК",
+    "Цена за единицу: 850,000 тенге",
+    "Стоимость 1 200 000 тг",
+    "Количество: 15 единиц",
+    "40 шт",
+    "Гарантия 3 года",
+    "2 года гарантии",
+    "Бумага офисная формата А4, плотность 80 г/м2.",
+    "Услуги по уборке помещений площадью 300 кв.м.",
+    # Совпадение есть, а значение после очистки пустое — поля нет
+    "Поставка ;;;;;;",
+    "Цена: ... тенге",
+    "Гарантия: ,,,,",
+]
+NEUTRAL = "Требования к товару описаны в техническом задании без ограничений конкуренции.\n"
+
+
+def _first_group(text, patterns, group=1, flags=re.IGNORECASE):
+    for pattern in patterns:
+        m = re.search(pattern, text, flags)
+        if m:
+            if m.lastindex is None or group > m.lastindex:
+                return _clean(m.group(0))
+            return _clean(m.group(group))
+    return None
+
+
+def _first_match(text, patterns, flags=re.IGNORECASE):
+    for pattern in patterns:
+        m = re.search(pattern, text, flags)
+        if m:
+            return _clean(m.group(0))
+    return None
+
+
+def reference_extract_fields(text, fields):
+    """Исходная схема: по каждому полю паттерны подряд через re.search по всему тексту."""
+    found = {}
+    for key, group, patterns in fields:
+        patterns = [p for p, _, _ in patterns]
+        value = _first_group(text, patterns) if group else _first_match(text, patterns)
+        if value:
+            found[key] = value
+    return found
+
+
+def reference_extract_requirements(text):
+    """Исходная версия extract_requirements — эталон для сравнения."""
+    requirements = reference_extract_fields(text, FIELDS)
+    experience = requirements.get("experience")
+    if experience and experience.isdigit():
+        requirements["experience"] = f"не менее {experience} лет"
+    if "price" in requirements:
+        requirements["price"] = re.sub(r"\s+", "", requirements["price"]) + " тенге"
+    if "quantity" in requirements:
+        requirements["quantity"] = requirements["quantity"] + " единиц"
+    return requirements
+
+
+def random_document(rng):
+    lines = [rng.choice(LINES) for _ in range(rng.randint(0, 12))]
+    lines += [NEUTRAL.strip()] * rng.randint(0, 3)
+    rng.shuffle(lines)
+    text = rng.choice(["\n", " ", ". ", "\n    "]).join(lines)
+    if rng.random() < 0.5:
+        text = "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+    return text
+
+
+def check_equivalence(n=3000, seed=0):
+    for line in LINES:
+        assert reference_extract_requirements(line) == extract_requirements(line), line
+    rng = random.Random(seed)
+    for _ in range(n):
+        doc = random_document(rng)
+        expected, actual = reference_extract_requirements(doc), extract_requirements(doc)
+        assert expected == actual and list(expected) == list(actual), (doc, expected, actual)
+    print(f"OK: {n} документов, требования совпадают")
+
+
+def synthetic_fields(count, seed=0):
+    rng = random.Random(seed)
+    letters = "абвгдежзиклмнопрстуфхцчшщэюя"
+    fields = []
+    for i in range(count):
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(6, 10)))
+        fields.append((f"synthetic_{i}", 1, [
+            (rf"{word}\w*\s*[:\-]?\s*([^\n.]{{3,60}})", None, [word]),
+            (rf"\b\d+\s*{word}\w*", [word], None),
+        ]))
+    return fields
+
+
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, default=1.0, help="размер тестового текста в МБ")
+    parser.add_argument("--fields", type=int, nargs="+", default=[0, 20, 100], help="число синтетических полей")
+    args = parser.parse_args()
+
+    check_equivalence()
+    size = int(args.mb * 1_000_000)
+    page = "\n".join(LINES[:24])
+    documents = (
+        ("одна страница", page),
+        ("без полей", NEUTRAL * (size // len(NEUTRAL))),
+        ("поля в конце", NEUTRAL * (size // len(NEUTRAL)) + page),
+    )
+    for name, text in documents:
+        old = timeit(lambda: reference_extract_requirements(text))
+        new = timeit(lambda: extract_requirements(text))
+        print(f"{name:>14}: {len(text) / 1e6:5.2f} МБ  исходная {old * 1000:8.1f} мс  новая {new * 1000:8.1f} мс  x{old / new:.1f}")
+
+    text = documents[2][1]
+    print(f"рост с числом полей, {len(text) / 1e6:.1f} МБ:")
+    for count in args.fields:
+        fields = FIELDS + synthetic_fields(count)
+        compiled = compile_fields(fields)
+        old = timeit(lambda: reference_extract_fields(text, fields))
+        new = timeit(lambda: extract_fields(text, compiled))
+        print(f"{len(fields):>4} полей: исходная {old * 1000:8.1f} мс  новая {new * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
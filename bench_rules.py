@@ -0,0 +1,154 @@
+"""Бенчмарк правовых проверок при росте свода правил.
+
+Запуск: python bench_rules.py [--mb 1] [--rules 10 100 300]
+К LEGAL_RULES добавляются синтетические статьи (по 3 паттерна с ведущим
+словом, как у настоящих) и замеряется check_legal_compliance с фильтром по
+словарю документа и без него. Сначала на синтетических документах
+проверяется, что с фильтром и без него совпадения и вердикты те же, что
+у отдельного поиска каждым паттерном, и что позиции совпадений — в
+исходном тексте, даже если lower() меняет его длину («İ»).
+"""
+import argparse
+import random
+import re
+import time
+
+import rules
+from bench_features import FRAGMENTS, NEUTRAL
+from legal_compliance import LEGAL_RULE_IDS, LEGAL_RULES, check_legal_compliance
+
+
+def synthetic_rule_ids(count, seed=0):
+    rng = random.Random(seed)
+    letters = "абвгдежзиклмнопрстуфхцчшщэюя"
+    ids = []
+    for i in range(count):
+        words = ["".join(rng.choice(letters) for _ in range(rng.randint(5, 10))) for _ in range(3)]
+        rule_id = f"bench.synthetic_{i}"
+        rules.register(rule_id, [rf"\b{w}\w*\s+\w+" for w in words], limit=1)
+        ids.append(rule_id)
+    return ids
+
+
+def reference_scan(text, rule_ids, exhaustive=False):
+    """Каждый паттерн — отдельный finditer по тексту, лимиты правил — после: эталон для rules.scan."""
+    low = text.lower()
+    index = {}
+    for rule_id in rule_ids:
+        rule = rules.RULES[rule_id]
+        hits = []
+        for no, (pattern, _, _) in enumerate(rule["patterns"]):
+            found = [(m.start(), m.end(), m.groups(), no) for m in pattern.finditer(low)]
+            hits.extend(found if exhaustive else found[:rule["per_pattern"]])
+        index[rule_id] = hits if exhaustive else hits[:rule["limit"]]
+    return index
+
+
+def reference_legal(text):
+    """Исходная версия check_legal_compliance (первый сработавший паттерн) плюс все совпадения правила."""
+    results = []
+    text_lower = text.lower()
+    for rule in LEGAL_RULES:
+        found_match = None
+        for pattern in rule["patterns"]:
+            match = re.search(pattern, text_lower, re.IGNORECASE)
+            if match:
+                start = max(0, match.start() - 20)
+                end = min(len(text), match.end() + 20)
+                found_match = "..." + text[start:end].strip() + "..."
+                break
+        results.append({
+            "status": "violation" if found_match else "ok",
+            "article": rule["article"],
+            "message": rule["violation_text"] if found_match else rule["ok_text"],
+            "found": found_match,
+            "severity": rule["severity"],
+            "spans": sorted(
+                (m.start(), m.end()) for pattern in rule["patterns"] for m in re.finditer(pattern, text_lower)
+            ),
+        })
+    return results
+
+
+def random_document(rng, rule_ids):
+    # Ведущие слова синтетических статей — чтобы фильтр по словарю пропускал не всё
+    anchors = [pattern[2] for rule_id in rule_ids for pattern in rules.RULES[rule_id]["patterns"] if pattern[2]]
+    parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 8))]
+    parts += [f"{rng.choice(anchors)}ами {rng.choice(NEUTRAL.split())}" for _ in range(rng.randint(0, 5))]
+    rng.shuffle(parts)
+    text = " ".join(parts)
+    if rng.random() < 0.5:
+        text = "".join(c.upper() if rng.random() < 0.3 else c for c in text)
+    return text
+
+
+def check_equivalence(rule_ids, n=300, seed=0):
+    rng = random.Random(seed)
+    docs = [random_document(rng, rule_ids) for _ in range(n)]
+    gate = rules.WORD_GATE_MIN_PATTERNS
+    try:
+        for forced in (0, 10**9):
+            rules.WORD_GATE_MIN_PATTERNS = forced
+            for doc in docs:
+                for exhaustive in (False, True):
+                    expected, actual = reference_scan(doc, rule_ids, exhaustive), rules.scan(doc, rule_ids, exhaustive=exhaustive)
+                    assert expected == actual, (forced, exhaustive, doc)
+                expected, actual = reference_legal(doc), check_legal_compliance(doc, spans=True)
+                assert expected == actual, (forced, doc, expected, actual)
+    finally:
+        rules.WORD_GATE_MIN_PATTERNS = gate
+    print(f"OK: {n} документов, {len(rule_ids)} правил — совпадения и вердикты те же с фильтром по словарю и без него")
+
+
+def check_offsets(n=50, seed=0):
+    """«İ» в нижнем регистре — два символа: позиции не должны сдвинуться относительно текста с «Ж»."""
+    rng = random.Random(seed)
+    for _ in range(n):
+        body = " ".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 8)))
+        prefix = [rng.choice(("İ ", "")) for _ in range(rng.randint(1, 20))]
+        turkish, plain = "".join(prefix) + body, "".join(prefix).replace("İ", "Ж") + body
+        positions = [
+            {rule_id: [(start, end, no) for start, end, _, no in hits] for rule_id, hits in rules.scan(doc, exhaustive=True).items()}
+            for doc in (turkish, plain)
+        ]
+        assert positions[0] == positions[1], turkish
+        expected = [span for item in check_legal_compliance(plain, spans=True) for span in item["spans"]]
+        actual = [span for item in check_legal_compliance(turkish, spans=True) for span in item["spans"]]
+        assert expected == actual, (turkish, expected, actual)
+    print(f"OK: {n} документов с «İ» — позиции совпадений в исходном тексте")
+
+
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, default=1.0, help="размер тестового текста в МБ")
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 300], help="число синтетических статей")
+    args = parser.parse_args()
+
+    check_offsets()
+    check_equivalence(LEGAL_RULE_IDS + synthetic_rule_ids(max(args.rules)))
+    size = int(args.mb * 1_000_000)
+    text = NEUTRAL * (size // len(NEUTRAL)) + " ".join(FRAGMENTS)
+    check_legal_compliance(text)
+    print(f"текст {len(text) / 1e6:.1f} МБ")
+    for count in args.rules:
+        rule_ids = LEGAL_RULE_IDS + synthetic_rule_ids(count)
+        gate = rules.WORD_GATE_MIN_PATTERNS
+        rules.WORD_GATE_MIN_PATTERNS = 10**9
+        plain = timeit(lambda: rules.scan(text, rule_ids))
+        rules.WORD_GATE_MIN_PATTERNS = 0
+        gated = timeit(lambda: rules.scan(text, rule_ids))
+        rules.WORD_GATE_MIN_PATTERNS = gate
+        print(f"{len(rule_ids):>4} правил: по паттернам {plain * 1000:8.1f} мс  со словарём {gated * 1000:8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
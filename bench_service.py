@@ -0,0 +1,185 @@
+"""Нагрузочный тест scoring_service: задержки и пропускная способность.
+
+Запуск: python bench_service.py [--requests 400] [--concurrency 16] [--url http://127.0.0.1:8300]
+                                [--max-wait-ms 5] [--compare]
+Без --url поднимает сервис отдельным процессом на свободном порту.
+Сначала проверяет, что /analyze и /analyze/batch отдают то же, что
+predict_single, затем шлёт requests запросов /analyze из concurrency
+потоков с постоянными соединениями и печатает перцентили задержки, RPS и
+средний размер пачки эмбеддера. --compare повторяет замер на сервисе без
+микропакетов (--max-batch 1) для сравнения. Тексты уникальны, чтобы
+кэш эмбеддингов не подменял работу модели; индекс похожих тендеров
+ведётся во временном каталоге, чтобы не засорять рабочий.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+FRAGMENTS = [
+    "Ноутбук строго Dell XPS 13 артикул 9310-2021.",
+    "Поставка в течение 1 рабочего дня.",
+    "Исключительно авторизованный дилер Dell Technologies уровня Gold.",
+    "Экран 15.6 дюйма, разрешение 1920x1080, вес 2,5 кг.",
+    "Поставщик ТОО ТехноПарк Астана, БИН 123456789012.",
+    "Модель HP ProBook 450-G9, аналоги не принимаются.",
+    "Бумага офисная формата А4, плотность 80 г/м2, белизна не менее 146%.",
+    "Срок поставки 30 календарных дней с момента заключения договора.",
+    "Требования к товару описаны в техническом задании без ограничений конкуренции.",
+    "Поставщик обязан предоставить сертификат соответствия и гарантию 12 месяцев.",
+]
+
+
+def random_document(rng, number):
+    parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(3, 20))]
+    return f"Закупка №{number}. " + " ".join(parts)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(max_batch, max_wait_ms):
+    """Сервис отдельным процессом; возвращает (Popen, url), когда он готов."""
+    port = free_port()
+    service = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_service.py")
+    process = subprocess.Popen([
+        sys.executable, service, "--port", str(port), "--max-batch", str(max_batch), "--max-wait-ms", str(max_wait_ms),
+    ])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600  # первая загрузка моделей бывает долгой
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit("сервис не запустился")
+        try:
+            request(connect(url), "GET", "/health")
+            return process, url
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    sys.exit("сервис не ответил на /health")
+
+
+def connect(url):
+    parts = urlsplit(url)
+    return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=300)
+
+
+def request(conn, method, path, payload=None):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+    conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(f"{method} {path}: {response.status} {data}")
+    return data
+
+
+def check_results(url, n=8, seed=1):
+    from predictor import predict_single
+
+    rng = random.Random(seed)
+    texts = [random_document(rng, -i) for i in range(n)]
+    expected = []
+    for text in texts:
+        result = predict_single(text)
+        result.pop("requirement_labels")
+        expected.append(json.loads(json.dumps(result, ensure_ascii=False, default=str)))
+    conn = connect(url)
+    single = [request(conn, "POST", "/analyze", {"text": text}) for text in texts]
+    batch = request(conn, "POST", "/analyze/batch", {"texts": texts})["results"]
+    # Похожие зависят от того, что уже попало в индекс, замеры стадий — от нагрузки; сравнивается остальное
+    for result in expected + single + batch:
+        result.pop("similar", None)
+        result.pop("timings", None)
+    for text, want, got_single, got_batch in zip(texts, expected, single, batch):
+        assert got_single == want, (text, want, got_single)
+        assert got_batch == want, (text, want, got_batch)
+    print(f"OK: {n} документов, /analyze и /analyze/batch совпадают с predict_single")
+
+
+def load(url, requests, concurrency, seed=0):
+    """Задержки всех запросов (секунды) и общее время."""
+    rng = random.Random(seed)
+    texts = [random_document(rng, i) for i in range(requests)]
+    latencies, lock, position = [], threading.Lock(), iter(range(requests))
+
+    def client():
+        conn = connect(url)
+        while True:
+            with lock:
+                i = next(position, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            request(conn, "POST", "/analyze", {"text": texts[i]})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+
+def report(name, url, requests, concurrency):
+    before = request(connect(url), "GET", "/health")
+    latencies, elapsed = load(url, requests, concurrency)
+    after = request(connect(url), "GET", "/health")
+    batches = max(after["batches"] - before["batches"], 1)
+    print(
+        f"{name:>16}: {len(latencies) / elapsed:7.1f} запр/с  "
+        + "  ".join(f"p{q} {percentile(latencies, q) * 1000:7.1f} мс" for q in (50, 90, 99))
+        + f"  пачка {(after['texts'] - before['texts']) / batches:5.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="уже запущенный сервис; без него поднимается свой")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--compare", action="store_true", help="также замерить сервис без микропакетов")
+    args = parser.parse_args()
+    os.environ.setdefault("TENDERAI_SIMILAR_DIR", tempfile.mkdtemp(prefix="tenderai-similar-"))
+
+    configs = [("микропакеты", args.max_batch, args.max_wait_ms)]
+    if args.compare:
+        configs.append(("без пакетов", 1, 0))
+    for name, max_batch, max_wait_ms in configs:
+        process, url = (None, args.url) if args.url else start_service(max_batch, max_wait_ms)
+        try:
+            if name == configs[0][0]:
+                check_results(url)
+            report(name, url, args.requests, args.concurrency)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        if args.url:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Бенчмарк индекса похожих тендеров: вставка, обучение кластеров, поиск и полнота.
+
+Запуск: python bench_similar.py [--rows 200000] [--queries 200] [--nprobe 16]
+Строит индекс во временном каталоге из синтетических эмбеддингов,
+собранных вокруг нескольких тысяч «типовых» тендеров, вставляя их пачками
+по мере «анализа». Запросы — слегка изменённые копии случайных строк
+(как переписанное объявление). Сравнивает поиск IVF с точным перебором
+всего memmap: задержку и долю совпавших top-10; копия обязана находить
+свой оригинал первым.
+
+Перед замерами — прогон batch_score.score_documents на нескольких
+документах (с копией и --duplicates reuse) с индексом во временном
+каталоге: пачка оценивается, копия берёт результат оригинала, документы
+попадают в индекс со своими путями.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from similar_index import SimilarIndex, _normalize
+
+DIM = 384
+DOCUMENTS = [
+    "Поставка ноутбуков строго Dell XPS 13 для учебных классов. Срок поставки 10 календарных дней. " * 5,
+    "Закупка офисной бумаги формата А4, плотность 80 г/м2. Количество: 400 пачек. " * 5,
+    "Услуги по уборке помещений площадью 300 кв.м. Опыт работы не менее 3 лет. " * 5,
+]
+
+
+def synthetic(rows, seed=0, templates=5000):
+    rng = np.random.default_rng(seed)
+    centers = _normalize(rng.normal(size=(templates, DIM)))
+    for start in range(0, rows, 1000):
+        n = min(1000, rows - start)
+        yield _normalize(centers[rng.integers(templates, size=n)] + rng.normal(scale=0.06, size=(n, DIM)))
+
+
+def exact(vectors, query, k):
+    scores = np.concatenate([
+        vectors[start:start + 100000].astype(np.float32) @ query for start in range(0, len(vectors), 100000)
+    ])
+    return set(np.argpartition(-scores, k)[:k].tolist())
+
+
+def check_batch_score():
+    import predictor
+    from batch_score import score_documents
+    from near_duplicates import DuplicateIndex
+
+    path = tempfile.mkdtemp(prefix="tenderai-similar-check-")
+    try:
+        predictor._models["similar_index"] = SimilarIndex(os.path.join(path, "similar"))
+        duplicates = DuplicateIndex(os.path.join(path, "duplicates.sqlite"))
+        parsed = [
+            {"path": f"docs/{i}.pdf", "text": text, "parse_seconds": 0.0, "error": None}
+            for i, text in enumerate(DOCUMENTS + DOCUMENTS[:1])
+        ] + [{"path": "docs/broken.pdf", "text": "", "parse_seconds": 0.0, "error": "ValueError: битый файл"}]
+        records = score_documents(parsed, duplicates=duplicates, reuse=True)
+        assert [record["path"] for record in records] == [doc["path"] for doc in parsed], records
+        assert all(record["result"] for record in records[:4]) and records[4]["result"] is None, records
+        assert records[3]["reused_from"] is not None and records[3]["score_seconds"] is None, records[3]
+        assert records[3]["result"]["risk_score"] == records[0]["result"]["risk_score"]
+        stored = {row["source"] for row in predictor.get_similar_index()._conn.execute("SELECT source FROM notices")}
+        assert stored == {"docs/0.pdf", "docs/1.pdf", "docs/2.pdf"}, stored
+    finally:
+        predictor._models.pop("similar_index", None)
+        shutil.rmtree(path, ignore_errors=True)
+    print("OK: score_documents оценил пачку, копия взяла результат оригинала, документы в индексе со своими путями")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=16)
+    args = parser.parse_args()
+
+    check_batch_score()
+    path = tempfile.mkdtemp(prefix="tenderai-similar-bench-")
+    try:
+        index = SimilarIndex(path)
+        start = time.perf_counter()
+        for batch, vectors in enumerate(synthetic(args.rows)):
+            index.add_many([{"key": f"{batch}-{i}", "vector": vector} for i, vector in enumerate(vectors)])
+        elapsed = time.perf_counter() - start
+        print(f"вставка: {args.rows:,} строк за {elapsed:.1f} с — {args.rows / elapsed:,.0f} строк/с; {index.stats()}")
+        start = time.perf_counter()
+        index.train()
+        print(f"обучение кластеров: {time.perf_counter() - start:.1f} с; {index.stats()}")
+
+        rng = np.random.default_rng(1)
+        vectors = np.memmap(f"{path}/vectors.f16", dtype=np.float16, mode="r").reshape(-1, DIM)
+        rows = rng.choice(len(vectors), args.queries, replace=False)
+        latencies, exact_times, recall = [], [], []
+        for row in rows:
+            query = _normalize(vectors[row][None].astype(np.float32) + rng.normal(scale=0.01, size=(1, DIM)))[0]
+            start = time.perf_counter()
+            found = index.search(query, k=10, nprobe=args.nprobe)
+            latencies.append(time.perf_counter() - start)
+            assert found[0]["id"] == row, (row, found[:1])
+            start = time.perf_counter()
+            truth = exact(vectors, query, 10)
+            exact_times.append(time.perf_counter() - start)
+            recall.append(len(truth & {hit["id"] for hit in found}) / 10)
+        print(f"OK: {args.queries} копий нашли свой оригинал первым; совпадение top-10 с точным перебором {np.mean(recall):.3f}")
+        print(
+            f"поиск IVF (nprobe {args.nprobe}): p50 {statistics.median(latencies) * 1000:.2f} мс, "
+            f"p99 {sorted(latencies)[int(0.99 * len(latencies))] * 1000:.2f} мс; "
+            f"точный перебор: p50 {statistics.median(exact_times) * 1000:.1f} мс"
+        )
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Бенчмарк поиска поставщика: перебор базы против индекса SupplierIndex.
+
+Запуск: python bench_suppliers.py [--mb 1] [--suppliers 10 1000 50000]
+Строит синтетическую базу из N поставщиков и замеряет поиск упоминания
+в тексте в N МБ: исходным перебором названий по словам и через индекс —
+обоими его путями, регуляркой на название и проходом по словам
+(построение индекса замеряется отдельно — оно делается один раз).
+Перед замерами проверяет, что название из одного слова находится только
+после ОПФ или в кавычках и что оба пути находят одно и то же.
+"""
+import argparse
+import random
+import re
+import time
+
+import supplier_index
+from supplier_index import LEGAL_FORMS, SupplierIndex
+
+NEUTRAL = "Требования к товару описаны в техническом задании без ограничений конкуренции. "
+SUPPLIER_KEYWORDS = [
+    r"(ТОО\s+[\w\s]{3,30})",
+    r"сервисн\w+\s+центр[^\n\.]{0,30}",
+    r"через\s+(ТОО\s+[\w\s]{3,20})",
+]
+
+
+def synthetic_suppliers(count, seed=0):
+    rng = random.Random(seed)
+    letters = "абвгдежзиклмнопрстуфхцчшщэюя"
+    suppliers = []
+    for i in range(count):
+        words = ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))).capitalize() for _ in range(rng.randint(1, 3))]
+        suppliers.append((f"ТОО {' '.join(words)}", f"{100000000000 + i}"))
+    return suppliers
+
+
+def reference_find(text, names):
+    """
+    Исходный поиск: фраза «ТОО ...» регуляркой, затем перебор всех
+    названий по словам. Слова-ОПФ пропускаются — иначе с любой фразой
+    совпадает первое же название базы и перебор не доходит до нужного.
+    """
+    for pattern in SUPPLIER_KEYWORDS:
+        m = re.search(pattern, text, re.IGNORECASE)
+        if m:
+            found = m.group(0).strip().lower()
+            for name in names:
+                if any(word.lower() in found for word in name.split() if word.lower() not in LEGAL_FORMS):
+                    return name
+    return None
+
+
+def check_context():
+    index = SupplierIndex([("ТОО Казахстан", "ТОО «Казахстан»", None), ("ТОО Альфа Бета", "ТОО Альфа Бета", "123456789012")])
+    for text in ("Закон Республики Казахстан о государственных закупках", "ТОО. Казахстан"):
+        assert not index.find(text), text
+    for text in ("Поставщик ТОО «Казахстан»", "поставщик ТОО Казахстан", "поставщик: «Казахстан»"):
+        assert [m["key"] for m in index.find(text)] == ["ТОО Казахстан"], text
+    assert [m["via"] for m in index.find("Альфа Бета, БИН 123456789012")] == ["bin", "name"]
+    # «İ» в нижнем регистре — два символа: позиции всё равно в исходном тексте
+    text = "İİ Альфа Бета, БИН 123456789012"
+    assert [text[m["start"]:m["end"]] for m in index.find(text)] == ["123456789012", "Альфа Бета"]
+    print("OK: однословное название — только после ОПФ или в кавычках, совпадения по БИН первыми")
+
+
+def build_index(suppliers, scan_max_names):
+    """Индекс с заданным порогом SCAN_MAX_NAMES — чтобы выбрать путь поиска."""
+    saved, supplier_index.SCAN_MAX_NAMES = supplier_index.SCAN_MAX_NAMES, scan_max_names
+    try:
+        index = SupplierIndex(suppliers)
+        index.build()
+    finally:
+        supplier_index.SCAN_MAX_NAMES = saved
+    return index
+
+
+def check_paths(n=2000, seed=0):
+    suppliers = [(name, name, None) for name in ("ТОО Казахстан", "ТОО Альфа Бета", "ТОО Альфа Бета Гамма", "ИП Бета", "АО Бета Гамма")]
+    by_pattern, by_words = build_index(suppliers, 10**9), build_index(suppliers, 0)
+    pieces = ["Казахстан", "ТОО", "«", "»", "Альфа", "Бета", "Гамма", "Альфабета", "Закон", "İ", " ", ", ", ". ", "\n"]
+    rng = random.Random(seed)
+    for _ in range(n):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 30)))
+        assert by_pattern.find(text) == by_words.find(text), text
+    print(f"OK: регулярка на название и проход по словам совпадают на {n} текстах")
+
+
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, default=1.0, help="размер тестового текста в МБ")
+    parser.add_argument("--suppliers", type=int, nargs="+", default=[10, 1000, 50000], help="размер базы поставщиков")
+    parser.add_argument("--pattern-max", type=int, default=1000, help="до скольких названий замерять путь с регуляркой на название")
+    args = parser.parse_args()
+
+    check_context()
+    check_paths()
+    size = int(args.mb * 1_000_000)
+    for count in args.suppliers:
+        suppliers = synthetic_suppliers(count)
+        names = [name for name, _ in suppliers]
+        target = names[-1]
+        # Упоминание в конце — исходному поиску приходится пройти весь текст
+        text = NEUTRAL * (size // len(NEUTRAL)) + f"Поставщик {target}, сервисный центр."
+
+        start = time.perf_counter()
+        index = SupplierIndex((name, name, bin_value) for name, bin_value in suppliers)
+        index.build()
+        build = time.perf_counter() - start
+
+        found = index.find(text)
+        assert found and found[0]["key"] == target, found[:1]
+        assert reference_find(text, names) == target
+        old = timeit(lambda: reference_find(text, names))
+        new = timeit(lambda: index.find(text))
+        paths = []
+        for label, scan_max_names in (("регулярки", 10**9), ("слова", 0)):
+            if scan_max_names and count > args.pattern_max:
+                continue
+            path_index = build_index(((name, name, bin_value) for name, bin_value in suppliers), scan_max_names)
+            paths.append(f"{label} {timeit(lambda: path_index.find(text)) * 1000:.1f}")
+        print(
+            f"{count:>6} поставщиков: перебор {old * 1000:8.1f} мс  индекс {new * 1000:8.1f} мс"
+            f"  ({', '.join(paths)} мс; построение индекса {build * 1000:.0f} мс)"
+        )
+
+
+if __name__ == "__main__":
+    main()
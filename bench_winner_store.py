@@ -0,0 +1,155 @@
+"""Бенчмарк хранилища истории побед WinnerStore.
+
+Запуск: python bench_winner_store.py [--awards 1000000] [--suppliers 50000]
+Загружает синтетическую историю во временную SQLite-базу, строит
+агрегаты и замеряет время поиска сводки и последних побед поставщика,
+затем — дозагрузку пачек новых побед с обновлением только затронутых
+узлов графа. На небольшой выборке агрегаты сверяются с подсчётом на
+Python, а граф после дозагрузок по частям — с построенным заново.
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from collections import defaultdict
+
+from winner_store import WinnerStore
+
+
+def synthetic_awards(count, suppliers, customers, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        # Часть заказчиков «закреплена» за одним поставщиком — чтобы были серии
+        customer = rng.randrange(customers)
+        supplier = customer % suppliers if rng.random() < 0.3 else rng.randrange(suppliers)
+        yield {
+            "supplier": f"ТОО Поставщик {supplier}",
+            "supplier_bin": f"{100000000000 + supplier}",
+            "customer": f"ГУ Заказчик {customer}",
+            "tender": f"Закупка {i}",
+            "amount": f"{rng.randrange(10_000, 50_000_000):,} тг",
+            "year": 2015 + i * 10 // count,
+        }
+
+
+def reference_stats(awards):
+    """Агрегаты подсчётом на Python: победы, сумма и самая длинная серия по поставщику."""
+    by_customer = defaultdict(list)
+    stats = defaultdict(lambda: {"wins": 0, "total_amount": 0, "streak": 0})
+    for i, award in enumerate(awards):
+        by_customer[award["customer"]].append((award["year"], i, award["supplier"]))
+        s = stats[award["supplier"]]
+        s["wins"] += 1
+        s["total_amount"] += int(award["amount"].replace(",", "").split()[0])
+    for history in by_customer.values():
+        history.sort()
+        run, prev = 0, None
+        for _, _, supplier in history:
+            run = run + 1 if supplier == prev else 1
+            prev = supplier
+            stats[supplier]["streak"] = max(stats[supplier]["streak"], run)
+    return stats
+
+
+def check_aggregates(path):
+    awards = list(synthetic_awards(5000, 50, 200, seed=1))
+    store = WinnerStore(path)
+    store.add_awards(awards)
+    store.refresh_aggregates()
+    for name, expected in reference_stats(awards).items():
+        actual = store.supplier(name)
+        assert {k: actual[k] for k in expected} == expected, (name, expected, actual)
+    store.close()
+    print("OK: агрегаты совпадают с подсчётом на Python")
+
+
+def graph_snapshot(store):
+    with store._lock:
+        return [
+            [tuple(round(v, 9) if isinstance(v, float) else v for v in row) for row in store._conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2")]
+            for table in ("pair_stats", "customer_stats", "supplier_stats")
+        ]
+
+
+def check_incremental(directory):
+    rng = random.Random(3)
+    awards = list(synthetic_awards(5000, 50, 200, seed=1))
+    for i, award in enumerate(awards):
+        award["key"] = f"k{i}"
+        if rng.random() < 0.2:
+            award["year"] = rng.randint(2015, 2024)  # задним числом
+    incremental = WinnerStore(os.path.join(directory, "incremental.sqlite"))
+    start = 0
+    while start < len(awards):
+        size = rng.randint(1, 300)
+        incremental.add_awards(awards[start:start + size])
+        incremental.add_awards(rng.sample(awards[:start + size], 20))  # повторы не должны менять граф
+        start += size
+    full = WinnerStore(os.path.join(directory, "full.sqlite"))
+    full.add_awards(awards, update_aggregates=False)
+    assert full.aggregates_stale()
+    full.refresh_aggregates()
+    assert graph_snapshot(incremental) == graph_snapshot(full)
+    incremental.close()
+    full.close()
+    print("OK: граф после дозагрузок по частям совпадает с построенным заново")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--awards", type=int, default=1_000_000, help="число контрактов")
+    parser.add_argument("--suppliers", type=int, default=50_000, help="число поставщиков")
+    parser.add_argument("--customers", type=int, default=20_000, help="число заказчиков")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_aggregates(os.path.join(tmp, "check.sqlite"))
+        check_incremental(tmp)
+
+        store = WinnerStore(os.path.join(tmp, "winners.sqlite"))
+        start = time.perf_counter()
+        awards = synthetic_awards(args.awards, args.suppliers, args.customers)
+        loaded = 0
+        while True:
+            batch = [a for _, a in zip(range(50_000), awards)]
+            if not batch:
+                break
+            loaded += store.add_awards(batch, update_aggregates=False)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.refresh_aggregates()
+        refresh = time.perf_counter() - start
+
+        rng = random.Random(2)
+        names = [f"ТОО Поставщик {rng.randrange(args.suppliers)}" for _ in range(2000)]
+        start = time.perf_counter()
+        for name in names:
+            summary = store.supplier(name)
+            store.wins(summary["id"])
+        lookup = (time.perf_counter() - start) / len(names)
+
+        # Дозагрузка: пачки по 100 побед текущего года и задним числом
+        new = list(synthetic_awards(2000, args.suppliers, args.customers, seed=4))
+        for award in new[:1000]:
+            award["year"] = 2025
+        timings = []
+        for part in (new[:1000], new[1000:]):
+            start = time.perf_counter()
+            for i in range(0, len(part), 100):
+                store.add_awards(part[i:i + 100])
+            timings.append((time.perf_counter() - start) / (len(part) // 100))
+
+        size = os.path.getsize(os.path.join(tmp, "winners.sqlite"))
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"{loaded:,} контрактов: загрузка {load:.1f} с ({loaded / load:,.0f} строк/с), агрегаты {refresh:.1f} с")
+        print(f"сводка + 20 последних побед: {lookup * 1e6:.0f} мкс на поставщика")
+        print(f"дозагрузка 100 побед с обновлением графа: текущего года {timings[0] * 1000:.1f} мс, задним числом {timings[1] * 1000:.1f} мс")
+        print(f"база {size / 1e6:.0f} МБ, пик памяти процесса {rss:.0f} МБ")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
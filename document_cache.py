@@ -0,0 +1,90 @@
+"""Общий кэш разобранных документов и результатов анализа: LRU с TTL по хэшу содержимого."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DOC_CACHE_ENTRIES = int(os.environ.get("TENDERAI_DOC_CACHE_ENTRIES", 128))
+DOC_CACHE_TTL = int(os.environ.get("TENDERAI_DOC_CACHE_TTL", 3600))  # секунд
+
+
+def content_key(data):
+    """sha256 содержимого: байты файла или текст."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentCache:
+    """
+    Кэш в памяти процесса: не больше max_entries значений, каждое живёт
+    ttl секунд с момента записи, при переполнении вытесняется давно не
+    читанное. Один экземпляр на процесс Streamlit обслуживает все сессии.
+    get_or_compute() не даёт двум сессиям считать одно и то же
+    одновременно — вторая ждёт результата первой. Значения отдаются без
+    копирования, изменять их нельзя.
+    """
+
+    def __init__(self, max_entries=DOC_CACHE_ENTRIES, ttl=DOC_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()  # ключ → (момент устаревания, значение)
+        self._pending = {}  # ключ → Event вычисления, идущего в другом потоке
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def get(self, key):
+        """Значение или None, если его нет или оно устарело."""
+        with self._lock:
+            return self._get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """
+        Значение из кэша, а при промахе — compute() с записью в кэш. Если то
+        же значение уже считает другой поток, ждёт его; если тот упал —
+        считает сам.
+        """
+        while True:
+            with self._lock:
+                value = self._get(key)
+                if value is not None:
+                    self.hits += 1
+                    return value
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()
+        try:
+            value = compute()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,107 @@
+"""Извлечение текста тендерной документации из PDF и DOCX."""
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import docx
+import pdfplumber
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx")
+
+# Процессов для разбора страниц одного большого PDF
+PARSE_WORKERS = int(os.environ.get("TENDERAI_PARSE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+# С меньшего числа страниц запуск процессов дороже самого разбора
+PARALLEL_MIN_PAGES = 64
+PAGES_PER_TASK = 8
+
+
+def _page_text(page):
+    try:
+        return page.extract_text() or ""
+    finally:
+        # Layout-объекты страницы освобождаются сразу, а не копятся до конца документа
+        page.close()
+
+
+def _extract_page_range(path, start, stop):
+    with pdfplumber.open(path) as pdf:
+        return [_page_text(pdf.pages[i]) for i in range(start, stop)]
+
+
+def _iter_pages_parallel(file, count, workers, pages_per_task):
+    # Воркерам нужен путь: загруженный файл один раз сбрасывается во временный
+    tmp = None
+    if isinstance(file, (str, os.PathLike)):
+        path = file
+    else:
+        file.seek(0)
+        tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+        with tmp:
+            shutil.copyfileobj(file, tmp)
+        path = tmp.name
+    # spawn, а не fork: в процессе Streamlit и пакетной оценки уже работают потоки
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = deque()
+        for start in range(0, count, pages_per_task):
+            pending.append(pool.submit(_extract_page_range, path, start, min(start + pages_per_task, count)))
+            # В работе не больше двух диапазонов на процесс — память ограничена
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+
+def iter_pdf_pages(file, workers=1, pages_per_task=PAGES_PER_TASK):
+    """
+    Текст страниц PDF по одной, по порядку. file — путь или файловый
+    объект. При workers > 1 документ от PARALLEL_MIN_PAGES страниц
+    разбирается диапазонами по pages_per_task страниц в отдельных
+    процессах; страницы всё равно выдаются по порядку, как только готов
+    их диапазон.
+    """
+    with pdfplumber.open(file) as pdf:
+        count = len(pdf.pages)
+        if workers <= 1 or count < PARALLEL_MIN_PAGES:
+            for page in pdf.pages:
+                yield _page_text(page)
+            return
+    yield from _iter_pages_parallel(file, count, workers, pages_per_task)
+
+
+def iter_text(file, name=None, workers=1):
+    """
+    Текст документа частями по мере разбора: страницы PDF или абзацы
+    DOCX. Аргументы — как у extract_text(); workers — см. iter_pdf_pages().
+    Правила сканируются по склеенному тексту (совпадения бывают и через
+    стык страниц), но сегменты уже прочитанного начала можно анализировать
+    не дожидаясь конца — см. incremental.analyze_prefix.
+    """
+    if isinstance(file, bytes):
+        file = io.BytesIO(file)
+    if name is None:
+        name = getattr(file, "name", None) or (os.fspath(file) if isinstance(file, (str, os.PathLike)) else "")
+    name = str(name).lower()
+    if name.endswith(".pdf"):
+        yield from iter_pdf_pages(file, workers)
+    elif name.endswith(".docx"):
+        for p in docx.Document(file).paragraphs:
+            yield p.text
+
+
+def extract_text(file, name=None, workers=1):
+    """
+    Текст документа одной строкой. file — путь, байты или файловый объект
+    (в том числе загруженный в Streamlit файл); формат определяется по
+    name, а без него — по file.name или самому пути. Неизвестный формат —
+    пустая строка.
+    """
+    return " ".join(iter_text(file, name, workers))
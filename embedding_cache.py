@@ -0,0 +1,178 @@
+"""Кэш эмбеддингов тендеров: LRU в памяти поверх хранилища на диске."""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows — межпроцессная блокировка недоступна
+    fcntl = None
+
+
+def normalize_text(text):
+    """Нормализация перед хэшированием: NFC и схлопывание пробелов."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text, model_name):
+    """Контентный ключ: sha256 от имени модели и нормализованного текста."""
+    h = hashlib.sha256()
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(normalize_text(text).encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кэш эмбеддингов одной модели.
+
+    RAM — OrderedDict на ram_size векторов с вытеснением LRU.
+    Диск — каталог <path>/<model_name>:
+        vectors.f32 — матрица float32 (строка на документ), читается через memmap
+        index.tsv   — первая строка "dim<TAB>N", далее "ключ<TAB>номер строки"
+    Оба файла только дописываются, поэтому кэш переживает перезапуски и
+    может разделяться несколькими процессами.
+    """
+
+    def __init__(self, path, model_name, ram_size=2048):
+        self.model_name = model_name
+        self.path = os.path.join(path, re.sub(r"[^\w.\-]+", "_", model_name))
+        self.ram_size = ram_size
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._index_path = os.path.join(self.path, "index.tsv")
+        self._lock = threading.Lock()
+        self._ram = OrderedDict()
+        self._index = {}
+        self._index_offset = 0
+        self._dim = None
+        self._mmap = None
+        self.ram_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+        self._read_index()
+
+    # ─────────────────────────────────────────────
+    # ДИСК
+    # ─────────────────────────────────────────────
+
+    def _read_index(self):
+        """Дочитывает index.tsv с последней позиции (записи других процессов)."""
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "r", encoding="utf-8") as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # строка ещё дописывается
+                self._index_offset += len(line.encode("utf-8"))
+                key, value = line.rstrip("\n").split("\t")
+                if key == "dim":
+                    self._dim = int(value)
+                else:
+                    self._index[key] = int(value)
+
+    def _disk_rows(self):
+        if not self._dim or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self._dim * 4)
+
+    def _read_rows(self, rows):
+        if self._mmap is None or max(rows) >= self._mmap.shape[0]:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._disk_rows(), self._dim))
+        return np.array(self._mmap[rows])
+
+    def _append(self, keys, vectors):
+        self._mmap = None  # на Windows нельзя дописывать в отображённый файл
+        with open(self._index_path, "a", encoding="utf-8") as index_file:
+            if fcntl:
+                fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                self._read_index()
+                fresh = [i for i, key in enumerate(keys) if key not in self._index]
+                if not fresh:
+                    return
+                if self._dim is None:
+                    self._dim = vectors.shape[1]
+                    index_file.write(f"dim\t{self._dim}\n")
+                first_row = self._disk_rows()
+                with open(self._vectors_path, "ab") as f:
+                    f.write(np.ascontiguousarray(vectors[fresh], dtype=np.float32).tobytes())
+                lines = []
+                for row, i in enumerate(fresh, start=first_row):
+                    self._index[keys[i]] = row
+                    lines.append(f"{keys[i]}\t{row}\n")
+                # Индекс пишется после векторов: оборванная запись не даст ссылку на мусор
+                index_file.write("".join(lines))
+                index_file.flush()
+                self._index_offset = index_file.tell()
+            finally:
+                if fcntl:
+                    fcntl.flock(index_file, fcntl.LOCK_UN)
+
+    # ─────────────────────────────────────────────
+    # RAM
+    # ─────────────────────────────────────────────
+
+    def _remember(self, key, vector):
+        self._ram[key] = vector
+        self._ram.move_to_end(key)
+        while len(self._ram) > self.ram_size:
+            self._ram.popitem(last=False)
+
+    # ─────────────────────────────────────────────
+    # ПУБЛИЧНЫЙ API
+    # ─────────────────────────────────────────────
+
+    def get_many(self, keys):
+        """Возвращает {ключ: вектор} для найденных ключей и обновляет счётчики."""
+        found = {}
+        with self._lock:
+            on_disk = []
+            for key in dict.fromkeys(keys):
+                if key in self._ram:
+                    self._ram.move_to_end(key)
+                    found[key] = self._ram[key]
+                    self.ram_hits += 1
+                else:
+                    on_disk.append(key)
+            if on_disk and any(key not in self._index for key in on_disk):
+                self._read_index()
+            disk_keys = [key for key in on_disk if key in self._index]
+            if disk_keys:
+                vectors = self._read_rows([self._index[key] for key in disk_keys])
+                for key, vector in zip(disk_keys, vectors):
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.disk_hits += len(disk_keys)
+            self.misses += len(on_disk) - len(disk_keys)
+        return found
+
+    def put_many(self, items):
+        """Сохраняет {ключ: вектор} в оба уровня."""
+        if not items:
+            return
+        keys = list(items)
+        vectors = np.asarray([items[key] for key in keys], dtype=np.float32)
+        with self._lock:
+            self._append(keys, vectors)
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.ram_hits + self.disk_hits + self.misses
+            return {
+                "ram_hits": self.ram_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.ram_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "ram_entries": len(self._ram),
+                "disk_entries": len(self._index),
+            }
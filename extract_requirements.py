@@ -27,228 +27,218 @@ def _clean(value):
     return re.sub(r"\s+", " ", value).strip(" ,;:.")
 
 
-def _first_group(text, patterns, group=1, flags=re.IGNORECASE):
-    for pattern in patterns:
-        m = re.search(pattern, text, flags)
-        if m:
-            # Some patterns intentionally have no capturing groups.
-            # Fall back to group(0) to avoid IndexError on mixed pattern sets.
-            if m.lastindex is None or group > m.lastindex:
-                return _clean(m.group(0))
-            return _clean(m.group(group))
-    return None
-
-
-def _first_match(text, patterns, flags=re.IGNORECASE):
-    for pattern in patterns:
-        m = re.search(pattern, text, flags)
-        if m:
-            return _clean(m.group(0))
-    return None
-
-
-def _extract_tech_specs(text):
-    specs = {}
-
-    cpu = _first_match(
-        text,
-        [
-            r"\bIntel\s+Core\s+i[3579][-\s]?\d{3,5}[A-Z]{0,2}\b",
-            r"\bAMD\s+Ryzen\s+[3579]\s*\d{3,4}[A-Z]{0,2}\b",
-            r"\bXeon\s+[A-Z0-9\-]{3,}\b",
-            r"(?:процессор|cpu)\s*[:\-]?\s*([^\n,.;]{5,60})",
-        ],
-    )
-    if cpu:
-        specs["cpu"] = cpu
-
-    gpu = _first_match(
-        text,
-        [
-            r"\b(?:NVIDIA\s+)?(?:GeForce\s+)?RTX\s*\d{3,4}\s*(?:Ti|SUPER)?\b",
-            r"\b(?:NVIDIA\s+)?(?:GeForce\s+)?GTX\s*\d{3,4}\s*(?:Ti)?\b",
-            r"\b(?:AMD\s+)?Radeon\s+RX\s*\d{3,4}\s*(?:XT)?\b",
-            r"(?:видеокарта|gpu)\s*[:\-]?\s*([^\n,.;]{3,60})",
-        ],
-    )
-    if gpu:
-        specs["gpu"] = gpu
-
-    ram = _first_match(
-        text,
-        [
-            r"\b(?:RAM|ОЗУ|оперативн\w+\s+памят\w*)\s*[:\-]?\s*\d{1,3}\s*(?:GB|ГБ)\s*(?:DDR[345])?\b",
-            r"\b\d{1,3}\s*(?:GB|ГБ)\s*(?:DDR[345])?\s*(?:RAM|ОЗУ|оперативн\w+\s+памят\w*)\b",
-        ],
-    )
-    if ram:
-        specs["ram"] = ram
-
-    storage = _first_match(
-        text,
-        [
-            r"\b(?:SSD|HDD|NVMe)\s*[:\-]?\s*\d+(?:[.,]\d+)?\s*(?:TB|ТБ|GB|ГБ)\b",
-            r"\bнакопител\w*\s*[:\-]?\s*(?:SSD|HDD|NVMe)?\s*\d+(?:[.,]\d+)?\s*(?:TB|ТБ|GB|ГБ)\b",
-            r"\b\d+(?:[.,]\d+)?\s*(?:TB|ТБ|GB|ГБ)\s*(?:SSD|HDD|NVMe)\b",
-        ],
-    )
-    if storage:
-        specs["storage"] = storage
-
-    display = _first_match(
-        text,
-        [
-            r"\b\d{1,2}(?:[.,]\d)?\s*(?:\"|дюйм\w*)\b",
-            r"(?:диспле\w*|экран)\s*[:\-]?\s*([^\n,.;]{3,40})",
-        ],
-    )
-    if display:
-        specs["display"] = display
+# ─────────────────────────────────────────────
+# ПОЛЯ ТРЕБОВАНИЙ
+# (поле, группа, [(паттерн, триггеры, начала), ...]) — паттерны в порядке
+# приоритета: значение даёт первый сработавший, его первое вхождение.
+# Группа 1 — взять захват (если в паттерне его нет — всё совпадение),
+# 0 — всё совпадение. Триггеры — подстроки, без которых паттерн не может
+# совпасть; начала — подстроки, с одной из которых совпадение обязательно
+# начинается (поиск идёт с первого их вхождения). Всё в нижнем регистре
+# и без пробелов; None — ограничения нет.
+# ─────────────────────────────────────────────
+
+FIELDS = [
+    ("product", 1, [
+        (r"(?:предмет закупки|наименование товара|описание товара)\s*[:\-]?\s*([^\n.]{5,120})", ["закупки", "товара"], ["предмет", "наименование", "описание"]),
+        (r"(?:закупка|поставка)\s*([^\n.]{5,80})", None, ["закупка", "поставка"]),
+    ]),
+    ("brand", 1, [
+        (r"\b(Dell|HP|Lenovo|Apple|Samsung|Philips|Siemens|Xerox|Canon|Cisco|Huawei|Asus|Acer|MSI|Gigabyte|Intel|AMD|NVIDIA)\b",
+         None, ["dell", "hp", "lenovo", "apple", "samsung", "philips", "siemens", "xerox", "canon", "cisco", "huawei", "asus", "acer", "msi", "gigabyte", "intel", "amd", "nvidia"]),
+    ]),
+    ("model", 1, [
+        (r"(?:модель|model)\s*[:\-]?\s*([A-Z0-9][\w\-/ ]{2,60})", None, ["модель", "model"]),
+        (r"\b(?:Dell|HP|Lenovo|Apple|Asus|Acer|MSI)\s+[A-Z0-9][\w\- ]{2,40}\b", None, ["dell", "hp", "lenovo", "apple", "asus", "acer", "msi"]),
+    ]),
+    ("article", 1, [
+        (r"(?:артикул|арт\.)\s*[:\-]?\s*([A-Z0-9\-]{4,40})", None, ["арт"]),
+        (r"\b[A-Z]{2,}[A-Z0-9\-]{4,}\b", None, None),
+    ]),
+    ("cpu", 0, [
+        (r"\bIntel\s+Core\s+i[3579][-\s]?\d{3,5}[A-Z]{0,2}\b", ["core"], ["intel"]),
+        (r"\bAMD\s+Ryzen\s+[3579]\s*\d{3,4}[A-Z]{0,2}\b", ["ryzen"], ["amd"]),
+        (r"\bXeon\s+[A-Z0-9\-]{3,}\b", None, ["xeon"]),
+        (r"(?:процессор|cpu)\s*[:\-]?\s*([^\n,.;]{5,60})", None, ["процессор", "cpu"]),
+    ]),
+    ("gpu", 0, [
+        (r"\b(?:NVIDIA\s+)?(?:GeForce\s+)?RTX\s*\d{3,4}\s*(?:Ti|SUPER)?\b", ["rtx"], ["nvidia", "geforce", "rtx"]),
+        (r"\b(?:NVIDIA\s+)?(?:GeForce\s+)?GTX\s*\d{3,4}\s*(?:Ti)?\b", ["gtx"], ["nvidia", "geforce", "gtx"]),
+        (r"\b(?:AMD\s+)?Radeon\s+RX\s*\d{3,4}\s*(?:XT)?\b", ["radeon"], ["amd", "radeon"]),
+        (r"(?:видеокарта|gpu)\s*[:\-]?\s*([^\n,.;]{3,60})", None, ["видеокарта", "gpu"]),
+    ]),
+    ("ram", 0, [
+        (r"\b(?:RAM|ОЗУ|оперативн\w+\s+памят\w*)\s*[:\-]?\s*\d{1,3}\s*(?:GB|ГБ)\s*(?:DDR[345])?\b", None, ["ram", "озу", "оперативн"]),
+        (r"\b\d{1,3}\s*(?:GB|ГБ)\s*(?:DDR[345])?\s*(?:RAM|ОЗУ|оперативн\w+\s+памят\w*)\b", ["ram", "озу", "оперативн"], None),
+    ]),
+    ("storage", 0, [
+        (r"\b(?:SSD|HDD|NVMe)\s*[:\-]?\s*\d+(?:[.,]\d+)?\s*(?:TB|ТБ|GB|ГБ)\b", None, ["ssd", "hdd", "nvme"]),
+        (r"\bнакопител\w*\s*[:\-]?\s*(?:SSD|HDD|NVMe)?\s*\d+(?:[.,]\d+)?\s*(?:TB|ТБ|GB|ГБ)\b", None, ["накопител"]),
+        (r"\b\d+(?:[.,]\d+)?\s*(?:TB|ТБ|GB|ГБ)\s*(?:SSD|HDD|NVMe)\b", ["ssd", "hdd", "nvme"], None),
+    ]),
+    ("display", 0, [
+        (r"\b\d{1,2}(?:[.,]\d)?\s*(?:\"|дюйм\w*)\b", ['"', "дюйм"], None),
+        (r"(?:диспле\w*|экран)\s*[:\-]?\s*([^\n,.;]{3,40})", None, ["диспле", "экран"]),
+    ]),
+    ("resolution", 0, [
+        (r"\b\d{3,4}\s*[xX×]\s*\d{3,4}\b", ["x", "×"], None),
+        (r"\b(?:Full\s*HD|FHD|QHD|UHD|4K|2K)\b", None, ["full", "fhd", "qhd", "uhd", "4k", "2k"]),
+    ]),
+    ("os", 0, [
+        (r"\bWindows\s*(?:10|11)\s*(?:Pro|Home|Enterprise)?\b", None, ["windows"]),
+        (r"\bLinux\b", None, ["linux"]),
+        (r"\bUbuntu\b", None, ["ubuntu"]),
+        (r"\bmacOS\b", None, ["macos"]),
+        (r"\bAndroid\s*\d{0,2}\b", None, ["android"]),
+        (r"\biOS\s*\d{0,2}\b", None, ["ios"]),
+    ]),
+    ("delivery_deadline", 1, [
+        (r"(?:срок\s+поставки|поставка)\s*[:\-]?\s*([^\n.]{3,120})", ["поставк"], ["срок", "поставка"]),
+        (r"(в\s+течение\s+\d+\s+(?:рабоч\w+|календарн\w+)\s+дн\w+)", ["течение"], None),
+    ]),
+    ("submission_deadline", 1, [
+        (r"(?:срок\s+подачи\s+заяв\w+)\s*[:\-]?\s*([^\n.]{3,120})", ["подачи"], ["срок"]),
+        (r"(?:прием|приём)\s+заяв\w+\s*[:\-]?\s*([^\n.]{3,120})", None, ["прием", "приём"]),
+    ]),
+    ("experience", 1, [
+        (r"(?:опыт\s+работы)\s*(?:не\s+менее|от)?\s*(\d+)\s*лет", None, ["опыт"]),
+        (r"(?:опыт\s+работы)\s*[:\-]?\s*([^\n.]{3,60})", None, ["опыт"]),
+    ]),
+    ("certificate", 0, [
+        (r"(?:авторизованн\w+\s+дилер|уполномоченн\w+\s+партнер|официальн\w+\s+дистрибьютор)[^\n.]{0,80}", ["дилер", "партнер", "дистрибьютор"], ["авторизованн", "уполномоченн", "официальн"]),
+        (r"(?:сертификат|certificate)[^\n.]{0,80}", None, ["сертификат", "certificate"]),
+    ]),
+    ("price", 1, [
+        (r"(?:цена|стоимость)\s*(?:за\s+единицу)?\s*[:\-]?\s*([\d\s.,]+)\s*(?:тенге|тг|₸)", None, ["цена", "стоимость"]),
+    ]),
+    ("quantity", 1, [
+        (r"(?:количество|кол-во)\s*[:\-]?\s*(\d+)\s*(?:штук|шт|единиц|ед\.)?", None, ["количество", "кол-во"]),
+        (r"(\d+)\s*(?:штук|шт|единиц|ед\.)", ["шт", "ед"], None),
+    ]),
+    ("warranty", 1, [
+        (r"(?:гарантия|гарантийный\s+срок)\s*[:\-]?\s*([^\n.]{2,60})", None, ["гаранти"]),
+        (r"(\d+)\s*(?:лет|года|год|месяц\w*)\s*(?:гарантии)?", ["лет", "год", "месяц"], None),
+    ]),
+]
+
+
+def compile_fields(fields):
+    return [
+        (key, group, [(re.compile(p, re.IGNORECASE), triggers, starts) for p, triggers, starts in patterns])
+        for key, group, patterns in fields
+    ]
+
+
+_COMPILED_FIELDS = compile_fields(FIELDS)
+
+
+def _vocabulary(text):
+    """
+    Все слова документа (куски между пробелами) в нижнем регистре одной
+    строкой. Подстрока без пробелов есть в тексте тогда и только тогда,
+    когда она есть в этой строке, а сама строка обычно в разы короче
+    документа — проверка триггера не проходит по тексту.
+    """
+    return "\n".join(set(text.split())).lower()
 
-    resolution = _first_match(
-        text,
-        [
-            r"\b\d{3,4}\s*[xX×]\s*\d{3,4}\b",
-            r"\b(?:Full\s*HD|FHD|QHD|UHD|4K|2K)\b",
-        ],
-    )
-    if resolution:
-        specs["resolution"] = resolution
 
-    os_value = _first_match(
-        text,
-        [
-            r"\bWindows\s*(?:10|11)\s*(?:Pro|Home|Enterprise)?\b",
-            r"\bLinux\b",
-            r"\bUbuntu\b",
-            r"\bmacOS\b",
-            r"\bAndroid\s*\d{0,2}\b",
-            r"\biOS\s*\d{0,2}\b",
-        ],
-    )
-    if os_value:
-        specs["os"] = os_value
+def match_fields(text, fields=None):
+    """
+    Один проход по тексту собирает его словарь; дальше каждому полю
+    достаются только паттерны, чьи триггеры и начала в словаре есть, и
+    поиск стартует с первого вхождения начала. Результат тот же, что у
+    поочерёдного re.search по всем паттернам, но поле, которого в
+    документе нет, не стоит ни одного прохода по тексту.
+    fields — результат compile_fields(), по умолчанию FIELDS.
+    Возвращает {поле: (номер сработавшего паттерна, значение)}. Значение
+    может быть пустым (совпали одни знаки препинания): такое поле
+    отбрасывают extract_fields() и merge_fields(), но при сборке из частей
+    оно всё равно перекрывает совпадения того же паттерна дальше по тексту.
+    """
+    vocab = _vocabulary(text)
+    low = None
+    found = {}
+    for key, group, patterns in fields or _COMPILED_FIELDS:
+        for no, (pattern, triggers, starts) in enumerate(patterns):
+            if triggers and not any(t in vocab for t in triggers):
+                continue
+            pos = 0
+            if starts:
+                starts = [s for s in starts if s in vocab]
+                if not starts:
+                    continue
+                if low is None:
+                    low = text.lower()
+                # lower() в редких случаях меняет длину — тогда позиции не сопоставить
+                if len(low) == len(text):
+                    pos = min((i for i in map(low.find, starts) if i >= 0), default=0)
+            m = pattern.search(text, pos)
+            if m:
+                # Если захвата нет (или группа не нужна) — всё совпадение
+                found[key] = (no, _clean(m.group(0 if m.lastindex is None or group > m.lastindex else group)))
+                break
+    return found
+
+
+def extract_fields(text, fields=None):
+    """Значения полей текста: {поле: значение}, см. match_fields()."""
+    return {key: value for key, (_, value) in match_fields(text, fields).items() if value}
+
+
+def field_matches(text, fields=None):
+    """
+    Все совпадения всех паттернов полей: {(поле, номер паттерна, начало,
+    конец)}. По ним проверяют, что разрез текста на части не рвёт ни одно
+    совпадение (см. merge_fields()). Паттерны без триггеров и начал в
+    словаре текста пропускаются, как в match_fields().
+    """
+    vocab = _vocabulary(text)
+    return {
+        (key, no, m.start(), m.end())
+        for key, _, patterns in fields or _COMPILED_FIELDS
+        for no, (pattern, triggers, starts) in enumerate(patterns)
+        if not (triggers and not any(t in vocab for t in triggers))
+        and not (starts and not any(s in vocab for s in starts))
+        for m in pattern.finditer(text)
+    }
+
+
+def merge_fields(parts, fields=None):
+    """
+    Поля документа из match_fields() его частей по порядку: у каждого поля
+    — паттерн с наивысшим приоритетом, при равном — из более ранней части.
+    Совпадает с extract_fields(документ), если ни одно совпадение не
+    пересекает границу частей.
+    """
+    found = {}
+    for key, _, _ in fields or _COMPILED_FIELDS:
+        best = None
+        for part in parts:
+            if key in part and (best is None or part[key][0] < best[0]):
+                best = part[key]
+        if best is not None and best[1]:
+            found[key] = best[1]
+    return found
+
+
+def format_requirements(requirements):
+    """Приводит значения полей к виду для показа; меняет и возвращает requirements."""
+    experience = requirements.get("experience")
+    if experience and experience.isdigit():
+        requirements["experience"] = f"не менее {experience} лет"
+
+    if "price" in requirements:
+        price = re.sub(r"\s+", "", requirements["price"])
+        requirements["price"] = f"{price} тенге"
+
+    if "quantity" in requirements:
+        requirements["quantity"] = f"{requirements['quantity']} единиц"
 
-    return specs
+    return requirements
 
 
 def extract_requirements(text):
-    requirements = {}
-
-    product = _first_group(
-        text,
-        [
-            r"(?:предмет закупки|наименование товара|описание товара)\s*[:\-]?\s*([^\n.]{5,120})",
-            r"(?:закупка|поставка)\s*([^\n.]{5,80})",
-        ],
-    )
-    if product:
-        requirements["product"] = product
-
-    brand = _first_group(
-        text,
-        [
-            r"\b(Dell|HP|Lenovo|Apple|Samsung|Philips|Siemens|Xerox|Canon|Cisco|Huawei|Asus|Acer|MSI|Gigabyte|Intel|AMD|NVIDIA)\b",
-        ],
-    )
-    if brand:
-        requirements["brand"] = brand
-
-    model = _first_group(
-        text,
-        [
-            r"(?:модель|model)\s*[:\-]?\s*([A-Z0-9][\w\-/ ]{2,60})",
-            r"\b(?:Dell|HP|Lenovo|Apple|Asus|Acer|MSI)\s+[A-Z0-9][\w\- ]{2,40}\b",
-        ],
-    )
-    if model:
-        requirements["model"] = model
-
-    article = _first_group(
-        text,
-        [
-            r"(?:артикул|арт\.)\s*[:\-]?\s*([A-Z0-9\-]{4,40})",
-            r"\b[A-Z]{2,}[A-Z0-9\-]{4,}\b",
-        ],
-    )
-    if article:
-        requirements["article"] = article
-
-    tech_specs = _extract_tech_specs(text)
-    for key in ("cpu", "gpu", "ram", "storage", "display", "resolution", "os"):
-        if key in tech_specs:
-            requirements[key] = tech_specs[key]
-
-    delivery_deadline = _first_group(
-        text,
-        [
-            r"(?:срок\s+поставки|поставка)\s*[:\-]?\s*([^\n.]{3,120})",
-            r"(в\s+течение\s+\d+\s+(?:рабоч\w+|календарн\w+)\s+дн\w+)",
-        ],
-    )
-    if delivery_deadline:
-        requirements["delivery_deadline"] = delivery_deadline
-
-    submission_deadline = _first_group(
-        text,
-        [
-            r"(?:срок\s+подачи\s+заяв\w+)\s*[:\-]?\s*([^\n.]{3,120})",
-            r"(?:прием|приём)\s+заяв\w+\s*[:\-]?\s*([^\n.]{3,120})",
-        ],
-    )
-    if submission_deadline:
-        requirements["submission_deadline"] = submission_deadline
-
-    experience = _first_group(
-        text,
-        [
-            r"(?:опыт\s+работы)\s*(?:не\s+менее|от)?\s*(\d+)\s*лет",
-            r"(?:опыт\s+работы)\s*[:\-]?\s*([^\n.]{3,60})",
-        ],
-    )
-    if experience:
-        requirements["experience"] = f"не менее {experience} лет" if experience.isdigit() else experience
-
-    certificate = _first_match(
-        text,
-        [
-            r"(?:авторизованн\w+\s+дилер|уполномоченн\w+\s+партнер|официальн\w+\s+дистрибьютор)[^\n.]{0,80}",
-            r"(?:сертификат|certificate)[^\n.]{0,80}",
-        ],
-    )
-    if certificate:
-        requirements["certificate"] = certificate
-
-    price = _first_group(
-        text,
-        [
-            r"(?:цена|стоимость)\s*(?:за\s+единицу)?\s*[:\-]?\s*([\d\s.,]+)\s*(?:тенге|тг|₸)",
-        ],
-    )
-    if price:
-        requirements["price"] = f"{re.sub(r'\\s+', '', price)} тенге"
-
-    quantity = _first_group(
-        text,
-        [
-            r"(?:количество|кол-во)\s*[:\-]?\s*(\d+)\s*(?:штук|шт|единиц|ед\.)?",
-            r"(\d+)\s*(?:штук|шт|единиц|ед\.)",
-        ],
-    )
-    if quantity:
-        requirements["quantity"] = f"{quantity} единиц"
-
-    warranty = _first_group(
-        text,
-        [
-            r"(?:гарантия|гарантийный\s+срок)\s*[:\-]?\s*([^\n.]{2,60})",
-            r"(\d+)\s*(?:лет|года|год|месяц\w*)\s*(?:гарантии)?",
-        ],
-    )
-    if warranty:
-        requirements["warranty"] = warranty
-
-    return requirements
+    return format_requirements(extract_fields(text))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+"""IsolationForest в плоских массивах: оценка всех деревьев пачкой средствами NumPy."""
+import numpy as np
+
+BLOCK_ROWS = 1024
+
+
+def _average_path_length(n):
+    # Те же операции, что в sklearn.ensemble._iforest._average_path_length, —
+    # иначе последние биты оценки разойдутся
+    n = np.asarray(n, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    big = n > 2
+    result[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return result
+
+
+class FlatIsolationForest:
+    """
+    Обученный sklearn.ensemble.IsolationForest, разложенный в общие
+    массивы узлов всех деревьев:
+        feature   — признак развилки (в нумерации столбцов X);
+        threshold — порог; у листьев NaN, сравнение с ним всегда ложно;
+        right     — узел для x > порога (и для NaN, как в sklearn); левый
+                    потомок всегда right - 1, у листа right указывает на сам лист;
+        value     — вклад листа в глубину: его глубина плюс поправка на
+                    число обучающих точек, минус 1.
+    Спуск идёт по уровням сразу для всех строк и всех деревьев, поэтому
+    число вызовов NumPy зависит от глубины деревьев, а не от их числа.
+    decision_function() и score_samples() побитово совпадают с sklearn.
+    """
+
+    def __init__(self, feature, threshold, right, value, roots, depth, n_features, denominator, offset):
+        self.feature = feature
+        self.threshold = threshold
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.n_features = n_features
+        self.denominator = denominator
+        self.offset = offset
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        features, thresholds, rights, values, roots = [], [], [], [], []
+        base, depth = 0, 0
+        for estimator, columns in zip(forest.estimators_, forest.estimators_features_):
+            tree = estimator.tree_
+            # Дети каждой развилки получают соседние номера: левый, затем правый
+            order, children = [0], {}
+            for node in order:
+                if tree.children_left[node] != -1:
+                    children[node] = len(order)
+                    order += [tree.children_left[node], tree.children_right[node]]
+            node_depth = {0: 1}  # как tree.compute_node_depths(): у корня 1
+            for node in order:
+                if node in children:
+                    node_depth[tree.children_left[node]] = node_depth[tree.children_right[node]] = node_depth[node] + 1
+            path = _average_path_length(tree.n_node_samples[order])
+            for i, node in enumerate(order):
+                if node in children:
+                    features.append(columns[tree.feature[node]] if len(columns) != forest.n_features_in_ else tree.feature[node])
+                    thresholds.append(tree.threshold[node])
+                    rights.append(base + children[node] + 1)
+                    values.append(0.0)
+                else:
+                    features.append(0)
+                    thresholds.append(np.nan)
+                    rights.append(base + i)
+                    values.append(node_depth[node] + path[i] - 1.0)
+                    depth = max(depth, node_depth[node] - 1)
+            roots.append(base)
+            base += len(order)
+        return cls(
+            np.asarray(features, dtype=np.intp),
+            np.asarray(thresholds, dtype=np.float64),
+            np.asarray(rights, dtype=np.intp),
+            np.asarray(values, dtype=np.float64),
+            np.asarray(roots, dtype=np.intp),
+            depth,
+            forest.n_features_in_,
+            len(forest.estimators_) * _average_path_length([forest.max_samples_])[0],
+            forest.offset_,
+        )
+
+    def _depths(self, X):
+        # Блок транспонирован: значения одного признака у соседних строк лежат
+        # рядом, а на верхних уровнях строки одного дерева смотрят в один признак
+        rows = X.shape[0]
+        flat = np.ascontiguousarray(X.T).ravel()
+        start = self.feature * rows
+        columns = np.arange(rows)
+        nodes = np.repeat(self.roots[:, None], rows, axis=1)  # (деревья, строки)
+        for _ in range(self.depth):
+            x = flat.take(start.take(nodes) + columns)
+            nodes = self.right.take(nodes) - (x <= self.threshold.take(nodes))
+        # Деревья складываются по порядку, как в sklearn: cumsum не меняет порядок сложений
+        return np.cumsum(self.value.take(nodes), axis=0)[-1]
+
+    def score_samples(self, X):
+        X = np.asarray(X, dtype=np.float32)  # sklearn сравнивает с порогами float32-значения
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"ожидается матрица (n, {self.n_features}), получено {X.shape}")
+        depths = np.empty(X.shape[0])
+        # Блоками по BLOCK_ROWS строк: рабочие массивы спуска остаются в кэше процессора
+        for begin in range(0, X.shape[0], BLOCK_ROWS):
+            depths[begin:begin + BLOCK_ROWS] = self._depths(X[begin:begin + BLOCK_ROWS])
+        if self.denominator == 0:  # лес из одной точки
+            return -np.ones_like(depths)
+        return -(2 ** (-(depths / self.denominator)))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset
@@ -0,0 +1,252 @@
+"""Импорт выгрузок goszakup (CSV/JSONL, можно .gz) в хранилище истории побед.
+
+Запуск: python import_awards.py dump.csv.gz [dump2.jsonl ...] [--db путь] [--batch 5000]
+Файлы читаются потоково, запись идёт пачками по --batch контрактов в
+одной транзакции вместе с отметкой о прочитанном, поэтому прерванный
+импорт продолжается с последней записанной пачки. Повторно встреченные
+контракты пропускаются. Сеть не нужна — только файлы выгрузки.
+В пустую базу выгрузка грузится без агрегатов, которые затем строятся
+одним проходом; в заполненной обновляются только затронутые узлы графа.
+"""
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from itertools import chain
+
+from supplier_index import normalize_bin
+from winner_history import WINNER_DB_PATH
+from winner_store import WinnerStore, parse_amount
+
+# Поле записи → возможные названия колонок в выгрузках (без учёта регистра).
+# Выгрузки разных разделов портала называют их по-разному — недостающие
+# соответствия задаются через --map поле=колонка.
+FIELD_ALIASES = {
+    "key": ["key", "contract_id", "contract_number_sys", "contract_number", "id"],
+    "supplier": ["supplier", "supplier_name", "supplier_name_ru", "supplier_name_kz"],
+    "supplier_bin": ["supplier_bin", "supplier_biin", "supplier_iin"],
+    "customer": ["customer", "customer_name", "customer_name_ru", "customer_name_kz"],
+    "customer_bin": ["customer_bin", "customer_biin"],
+    "tender": ["tender", "tender_name", "subject", "name_ru"],
+    "amount": ["amount", "contract_sum", "contract_sum_wnds", "sum"],
+    "year": ["year", "fin_year"],
+    "date": ["date", "sign_date", "contract_date"],
+}
+
+# Полные названия ОПФ → сокращение; казахские приводятся к русским,
+# чтобы «ЖШС X» и «ТОО X» оказались одним поставщиком
+LEGAL_FORM_NAMES = {
+    "товарищество с ограниченной ответственностью": "ТОО",
+    "жауапкершілігі шектеулі серіктестік": "ТОО",
+    "жауапкершілігі шектеулі серіктестігі": "ТОО",
+    "акционерное общество": "АО",
+    "акционерлік қоғам": "АО",
+    "индивидуальный предприниматель": "ИП",
+    "жеке кәсіпкер": "ИП",
+    "государственное учреждение": "ГУ",
+    "коммунальное государственное учреждение": "КГУ",
+    "республиканское государственное предприятие": "РГП",
+    "производственный кооператив": "ПК",
+}
+LEGAL_FORM_ABBREVIATIONS = {
+    "ТОО": "ТОО", "ЖШС": "ТОО", "АО": "АО", "АҚ": "АО", "ИП": "ИП", "ЖК": "ИП",
+    "ГУ": "ГУ", "КГУ": "КГУ", "РГП": "РГП", "ГКП": "ГКП", "ПК": "ПК",
+}
+_LEGAL_FORM_RE = re.compile(
+    r"^(?:{0})\s+|\s+(?:{0})$".format("|".join(sorted(map(re.escape, LEGAL_FORM_NAMES), key=len, reverse=True))),
+    re.IGNORECASE,
+)
+_QUOTES_RE = re.compile(r"[«»“”„\"']")
+_YEAR_RE = re.compile(r"(?<!\d)(?:19|20)\d\d(?!\d)")
+
+csv.field_size_limit(2**31 - 1)
+
+
+def _abbreviation(word):
+    # Двухбуквенные («Ақ», «Ип») бывают обычными словами — только заглавными
+    return LEGAL_FORM_ABBREVIATIONS.get(word if len(word) <= 2 else word.upper())
+
+
+def normalize_party_name(name):
+    """
+    Название организации в одном написании: без кавычек и лишних
+    пробелов, ОПФ сокращена и стоит в начале —
+    'Товарищество с ограниченной ответственностью "Альфа"' → 'ТОО Альфа'.
+    """
+    name = " ".join(_QUOTES_RE.sub(" ", name or "").split())
+    form = None
+    m = _LEGAL_FORM_RE.search(name)
+    if m:
+        form = LEGAL_FORM_NAMES[m.group().strip().lower()]
+        name = name[:m.start()] + name[m.end():]
+    words = name.split()
+    if not form and words and _abbreviation(words[0]):
+        form = _abbreviation(words.pop(0))
+    elif not form and words and _abbreviation(words[-1]):
+        form = _abbreviation(words.pop())
+    name = " ".join(words)
+    return f"{form} {name}" if form and name else name
+
+
+def _open_text(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8-sig", newline="")
+    return open(path, encoding="utf-8-sig", newline="")
+
+
+def read_records(path):
+    """
+    Записи выгрузки по одной: CSV (разделитель , ; или табуляция —
+    по первой строке) или JSONL. Формат — по расширению без .gz.
+    """
+    base = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if base.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        header = f.readline()
+        delimiter = max(",;\t", key=header.count)
+        yield from csv.DictReader(chain([header], f), delimiter=delimiter)
+
+
+def resolve_columns(columns, mapping=None):
+    """{поле: колонка} по заголовку выгрузки; mapping — явные соответствия поверх FIELD_ALIASES."""
+    lower = {column.strip().lower(): column for column in columns}
+    resolved = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in ([mapping[field]] if mapping and field in mapping else aliases):
+            if alias.lower() in lower:
+                resolved[field] = lower[alias.lower()]
+                break
+    return resolved
+
+
+def normalize_record(raw, columns):
+    """Запись выгрузки → победа для WinnerStore.add_awards() или None, если нет сторон."""
+    def get(field):
+        value = raw.get(columns[field]) if field in columns else None
+        return value.strip() if isinstance(value, str) else value
+
+    supplier, customer = normalize_party_name(get("supplier")), normalize_party_name(get("customer"))
+    if not supplier or not customer:
+        return None
+    supplier_bin, customer_bin = normalize_bin(get("supplier_bin")), normalize_bin(get("customer_bin"))
+    amount = parse_amount(get("amount"))
+    year = get("year")
+    if not year:
+        m = _YEAR_RE.search(str(get("date") or ""))
+        year = m.group() if m else None
+    tender = get("tender") or None
+
+    # Без номера контракта ключ — хэш сторон, суммы, даты и предмета
+    key = get("key")
+    if key:
+        key = f"id:{key}"
+    else:
+        parts = [supplier_bin or supplier, customer_bin or customer, amount, get("date") or year, tender]
+        key = "h:" + hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    return {
+        "supplier": supplier,
+        "supplier_bin": supplier_bin,
+        "customer": customer,
+        "customer_bin": customer_bin,
+        "tender": tender,
+        "amount": amount,
+        "year": int(year) if year and str(year).isdigit() else None,
+        "key": key,
+    }
+
+
+def print_progress(stats):
+    rate = stats["rows"] / max(stats["seconds"], 1e-9)
+    print(
+        f"{stats['source']}: {stats['rows']:,} строк, {rate:,.0f} строк/с, "
+        f"новых {stats['inserted']:,}, повторов {stats['duplicates']:,}, без сторон {stats['invalid']:,}",
+        file=sys.stderr,
+    )
+
+
+def import_dump(path, store, batch_size=5000, mapping=None, resume=True, progress=print_progress, progress_every=5.0,
+                update_aggregates=True):
+    """
+    Загружает одну выгрузку в store. Память — одна пачка. resume —
+    пропустить записи, уже загруженные прошлым запуском (если файл с тех
+    пор не менялся в размере). progress(stats) вызывается не чаще раза в
+    progress_every секунд и в конце. update_aggregates — см.
+    WinnerStore.add_awards().
+    """
+    source, size = os.path.abspath(path), os.path.getsize(path)
+    checkpoint = store.get_checkpoint(source) if resume else None
+    skip = checkpoint[1] if checkpoint and checkpoint[0] == size else 0
+    stats = {"source": path, "rows": 0, "resumed_from": skip, "inserted": 0, "duplicates": 0, "invalid": 0, "seconds": 0.0}
+    start = last_report = time.perf_counter()
+    columns, batch, rows = None, [], 0
+
+    def flush():
+        inserted = store.add_awards(batch, checkpoint=(source, size, rows), update_aggregates=update_aggregates)
+        stats["inserted"] += inserted
+        stats["duplicates"] += len(batch) - inserted
+        batch.clear()
+
+    for rows, raw in enumerate(read_records(path), 1):
+        if columns is None:
+            columns = resolve_columns(raw, mapping)
+        if rows <= skip:
+            continue
+        award = normalize_record(raw, columns)
+        if award is None:
+            stats["invalid"] += 1
+        else:
+            batch.append(award)
+        if len(batch) >= batch_size:
+            flush()
+            now = time.perf_counter()
+            stats["rows"], stats["seconds"] = rows - skip, now - start
+            if progress and now - last_report >= progress_every:
+                progress(stats)
+                last_report = now
+    flush()
+    stats["rows"], stats["seconds"] = max(rows - skip, 0), time.perf_counter() - start
+    if progress:
+        progress(stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="файлы выгрузки: .csv, .jsonl, можно .gz")
+    parser.add_argument("--db", default=WINNER_DB_PATH, help="файл хранилища (по умолчанию TENDERAI_WINNER_DB)")
+    parser.add_argument("--batch", type=int, default=5000, help="контрактов в одной транзакции")
+    parser.add_argument("--map", action="append", default=[], metavar="ПОЛЕ=КОЛОНКА", help="соответствие колонки полю, можно несколько")
+    parser.add_argument("--restart", action="store_true", help="не продолжать с отметок прошлых запусков")
+    args = parser.parse_args()
+
+    mapping = dict(item.split("=", 1) for item in args.map)
+    unknown = set(mapping) - set(FIELD_ALIASES)
+    if unknown:
+        parser.error(f"неизвестные поля: {', '.join(sorted(unknown))}; допустимы: {', '.join(FIELD_ALIASES)}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    store = WinnerStore(args.db)
+    # Прерванная массовая загрузка продолжается массовой
+    bulk = store.aggregates_stale() or not store.stats()["awards"]
+    for path in args.paths:
+        import_dump(path, store, batch_size=args.batch, mapping=mapping, resume=not args.restart, update_aggregates=not bulk)
+    if bulk:
+        start = time.perf_counter()
+        store.refresh_aggregates()
+        print(f"агрегаты построены за {time.perf_counter() - start:.1f} с", file=sys.stderr)
+    print(store.stats(), file=sys.stderr)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Инкрементальный анализ правленых черновиков: сегменты документа и кэш их результатов.
+
+Офицер по закупкам правит черновик и загружает его снова. Документ режется
+на сегменты по границам предложений, причём границы выбираются по
+содержимому текста (content-defined chunking), а не по позиции: правка в
+одном месте меняет один-два сегмента, остальные получаются теми же и
+берутся из кэша. Для каждого сегмента кэшируются все совпадения правил,
+поля требований, упоминания поставщиков и предложения; документ
+собирается из них теми же правилами, что и при полном проходе
+(rules.merge, merge_fields, merge_mentions). Граница допускается, только
+если разрез в ней не рвёт ни одного совпадения («арт. XPS», «16. ГБ»,
+«ТОО ТехноПарк. Астана»), — иначе сборка разошлась бы с полным проходом.
+Эмбеддер без chunked видит только первые max_seq_length токенов документа,
+поэтому кодируется «голова» из начальных сегментов — правка дальше неё не
+пересчитывает эмбеддинг.
+
+Выигрыш — только на повторных загрузках. Первый анализ документа с пустым
+кэшем примерно в 5 раз дороже полного прохода (разбор по сегментам и
+проверка каждой границы), а правка около 1% текста стоит 15–25% полного
+прохода, а не 1%: пересчитываются задетые сегменты, проверки их границ и
+эмбеддинг головы, а сборка документа из сегментов идёт заново. Цифры печатает bench_incremental.py.
+
+Граница зависит только от текста рядом с ней, поэтому сегменты начала
+документа можно разбирать, пока остальное ещё читается (analyze_prefix,
+job_queue — по мере разбора страниц PDF): полный текст получит те же
+сегменты и найдёт их в кэше.
+"""
+import os
+import re
+import zlib
+
+import predictor
+import rules
+import stage_metrics
+from document_cache import DOC_CACHE_TTL, DocumentCache, content_key
+from extract_requirements import field_matches, format_requirements, match_fields, merge_fields
+from supplier_index import merge_mentions
+from winner_history import get_supplier_index
+
+SEGMENT_CACHE_ENTRIES = int(os.environ.get("TENDERAI_SEGMENT_CACHE_ENTRIES", 20000))
+SEGMENT_MIN = 1000  # символов: короче сегмент не закрывается
+SEGMENT_MAX = 8000  # длиннее — закрывается на первой же границе предложения
+BOUNDARY_EVERY = 4  # после SEGMENT_MIN сегмент закрывается в среднем на каждой 4-й границе
+HEAD_MARGIN = 16  # токенов сверх лимита эмбеддера в «голове» документа
+BOUNDARY_CONTEXT = 256  # символов по обе стороны от границы, в которых она проверяется
+
+# Кандидат в границы — конец предложения перед заглавной буквой. Через
+# «. Заглавная» совпадения всё же бывают (сокращения, числа, названия с
+# точкой), поэтому каждый выбранный кандидат проверяется _boundary_safe
+_BOUNDARY = re.compile(r"[.!?]\s+(?=[^\W\d_])")
+
+_segments = DocumentCache(max_entries=SEGMENT_CACHE_ENTRIES, ttl=DOC_CACHE_TTL)
+
+
+def segment_spans(text):
+    """
+    Границы сегментов [(start, end)], покрывающие текст подряд. Сегмент
+    закрывается на первой границе предложения не раньше SEGMENT_MIN
+    символов от его начала, у которой хэш последних 32 символов делится на
+    BOUNDARY_EVERY (или на любой, если сегмент уже длиннее SEGMENT_MAX) и
+    которую не пересекает ни одно совпадение. Обе проверки смотрят только
+    на текст рядом с границей — правка в другом месте её не сдвигает.
+    """
+    spans = list(_closed_spans(text))
+    start = spans[-1][1] if spans else 0
+    if start < len(text) or not spans:
+        spans.append((start, len(text)))
+    return spans
+
+
+def _closed_spans(text, start=0, stop=None):
+    """Сегменты segment_spans(), начиная с границы start, чей конец не дальше stop."""
+    stop = len(text) if stop is None else stop
+    m = _BOUNDARY.search(text, start + SEGMENT_MIN)
+    while m and m.end() <= stop:
+        end = m.end()
+        if text[end].isupper() and (
+            end - start >= SEGMENT_MAX or zlib.crc32(text[end - 32:end].encode("utf-8")) % BOUNDARY_EVERY == 0
+        ) and _boundary_safe(text, end):
+            yield start, end
+            start = end
+            m = _BOUNDARY.search(text, start + SEGMENT_MIN)
+        else:
+            m = _BOUNDARY.search(text, end)
+
+
+def _boundary_safe(text, end):
+    """
+    Разрез в позиции end не меняет ни совпадений правил, ни полей
+    требований, ни упоминаний поставщиков в BOUNDARY_CONTEXT символах
+    вокруг: в окне целиком они те же, что в двух его половинах. Вердикт
+    кэшируется по содержимому окна.
+    """
+    start = max(end - BOUNDARY_CONTEXT, 0)
+    window = text[start:end + BOUNDARY_CONTEXT]
+    key = ("boundary", content_key(window), end - start, get_supplier_index().generation)
+    return _segments.get_or_compute(key, lambda: _split_is_exact(window, end - start))
+
+
+def _split_is_exact(window, cut):
+    left, right = window[:cut], window[cut:]
+    halves = rules.merge([(0, rules.scan(left, exhaustive=True)), (cut, rules.scan(right, exhaustive=True))], exhaustive=True)
+    whole = rules.scan(window, exhaustive=True)
+    if any(set(hits) != set(halves[rule_id]) for rule_id, hits in whole.items()):
+        return False
+    shifted = {(key, no, s + cut, e + cut) for key, no, s, e in field_matches(right)}
+    if field_matches(window) != field_matches(left) | shifted:
+        return False
+    index = get_supplier_index()
+    mentions = merge_mentions([(0, index.find(left)), (cut, index.find(right))])
+    return mentions == index.find(window)
+
+
+def _analyze_segment(segment):
+    sentences = re.split(r"[.!?\n]", segment)
+    return {
+        "index": rules.scan(segment, exhaustive=True),
+        "fields": match_fields(segment),
+        "mentions": get_supplier_index().find(segment),
+        "suspicious": predictor.suspicious_sentences(sentences),
+        "sentences": len(sentences),
+        "precise_numbers": len(re.findall(r"\d+[.,]\d+", segment)),
+    }
+
+
+def _token_count(segment):
+    return len(predictor.get_embedder().tokenizer(segment, add_special_tokens=False, verbose=False)["input_ids"])
+
+
+def _segment_result(text, start, end, generation):
+    key = ("segment", content_key(text[start:end]), generation)
+    return _segments.get_or_compute(key, lambda: _analyze_segment(text[start:end]))
+
+
+def analyze_prefix(text, start=0):
+    """
+    Разбирает в кэш сегменты начала документа, пока он ещё дочитывается.
+    text — прочитанное начало, start — результат прошлого вызова (с какой
+    границы продолжать). Закрываются только границы, за которыми прочитано
+    не меньше BOUNDARY_CONTEXT символов: у полного текста они будут те же,
+    и predict_incremental возьмёт эти сегменты из кэша.
+    """
+    generation = get_supplier_index().generation
+    for begin, end in _closed_spans(text, start, len(text) - BOUNDARY_CONTEXT):
+        _segment_result(text, begin, end, generation)
+        start = end
+    return start
+
+
+def analyze_segments(text, spans):
+    """
+    То же, что predictor.analyze_text(text), но из результатов сегментов:
+    посчитанные раньше берутся из кэша. Возвращает (части, сколько
+    сегментов взято из кэша).
+    """
+    # Упоминания зависят от базы поставщиков — после импорта кэш сегментов не подходит
+    generation = get_supplier_index().generation
+    hits_before = _segments.hits
+    found = [_segment_result(text, start, end, generation) for start, end in spans]
+    reused = _segments.hits - hits_before  # приблизительно, если кэшем пользуются и другие потоки
+    sentences = sum(part["sentences"] for part in found) - (len(found) - 1)  # граница не добавляет предложения
+    parts = {
+        "index": rules.merge([(start, part["index"]) for (start, _), part in zip(spans, found)], exhaustive=predictor.LEGAL_RULE_IDS),
+        "requirements": format_requirements(merge_fields([part["fields"] for part in found])),
+        "mentions": merge_mentions([(start, part["mentions"]) for (start, _), part in zip(spans, found)]),
+        "suspicious": [sentence for part in found for sentence in part["suspicious"]][:5],
+        "sentences": sentences,
+        "precise_numbers": sum(part["precise_numbers"] for part in found),
+    }
+    return parts, reused
+
+
+def embedding_head(text, spans):
+    """
+    Начало текста из целых сегментов, в котором токенов не меньше лимита
+    эмбеддера: эмбеддинг головы тот же, что у всего текста при обычной
+    оценке с обрезкой по лимиту (predict_single(chunked=False)); оценка по
+    окнам (chunked=True) смотрит на весь текст, и с ней голова не
+    совпадает. В кэше эмбеддингов голова находится, пока правки её не
+    касаются.
+    """
+    limit = predictor.get_embedder().max_seq_length + HEAD_MARGIN
+    tokens = 0
+    for start, end in spans:
+        tokens += _segments.get_or_compute(("tokens", content_key(text[start:end])), lambda s=start, e=end: _token_count(text[s:e]))
+        if tokens >= limit:
+            return text[:end]
+    return text
+
+
+def predict_incremental(text, source=None):
+    """
+    Результат как у predictor.predict_single(text, source=source):
+    неизменённые с прошлых анализов сегменты не пересчитываются. В
+    result["incremental"] — сколько сегментов в документе и сколько из них
+    взято из кэша.
+    """
+    with stage_metrics.profiled([text]):
+        with stage_metrics.collect() as shared:
+            with stage_metrics.stage("segments"):
+                spans = segment_spans(text)
+                parts, reused = analyze_segments(text, spans)
+            vecs, anomalies = predictor.embed_and_score([embedding_head(text, spans)])
+        result = predictor.build_result(text, float(anomalies[0]), vecs[0], parts=parts, source=source)
+    stage_metrics.share([result], shared)
+    predictor.remember_notices([text], vecs, [result], [source])
+    result["incremental"] = {"segments": len(spans), "reused": reused}
+    return result
+
+
+def segment_cache_stats():
+    return _segments.stats()
@@ -0,0 +1,292 @@
+"""Фоновая очередь анализа документов: задания в SQLite, пул процессов-исполнителей.
+
+Запуск исполнителей: python job_queue.py [--workers 2] [--dir каталог]
+Приложение запускает их само (TENDERAI_JOB_WORKERS, 0 — не запускать,
+если исполнители работают отдельно). Задания и загруженные файлы лежат в
+TENDERAI_JOBS_DIR и переживают перезапуск: очередь продолжается с того
+же места, а задание упавшего исполнителя через STALE_AFTER секунд без
+отметки берёт другой.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from document_cache import content_key
+from document_text import PARSE_WORKERS, iter_text
+from incremental import analyze_prefix, predict_incremental
+from near_duplicates import DuplicateIndex
+from predictor import predict_single
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOBS_DIR = os.environ.get("TENDERAI_JOBS_DIR", os.path.join(BASE_DIR, ".cache", "jobs"))
+# Каждый исполнитель держит свою копию эмбеддера — число процессов ограничено памятью
+JOB_WORKERS = int(os.environ.get("TENDERAI_JOB_WORKERS", 1))
+STALE_AFTER = 60  # секунд без отметки — исполнитель считается упавшим
+MAX_ATTEMPTS = 3  # задание, которое раз за разом роняет исполнителя, помечается ошибкой
+PROGRESS_EVERY = 0.5  # секунд между записями хода разбора
+KEEP_DAYS = 7
+# Правленый черновик пересчитывается только по изменённым сегментам (incremental.py);
+# кэш сегментов живёт в процессе исполнителя. 0 — каждый раз полный проход
+INCREMENTAL = os.environ.get("TENDERAI_INCREMENTAL", "1") != "0"
+# С включённым INCREMENTAL сегменты прочитанного начала документа разбираются
+# каждые столько символов новых страниц, не дожидаясь конца разбора
+ANALYZE_EVERY = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id        TEXT PRIMARY KEY,
+    key       TEXT NOT NULL,    -- sha256 файла: одинаковые загрузки — одно задание
+    name      TEXT NOT NULL,
+    path      TEXT NOT NULL,
+    status    TEXT NOT NULL,    -- queued, running, done, failed, cancelled
+    stage     TEXT,             -- parse, analyze
+    parsed    INTEGER NOT NULL DEFAULT 0,  -- разобрано страниц PDF или абзацев DOCX
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    created   REAL NOT NULL,
+    started   REAL,
+    finished  REAL,
+    heartbeat REAL,
+    error     TEXT,
+    text      TEXT,
+    result    TEXT              -- JSON результата predict_single
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, created);
+"""
+
+
+class JobQueue:
+    """
+    Очередь заданий в <path>/jobs.sqlite, файлы — в <path>/files под
+    хэшем содержимого. Одним экземпляром пользуются и приложение (submit,
+    get, cancel, result), и исполнители (claim, run); между процессами
+    задания делятся через SQLite в режиме WAL.
+    """
+
+    def __init__(self, path=JOBS_DIR):
+        self.path = path
+        self.files_dir = os.path.join(path, "files")
+        os.makedirs(self.files_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(path, "jobs.sqlite"), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._duplicates = None  # индекс копий нужен только исполнителям
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def submit(self, data, name):
+        """
+        Ставит файл (байты и имя) в очередь и возвращает id задания. Если
+        такой же файл уже в очереди, в работе или разобран, возвращает то
+        задание — повторная загрузка не считается заново.
+        """
+        key = content_key(data)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status IN ('queued', 'running', 'done') ORDER BY created DESC LIMIT 1", (key,)
+            ).fetchone()
+            if row:
+                return row["id"]
+            path = os.path.join(self.files_dir, key + os.path.splitext(name)[1].lower())
+            if not os.path.exists(path):
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO jobs (id, key, name, path, status, created) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, key, name, path, time.time()),
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Состояние задания без текста и результата или None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, name, status, stage, parsed, attempts, created, started, finished, error FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def result(self, job_id):
+        """(текст, результат) выполненного задания или None."""
+        with self._lock:
+            row = self._conn.execute("SELECT text, result FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+        return (row["text"], json.loads(row["result"])) if row else None
+
+    def cancel(self, job_id):
+        """Отменяет задание в очереди или в работе; исполнитель бросает его при следующей отметке."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id)
+            )
+        return cursor.rowcount > 0
+
+    def claim(self):
+        """
+        Берёт самое старое задание из очереди (или брошенное упавшим
+        исполнителем) одним UPDATE, поэтому два исполнителя не получат
+        одно и то же. Возвращает {"id", "name", "path"} или None.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                ("Исполнитель аварийно завершался на этом документе", now, now - STALE_AFTER, MAX_ATTEMPTS),
+            )
+            row = self._conn.execute(
+                """
+                UPDATE jobs SET status = 'running', stage = 'parse', parsed = 0, attempts = attempts + 1, started = ?, heartbeat = ?
+                WHERE id = (
+                    SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND heartbeat < ?)
+                    ORDER BY created LIMIT 1
+                )
+                RETURNING id, name, path
+                """,
+                (now, now, now - STALE_AFTER),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def _update(self, job_id, **fields):
+        """Обновляет задание в работе и его отметку; False — задание отменено."""
+        sets = "".join(f"{name} = ?, " for name in fields)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {sets}heartbeat = ? WHERE id = ? AND status = 'running'", (*fields.values(), time.time(), job_id)
+            )
+        return cursor.rowcount > 0
+
+    def _heartbeat(self, job_id, stop):
+        # Отметка идёт и пока работает predict_single, который не делится на шаги
+        while not stop.wait(STALE_AFTER / 4):
+            self._update(job_id)
+
+    def run(self, job):
+        """
+        Выполняет взятое задание: разбор по страницам, затем анализ. В
+        инкрементальном режиме сегменты начала документа анализируются
+        ещё во время разбора — пока процессы document_text разбирают
+        следующие страницы.
+        """
+        job_id = job["id"]
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stop), daemon=True).start()
+        try:
+            parts, last = [], time.monotonic()
+            unread, analyzed = 0, 0  # символов после прошлого analyze_prefix; докуда он дошёл
+            for part in iter_text(job["path"], name=job["name"], workers=PARSE_WORKERS):
+                parts.append(part)
+                unread += len(part) + 1
+                if INCREMENTAL and unread >= ANALYZE_EVERY:
+                    analyzed, unread = analyze_prefix(" ".join(parts), analyzed), 0
+                if time.monotonic() - last >= PROGRESS_EVERY:
+                    last = time.monotonic()
+                    if not self._update(job_id, parsed=len(parts)):
+                        return
+            text = " ".join(parts)
+            if len(text) < 50:
+                self._update(job_id, status="failed", finished=time.time(), error="Не удалось извлечь текст из файла")
+                return
+            if not self._update(job_id, stage="analyze", parsed=len(parts)):
+                return
+            if self._duplicates is None:
+                self._duplicates = DuplicateIndex()
+            # Копии отмечаются при приёме, до анализа: проверка не требует эмбеддингов
+            check = self._duplicates.check(text, name=job["name"])
+            # Источник в индексе похожих тендеров — само задание: имя файла
+            # («ТЗ.pdf») у разных закупок совпадает, и они заменяли бы друг друга
+            if INCREMENTAL:
+                result = predict_incremental(text, source=f"job:{job_id}")
+            else:
+                result = predict_single(text, source=f"job:{job_id}")
+            if check:
+                result["near_duplicate"] = {name: value for name, value in check.items() if name != "key"}
+                self._duplicates.set_result(check["key"], result)
+            self._update(job_id, status="done", finished=time.time(), text=text, result=json.dumps(result, ensure_ascii=False))
+        except Exception as e:  # ошибка документа не должна останавливать исполнителя
+            self._update(job_id, status="failed", finished=time.time(), error=f"{type(e).__name__}: {e}")
+        finally:
+            stop.set()
+
+    def purge(self, older_than=KEEP_DAYS * 86400):
+        """Удаляет завершённые задания старше older_than секунд и файлы, на которые больше никто не ссылается."""
+        cutoff = time.time() - older_than
+        with self._lock, self._conn:
+            paths = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT path FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?", (cutoff,)
+            )]
+            self._conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?", (cutoff,))
+            used = {row[0] for row in self._conn.execute(
+                "SELECT path FROM jobs WHERE path IN (SELECT value FROM json_each(?))", (json.dumps(paths),)
+            )}
+        for path in set(paths) - used:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def work(path=JOBS_DIR, parent=None, poll=0.5):
+    """Цикл исполнителя: задания по одному, пока жив процесс parent (если задан)."""
+    queue = JobQueue(path)
+    while parent is None or os.getppid() == parent:
+        job = queue.claim()
+        if job is None:
+            time.sleep(poll)
+            continue
+        queue.run(job)
+
+
+def start_workers(count=JOB_WORKERS, path=JOBS_DIR):
+    """
+    Запускает исполнителей отдельным процессом (этот же файл), который
+    завершается вместе с текущим. Возвращает Popen или None при count = 0.
+    """
+    if count <= 0:
+        return None
+    return subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--workers", str(count), "--dir", path, "--parent", str(os.getpid()),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1), help="процессов-исполнителей")
+    parser.add_argument("--dir", default=JOBS_DIR, help="каталог очереди (по умолчанию TENDERAI_JOBS_DIR)")
+    parser.add_argument("--parent", type=int, help="завершиться вместе с этим процессом")
+    parser.add_argument("--keep-days", type=float, default=KEEP_DAYS, help="сколько дней хранить завершённые задания")
+    args = parser.parse_args()
+
+    JobQueue(args.dir).purge(args.keep_days * 86400)
+    if args.workers == 1:
+        work(args.dir, args.parent)
+        return
+    # spawn: исполнители сами запускают пул разбора страниц (document_text)
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=work, args=(args.dir, os.getpid())) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            if args.parent and os.getppid() != args.parent:
+                break
+            time.sleep(1)
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
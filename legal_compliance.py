@@ -1,7 +1,8 @@
-import re
+import rules
 
 # ─────────────────────────────────────────────
 # ПРАВОВЫЕ ПРАВИЛА — Закон РК о госзакупках
+# Паттерны в нижнем регистре — применяются к text.lower() (см. rules.py)
 # ─────────────────────────────────────────────
 
 LAW_REF = "Закон РК № 106-VIII «О государственных закупках» (2024)"
@@ -28,8 +29,8 @@ LEGAL_RULES = [
         "patterns": [
             r"\bартикул\s*[:\s]\s*\w+",
             r"\bарт\.\s*\w+",
-            r"\bмодель\s*[:\s]\s*[A-Z0-9\-]{4,}",
-            r"\b[A-Z]{2,}\d{4,}[A-Z0-9\-]*\b",
+            r"\bмодель\s*[:\s]\s*[a-z0-9\-]{4,}",
+            r"\b[a-z][a-z]+\d{4,}[a-z0-9\-]*\b",
         ],
         "severity": "medium"
     },
@@ -82,13 +83,21 @@ LEGAL_RULES = [
     },
 ]
 
+# Для вердикта достаточно первого совпадения первого сработавшего паттерна
+for _rule in LEGAL_RULES:
+    rules.register(f"legal.{_rule['id']}", _rule["patterns"], limit=1)
+LEGAL_RULE_IDS = [f"legal.{rule['id']}" for rule in LEGAL_RULES]
+
 # ─────────────────────────────────────────────
 # ОСНОВНАЯ ФУНКЦИЯ
 # ─────────────────────────────────────────────
 
-def check_legal_compliance(text):
+def check_legal_compliance(text, index=None, spans=False):
     """
     Проверяет текст тендера на соответствие законодательству РК о госзакупках.
+    index — готовый rules.scan() документа, чтобы не сканировать текст повторно.
+    spans=True — тот же проход собирает все совпадения (для подсветки);
+    переданный index тогда должен быть построен с exhaustive=True.
     
     Возвращает список словарей:
     {
@@ -96,23 +105,23 @@ def check_legal_compliance(text):
         "article": "Статья XX",
         "message": "Описание",
         "found": "Найденный текст" (только при нарушении),
-        "severity": "high" | "medium"
+        "severity": "high" | "medium",
+        "spans": [(start, end), ...] (только при spans=True)
     }
     """
     results = []
-    text_lower = text.lower()
+    if index is None:
+        index = rules.scan(text, LEGAL_RULE_IDS, exhaustive=spans)
     
     for rule in LEGAL_RULES:
         found_match = None
         
-        for pattern in rule["patterns"]:
-            match = re.search(pattern, text_lower, re.IGNORECASE)
-            if match:
-                # Берём контекст вокруг найденного
-                start = max(0, match.start() - 20)
-                end = min(len(text), match.end() + 20)
-                found_match = "..." + text[start:end].strip() + "..."
-                break
+        hit = rules.first_hit(index, f"legal.{rule['id']}")
+        if hit:
+            # Берём контекст вокруг найденного
+            start = max(0, hit[0] - 20)
+            end = min(len(text), hit[1] + 20)
+            found_match = "..." + text[start:end].strip() + "..."
         
         if found_match:
             results.append({
@@ -130,10 +139,24 @@ def check_legal_compliance(text):
                 "found": None,
                 "severity": rule["severity"]
             })
+        if spans:
+            results[-1]["spans"] = sorted((start, end) for start, end, _, _ in index[f"legal.{rule['id']}"])
     
     return results
 
 
+def get_violation_spans(compliance_results):
+    """
+    Все нарушения документа одним отсортированным списком
+    (start, end, rule_id, severity) — для подсветки текста в UI.
+    Ожидает результат check_legal_compliance(..., spans=True).
+    """
+    spans = []
+    for rule, item in zip(LEGAL_RULES, compliance_results):
+        spans.extend((start, end, rule["id"], rule["severity"]) for start, end in item.get("spans", ()))
+    return sorted(spans)
+
+
 def get_legal_summary(compliance_results):
     """
     Возвращает краткое резюме правового анализа.
@@ -0,0 +1,203 @@
+"""Поиск почти одинаковых тендеров: шинглы, MinHash и LSH по тексту документа, без эмбеддингов.
+
+Запуск: python near_duplicates.py [--db путь] [ТЕКСТ.txt ...]
+Без файлов печатает размер индекса; с файлами — проверяет их тексты
+(не добавляя в индекс) и печатает найденные копии и шаблоны.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from document_cache import content_key
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DUPLICATES_DB_PATH = os.environ.get("TENDERAI_DUPLICATES_DB", os.path.join(BASE_DIR, ".cache", "duplicates.sqlite"))
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 32  # по NUM_PERM // BANDS = 4 значения в полосе: кандидат при J=0.5 — в 87% случаев, при J=0.8 — почти всегда
+DUPLICATE_MIN = 0.85  # оценка Жаккара, с которой документ считается копией
+TEMPLATE_MIN = 0.5  # с этой — тот же шаблон, документ попадает в кластер совпавшего
+MATCHES_TOP = 5
+BLOCK_SHINGLES = 4096
+
+_WORD = re.compile(r"\w+")
+_rng = np.random.default_rng(20240917)  # постоянное зерно: подписи должны совпадать между запусками
+# Универсальное хэширование умножением: (a·x + b) mod 2^64, старшие 32 бита
+_A = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_SHINGLE_MULT = np.uint64(0x9E3779B97F4A7C15)
+_BAND_MULT = _rng.integers(1, 2 ** 63, NUM_PERM // BANDS, dtype=np.uint64) | np.uint64(1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id        INTEGER PRIMARY KEY,
+    key       TEXT NOT NULL UNIQUE,  -- sha256 текста (document_cache.content_key)
+    name      TEXT,
+    signature BLOB NOT NULL,         -- NUM_PERM значений MinHash, uint32
+    cluster   INTEGER NOT NULL,      -- id первого документа шаблона
+    result    TEXT,                  -- JSON результата анализа, если он уже есть
+    added     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_cluster ON documents (cluster);
+-- Полосы LSH: хэш полосы вместе с её номером
+CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, document INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket);
+"""
+
+
+def shingles(text, k=SHINGLE_WORDS):
+    """Хэши (uint64) различных шинглов из k подряд идущих слов текста в нижнем регистре."""
+    words = _WORD.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    vocabulary = {}
+    ids = np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for w in words), dtype=np.intp, count=len(words))
+    hashes = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in vocabulary), dtype=np.uint64, count=len(vocabulary))[ids]
+    k = min(k, len(hashes))
+    combined = np.zeros(len(hashes) - k + 1, dtype=np.uint64)
+    for j in range(k):  # полиномиальный хэш окна; переполнение uint64 — часть хэша
+        combined = combined * _SHINGLE_MULT + hashes[j:len(hashes) - k + 1 + j]
+    return np.unique(combined)
+
+
+def signature(text):
+    """Подпись MinHash текста: NUM_PERM значений uint32; None, если в тексте нет слов."""
+    hashes = shingles(text)
+    if not len(hashes):
+        return None
+    result = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    # Блоками: матрица шинглы × перестановки большого документа не держится в памяти целиком
+    with np.errstate(over="ignore"):
+        for start in range(0, len(hashes), BLOCK_SHINGLES):
+            block = hashes[start:start + BLOCK_SHINGLES, None] * _A + _B
+            np.minimum(result, block.min(axis=0), out=result)
+    return (result >> np.uint64(32)).astype(np.uint32)
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара по двум подписям."""
+    return float(np.mean(first == second))
+
+
+def _buckets(sig):
+    bands = sig.astype(np.uint64).reshape(BANDS, -1)
+    with np.errstate(over="ignore"):
+        hashed = (bands * _BAND_MULT).sum(axis=1) * _SHINGLE_MULT + np.arange(BANDS, dtype=np.uint64)
+    return hashed.view(np.int64).tolist()  # SQLite хранит знаковые 64-битные целые
+
+
+class DuplicateIndex:
+    """
+    Подписи всех принятых документов в SQLite. check() находит по полосам
+    LSH кандидатов, уточняет сходство по полным подписям и относит документ
+    к кластеру шаблона лучшего совпадения. Документы одного кластера
+    связаны цепочкой совпадений, а не все попарно. Вместе с подписью можно
+    сохранить результат анализа (set_result) — пакетная оценка берёт его
+    для копий вместо повторного анализа.
+    """
+
+    def __init__(self, path=DUPLICATES_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def check(self, text, name=None, add=True, key=None, sig=None):
+        """
+        Проверяет документ и (при add) добавляет его в индекс:
+            {"key", "known" — этот же текст уже был, "cluster", "cluster_size",
+             "duplicate_of" — лучшая копия {"key", "name", "similarity"} или None,
+             "matches" — до MATCHES_TOP документов того же шаблона}.
+        sig — готовая подпись, если она посчитана заранее (в воркере разбора).
+        Пустой текст не проверяется: None.
+        """
+        key = content_key(text) if key is None else key
+        sig = signature(text) if sig is None else sig
+        if sig is None:
+            return None
+        buckets = _buckets(sig)
+        with self._lock, self._conn:
+            own = self._conn.execute("SELECT id, cluster FROM documents WHERE key = ?", (key,)).fetchone()
+            rows = self._conn.execute(
+                "SELECT id, key, name, signature, cluster FROM documents WHERE id IN ("
+                "SELECT DISTINCT document FROM buckets WHERE bucket IN (SELECT value FROM json_each(?)))",
+                (json.dumps(buckets),),
+            ).fetchall()
+            matches = []
+            for row in rows:
+                if row["key"] == key:
+                    continue
+                score = similarity(sig, np.frombuffer(row["signature"], dtype=np.uint32))
+                if score >= TEMPLATE_MIN:
+                    matches.append({"key": row["key"], "name": row["name"], "similarity": round(score, 3), "cluster": row["cluster"]})
+            matches.sort(key=lambda match: -match["similarity"])
+            if own is not None:
+                cluster = own["cluster"]
+            elif matches:
+                cluster = matches[0]["cluster"]
+            else:
+                cluster = None
+            if own is None and add:
+                cursor = self._conn.execute(
+                    "INSERT INTO documents (key, name, signature, cluster, added) VALUES (?, ?, ?, COALESCE(?, 0), ?)",
+                    (key, name, sig.tobytes(), cluster, time.time()),
+                )
+                if cluster is None:  # первый документ шаблона
+                    cluster = cursor.lastrowid
+                    self._conn.execute("UPDATE documents SET cluster = ? WHERE id = ?", (cluster, cluster))
+                self._conn.executemany("INSERT INTO buckets (bucket, document) VALUES (?, ?)", [(b, cursor.lastrowid) for b in buckets])
+            size = self._conn.execute("SELECT COUNT(*) FROM documents WHERE cluster = ?", (cluster,)).fetchone()[0] if cluster else 1
+        best = matches[0] if matches and matches[0]["similarity"] >= DUPLICATE_MIN else None
+        return {
+            "key": key,
+            "known": own is not None,
+            "cluster": cluster,
+            "cluster_size": max(size, 1),
+            "duplicate_of": {"key": best["key"], "name": best["name"], "similarity": best["similarity"]} if best else None,
+            "matches": [{"name": m["name"], "similarity": m["similarity"]} for m in matches[:MATCHES_TOP]],
+        }
+
+    def set_result(self, key, result):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE documents SET result = ? WHERE key = ?", (json.dumps(result, ensure_ascii=False, default=str), key))
+
+    def result(self, key):
+        """Сохранённый результат анализа документа или None."""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM documents WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def stats(self):
+        with self._lock:
+            documents, clusters = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT cluster) FROM documents").fetchone()
+        return {"documents": documents, "clusters": clusters}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DUPLICATES_DB_PATH, help="файл индекса (по умолчанию TENDERAI_DUPLICATES_DB)")
+    parser.add_argument("texts", nargs="*", help="текстовые файлы для проверки")
+    args = parser.parse_args()
+    index = DuplicateIndex(args.db)
+    for path in args.texts:
+        with open(path, encoding="utf-8") as f:
+            print(path, json.dumps(index.check(f.read(), name=path, add=False), ensure_ascii=False))
+    print(index.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Эмбеддер MiniLM на ONNX Runtime: однократный экспорт из PyTorch и инференс без torch.
+
+Запуск: python onnx_embedder.py [--int8] [--dir .cache/onnx]
+Заранее экспортирует модель (и квантует веса в int8), чтобы первый
+запрос сервиса или воркера не ждал экспорта. Выбор бэкенда —
+TENDERAI_EMBEDDER_BACKEND в predictor.py; сверка точности и скорости —
+bench_embedder.py.
+"""
+import argparse
+import inspect
+import os
+import re
+
+import numpy as np
+
+try:
+    import onnxruntime
+except ImportError:  # без onnxruntime predictor остаётся на PyTorch
+    onnxruntime = None
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+def available():
+    return onnxruntime is not None
+
+
+def model_dir(root, model_name):
+    return os.path.join(root, re.sub(r"[^\w.\-]+", "_", model_name))
+
+
+def export(model_name, path):
+    """
+    Экспортирует трансформер sentence-transformers в <path>/model.onnx
+    (выход — last_hidden_state, оси батча и токенов динамические), рядом
+    кладёт токенизатор и max_seq_length. Нужны torch, sentence-transformers и onnx.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    config = model[1].get_config_dict()
+    # sentence-transformers до 5.x хранит режим флагами pooling_mode_*_tokens
+    pooling = config.get("pooling_mode", "mean" if config.get("pooling_mode_mean_tokens") else None)
+    if pooling != "mean":  # OnnxEmbedder повторяет только усреднение по токенам
+        raise ValueError(f"{model_name}: пулинг {pooling!r}, поддерживается только mean")
+    tokenizer = model.tokenizer
+    os.makedirs(path, exist_ok=True)
+    tokenizer.save_pretrained(path)
+    with open(os.path.join(path, "max_seq_length"), "w") as f:
+        f.write(str(model.max_seq_length))
+
+    sample = tokenizer(["Пример текста тендерной документации"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(names, inputs))).last_hidden_state
+
+    axes = {name: {0: "batch", 1: "tokens"} for name in names + ["last_hidden_state"]}
+    # Экспорт через TorchScript: dynamo-экспортёру новых torch нужен onnxscript
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    tmp = os.path.join(path, f"{FP32_FILE}.{os.getpid()}.tmp")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(model[0].auto_model).eval(), tuple(sample[name] for name in names), tmp,
+            input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14, **options,
+        )
+    os.replace(tmp, os.path.join(path, FP32_FILE))
+
+
+def quantize(path):
+    """Динамическая int8-квантизация весов: model.onnx → model.int8.onnx."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp = os.path.join(path, f"{INT8_FILE}.{os.getpid()}.tmp")
+    quantize_dynamic(os.path.join(path, FP32_FILE), tmp, weight_type=QuantType.QInt8)
+    os.replace(tmp, os.path.join(path, INT8_FILE))
+
+
+class OnnxEmbedder:
+    """
+    Замена SentenceTransformer для predictor: encode() с усреднением по
+    токенам, tokenizer и max_seq_length. Тексты длиннее max_seq_length
+    обрезаются так же, как в PyTorch.
+    """
+
+    def __init__(self, path, int8=False, threads=None):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        with open(os.path.join(path, "max_seq_length")) as f:
+            self.max_seq_length = int(f.read())
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(path, INT8_FILE if int8 else FP32_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = [item.name for item in self.session.get_inputs()]
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        # Как в SentenceTransformer: длинные тексты вместе — меньше паддинга в батче
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            encoded = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+            feeds = {name: encoded.get(name, np.zeros_like(encoded["input_ids"])).astype(np.int64) for name in self._inputs}
+            hidden = self.session.run(None, feeds)[0]
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            parts.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        if not parts:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        vecs = np.empty((len(texts), parts[0].shape[1]), dtype=np.float32)
+        vecs[order] = np.concatenate(parts)
+        return vecs[0] if single else vecs
+
+
+def load(model_name, root, int8=False, threads=None):
+    """Эмбеддер на ONNX Runtime; при первом вызове экспортирует (и квантует) модель в root."""
+    if onnxruntime is None:
+        raise ImportError("для ONNX-бэкенда нужны onnx и onnxruntime: pip install onnx onnxruntime")
+    path = model_dir(root, model_name)
+    if not os.path.exists(os.path.join(path, FP32_FILE)):
+        export(model_name, path)
+    if int8 and not os.path.exists(os.path.join(path, INT8_FILE)):
+        quantize(path)
+    return OnnxEmbedder(path, int8, threads)
+
+
+def main():
+    from predictor import MODEL_NAME, ONNX_DIR
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--int8", action="store_true", help="также квантовать веса в int8")
+    parser.add_argument("--dir", default=ONNX_DIR, help="каталог моделей (по умолчанию TENDERAI_ONNX_DIR)")
+    parser.add_argument("--model", default=MODEL_NAME)
+    args = parser.parse_args()
+    path = model_dir(args.dir, args.model)
+    export(args.model, path)
+    print(f"экспортирован {os.path.join(path, FP32_FILE)}")
+    if args.int8:
+        quantize(path)
+        print(f"квантован {os.path.join(path, INT8_FILE)}")
+
+
+if __name__ == "__main__":
+    main()
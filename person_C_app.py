@@ -1,11 +1,14 @@
 ﻿# -*- coding: utf-8 -*-
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import streamlit as st
-import pdfplumber
-import docx
 import plotly.graph_objects as go
-from predictor import predict_single
+from predictor import predict_batch
+from document_text import PARSE_WORKERS, extract_text
+from document_cache import DocumentCache, content_key
+from job_queue import JobQueue, start_workers
 from datetime import datetime
-import re
+import html
 
 try:
     from fpdf import FPDF
@@ -43,6 +46,7 @@ html, body, [class*="css"] { font-family: 'Inter', sans-serif; color: var(--text
 .hist-low { background:#133025; border:1px solid #1E694C; border-radius:10px; padding:0.6rem 1rem; margin:0.3rem 0; }
 .highlight-red { background:#5A212A; color:#FFC8D0; padding:1px 4px; border-radius:4px; }
 .highlight-orange { background:#5E431A; color:#FFE5B0; padding:1px 4px; border-radius:4px; }
+.highlight-sentence { background:#3A2A4A; border-bottom:1px dashed #FFC8D0; }
 .metric-box { background: var(--bg-panel); border: 1px solid var(--border-main); border-radius: 12px; padding: 1rem; text-align: center; }
 .metric-val { font-size: 1.6rem; font-weight: 700; color: #8D86FF; }
 .metric-lbl { font-size: 0.75rem; color: var(--text-soft); margin-top: 4px; }
@@ -97,16 +101,7 @@ html, body, [class*="css"] { font-family: 'Inter', sans-serif; color: var(--text
 if "history" not in st.session_state:
     st.session_state.history = []
 
-def extract_text(file):
-    if file.name.endswith(".pdf"):
-        with pdfplumber.open(file) as pdf:
-            return " ".join([p.extract_text() or "" for p in pdf.pages])
-    elif file.name.endswith(".docx"):
-        doc = docx.Document(file)
-        return " ".join([p.text for p in doc.paragraphs])
-    return ""
-
-def show_gauge(score, height=360):
+def show_gauge(score, height=360, key=None):
     color = "#ff4444" if score >= 70 else "#ffaa00" if score >= 40 else "#00cc66"
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
@@ -132,18 +127,140 @@ def show_gauge(score, height=360):
         plot_bgcolor="#0F1117",
         font={"color": "#E6EAFF"},
     )
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, key=key)
+
+HEATMAP_PAGE_CHARS = 20000  # столько текста тепловая карта отдаёт браузеру за раз
+
+def sentence_spans(text, sentences):
+    """(start, end) подозрительных предложений: они идут в порядке текста, поэтому поиск продолжается с конца предыдущего."""
+    spans, pos = [], 0
+    for sent in sentences:
+        start = text.find(sent, pos)
+        if start < 0:
+            continue
+        spans.append((start, start + len(sent)))
+        pos = start + len(sent)
+    return spans
+
+def highlight_text(text, spans, sentences=(), start=0, end=None):
+    """
+    Подсветка text[start:end] одним линейным проходом: spans — отсортированные
+    (start, end, rule_id, severity) из result["legal_spans"], sentences —
+    (start, end) подозрительных предложений из sentence_spans(). Нарушения
+    подсвечиваются внутри предложений.
+    """
+    end = len(text) if end is None else end
+    legal, pos = [], start
+    for s, e, rule_id, severity in spans:
+        s, e = max(s, pos), min(e, end)  # пересечения — выигрывает более ранний фрагмент
+        if s < e:
+            legal.append((s, e, rule_id, severity))
+            pos = e
+    sentences = [(max(s, start), min(e, end)) for s, e in sentences if s < end and e > start]
+    # Точки смены подсветки; между соседними — один кусок текста
+    cuts = sorted({start, end, *(p for s, e, _, _ in legal for p in (s, e)), *(p for span in sentences for p in span)})
+    parts, i, j = [], 0, 0
+    for a, z in zip(cuts, cuts[1:]):
+        while i < len(legal) and legal[i][1] <= a:
+            i += 1
+        while j < len(sentences) and sentences[j][1] <= a:
+            j += 1
+        piece = html.escape(text[a:z])
+        if i < len(legal) and legal[i][0] <= a:
+            _, _, rule_id, severity = legal[i]
+            css = "highlight-red" if severity == "high" else "highlight-orange"
+            piece = f'<span class="{css}" title="{rule_id}">{piece}</span>'
+        if j < len(sentences) and sentences[j][0] <= a:
+            piece = f'<span class="highlight-sentence">{piece}</span>'
+        parts.append(piece)
+    return "".join(parts)
+
+def show_heatmap(text, result, key):
+    """Тепловая карта постранично: в браузер уходит HEATMAP_PAGE_CHARS символов, а не весь документ."""
+    pages = max(1, -(-len(text) // HEATMAP_PAGE_CHARS))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Страница текста (всего {pages})", min_value=1, max_value=pages, value=1, key=key)
+    start = (page - 1) * HEATMAP_PAGE_CHARS
+    end = min(len(text), start + HEATMAP_PAGE_CHARS)
+    sentences = sentence_spans(text, result.get("suspicious_sentences", []))
+    highlighted = highlight_text(text, result.get("legal_spans", []), sentences, start, end)
+    st.markdown(f'<div class="card" style="font-size:0.82rem;line-height:1.7;color:#E6EAFF;max-height:300px;overflow-y:auto;">{highlighted}</div>', unsafe_allow_html=True)
+    if pages > 1:
+        st.caption(f"Символы {start + 1:,}–{end:,} из {len(text):,}")
+
+@st.cache_resource
+def get_document_cache():
+    # Один кэш на процесс: общие тексты и результаты для всех сессий
+    return DocumentCache()
+
+@st.cache_resource
+def get_job_queue():
+    # Очередь и исполнители одни на процесс сервера; задания переживают его перезапуск
+    start_workers()
+    return JobQueue()
+
+def session_job(queue, file):
+    """
+    Задание анализа загруженного файла: одно на загрузку в этой сессии,
+    пока пользователь не запустит его заново. Одинаковые файлы из разных
+    сессий получают одно задание.
+    """
+    jobs = st.session_state.setdefault("jobs", {})
+    job = queue.get(jobs[file.file_id]) if file.file_id in jobs else None
+    if job is None:
+        jobs[file.file_id] = queue.submit(file.getvalue(), file.name)
+        job = queue.get(jobs[file.file_id])
+    return job
 
-def highlight_text(text, suspicious_sentences):
-    RESTRICTION_WORDS = ["строго", "исключительно", "авторизованный дилер", "уполномоченный дилер", "эксклюзивный"]
-    snippet = text[:3000]
-    for sent in suspicious_sentences:
-        if len(sent) > 10 and sent in snippet:
-            snippet = snippet.replace(sent, f'<span class="highlight-red">{sent}</span>')
-    for word in RESTRICTION_WORDS:
-        pattern = re.compile(re.escape(word), re.IGNORECASE)
-        snippet = pattern.sub(f'<span class="highlight-orange">{word}</span>', snippet)
-    return snippet
+@st.fragment(run_every=1.0)
+def show_job_progress(queue, job_id, name):
+    # Раз в секунду перерисовывается только этот блок, а не вся страница
+    job = queue.get(job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        st.rerun()
+    if job["status"] == "queued":
+        st.info("Документ в очереди на анализ...")
+    elif job["stage"] == "parse":
+        unit = "страниц" if name.lower().endswith(".pdf") else "абзацев"
+        st.info(f"Извлекаем текст... Разобрано {unit}: {job['parsed']}")
+    else:
+        st.info("Анализируем документ...")
+    if st.button("Отменить анализ", key=f"cancel_{job_id}"):
+        queue.cancel(job_id)
+        st.rerun()
+
+@st.cache_resource
+def get_parse_pool():
+    # Процессы разбора живут, пока работает сервер, — spawn не повторяется на каждое сравнение
+    return ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def cached_texts(files):
+    """
+    Тексты нескольких файлов через общий кэш. Промахи разбираются
+    одновременно в пуле процессов (pdfplumber упирается в GIL, потоки
+    его не ускорят), так что время — примерно как у самого долгого файла.
+    """
+    cache, pool = get_document_cache(), get_parse_pool()
+    def parse(file):
+        data = file.getvalue()
+        try:
+            return cache.get_or_compute(("text", content_key(data)), lambda: pool.submit(extract_text, data, file.name).result())
+        except Exception:  # битый файл не мешает сравнить остальные — о нём сообщается отдельно
+            return ""
+    with ThreadPoolExecutor(max_workers=len(files)) as threads:
+        return list(threads.map(parse, files))
+
+def cached_analyses(texts):
+    """Результаты для нескольких текстов: всё, чего нет в кэше, — одним predict_batch."""
+    cache = get_document_cache()
+    keys = [("result", content_key(text)) for text in texts]
+    results = [cache.get(key) for key in keys]
+    missing = {key: text for key, text, result in zip(keys, texts, results) if result is None}
+    fresh = dict(zip(missing, predict_batch(list(missing.values())))) if missing else {}
+    for key, result in fresh.items():
+        cache.put(key, result)
+    return [result if result is not None else fresh[key] for key, result in zip(keys, results)]
 
 st.markdown("""
 <div style='text-align:center;padding:20px 0 10px 0;'>
@@ -158,24 +275,44 @@ tab1, tab2, tab3 = st.tabs(["Анализ тендера", "Сравнить д
 with tab1:
     uploaded_file = st.file_uploader("Загрузите тендерную документацию (PDF или DOCX)", type=["pdf", "docx"], key="main_upload")
     if uploaded_file:
-        with st.spinner("Анализируем документ..."):
-            text = extract_text(uploaded_file)
-        if len(text) < 50:
-            st.error("Не удалось извлечь текст из файла")
+        queue = get_job_queue()
+        job = session_job(queue, uploaded_file)
+        if job["status"] in ("queued", "running"):
+            show_job_progress(queue, job["id"], uploaded_file.name)
+        elif job["status"] == "cancelled":
+            st.warning("Анализ отменён")
+            if st.button("Запустить снова", key="restart_job"):
+                del st.session_state.jobs[uploaded_file.file_id]
+                st.rerun()
+        elif job["status"] == "failed":
+            st.error(job["error"])
         else:
-            result = predict_single(text)
+            text, result = get_document_cache().get_or_compute(("job", job["id"]), lambda: queue.result(job["id"]))
             score = result["risk_score"]
-            st.session_state.history.insert(0, {
-                "name": uploaded_file.name,
-                "preview": text[:80] + "...",
-                "score": score,
-                "level": result.get("level", ""),
-                "time": datetime.now().strftime("%H:%M:%S")
-            })
-            st.session_state.history = st.session_state.history[:5]
+            # Перезапуск скрипта от действий с виджетами не должен дублировать запись
+            key = content_key(text)
+            if not st.session_state.history or st.session_state.history[0].get("key") != key:
+                st.session_state.history.insert(0, {
+                    "key": key,
+                    "name": uploaded_file.name,
+                    "preview": text[:80] + "...",
+                    "score": score,
+                    "level": result.get("level", ""),
+                    "time": datetime.now().strftime("%H:%M:%S")
+                })
+                st.session_state.history = st.session_state.history[:5]
             st.markdown("---")
             show_gauge(score)
 
+            near = result.get("near_duplicate") or {}
+            if near.get("duplicate_of"):
+                copy = near["duplicate_of"]
+                st.info(f"♻️ Почти копия ранее загруженного документа «{copy['name']}» (сходство {copy['similarity']:.0%})")
+            elif near.get("known"):
+                st.info("♻️ Этот текст уже анализировался")
+            elif near.get("cluster_size", 1) > 1:
+                st.info(f"🧩 Составлен по тому же шаблону, что ещё {near['cluster_size'] - 1} загруженных документов")
+
             reqs = result.get("requirements", {})
             labels = result.get("requirement_labels", {})
             st.markdown("---")
@@ -308,10 +445,9 @@ with tab1:
                 for name, val in result["components"].items():
                     st.markdown(f'<div style="display:flex;justify-content:space-between;font-size:0.8rem;color:#B8C1EC;margin-bottom:3px;"><span>{name}</span><span>{val}%</span></div>', unsafe_allow_html=True)
                     st.progress(val / 100)
-            if result.get("suspicious_sentences"):
+            if result.get("legal_spans") or result.get("suspicious_sentences"):
                 st.markdown('<div class="sec">ТЕПЛОВАЯ КАРТА ТЕКСТА</div>', unsafe_allow_html=True)
-                highlighted = highlight_text(text, result.get("suspicious_sentences", []))
-                st.markdown(f'<div class="card" style="font-size:0.82rem;line-height:1.7;color:#E6EAFF;max-height:300px;overflow-y:auto;">{highlighted}...</div>', unsafe_allow_html=True)
+                show_heatmap(text, result, key="heatmap_page")
             if result.get("stats"):
                 st.markdown('<div class="sec">СТАТИСТИКА</div>', unsafe_allow_html=True)
                 stats = result["stats"]
@@ -350,53 +486,49 @@ with tab1:
                     pass
 
 with tab2:
-    st.markdown('<div class="sec">ЗАГРУЗИТЕ ДВА ТЕНДЕРА ДЛЯ СРАВНЕНИЯ</div>', unsafe_allow_html=True)
-    c1, c2 = st.columns(2)
-    with c1:
-        file1 = st.file_uploader("Тендер 1", type=["pdf", "docx"], key="compare1")
-    with c2:
-        file2 = st.file_uploader("Тендер 2", type=["pdf", "docx"], key="compare2")
-    if file1 and file2:
-        with st.spinner("Анализируем оба тендера..."):
-            r1 = predict_single(extract_text(file1))
-            r2 = predict_single(extract_text(file2))
-        st.markdown("---")
-        c1, c2 = st.columns(2)
-        with c1:
-            st.markdown(f'<p style="text-align:center;font-weight:600;color:#A9B3FF;">{file1.name}</p>', unsafe_allow_html=True)
-            show_gauge(r1["risk_score"], height=240)
-            s = r1["risk_score"]
-            css = "badge-high" if s >= 70 else "badge-medium" if s >= 40 else "badge-low"
-            st.markdown(f'<div style="text-align:center"><span class="{css}">{s}/100</span></div>', unsafe_allow_html=True)
-        with c2:
-            st.markdown(f'<p style="text-align:center;font-weight:600;color:#A9B3FF;">{file2.name}</p>', unsafe_allow_html=True)
-            show_gauge(r2["risk_score"], height=240)
-            s = r2["risk_score"]
-            css = "badge-high" if s >= 70 else "badge-medium" if s >= 40 else "badge-low"
-            st.markdown(f'<div style="text-align:center"><span class="{css}">{s}/100</span></div>', unsafe_allow_html=True)
+    st.markdown('<div class="sec">ЗАГРУЗИТЕ ДВА И БОЛЕЕ ТЕНДЕРА ДЛЯ СРАВНЕНИЯ</div>', unsafe_allow_html=True)
+    uploaded = st.file_uploader("Тендеры", type=["pdf", "docx"], accept_multiple_files=True, key="compare")
+    if len(uploaded) == 1:
+        st.info("Добавьте ещё хотя бы один тендер")
+    if len(uploaded) >= 2:
+        # Все файлы разбираются одновременно, а оцениваются одним батчем эмбеддера
+        with st.spinner(f"Анализируем тендеры: {len(uploaded)}..."):
+            texts = cached_texts(uploaded)
+            files = [(f, t) for f, t in zip(uploaded, texts) if len(t) >= 50]
+            results = cached_analyses([t for _, t in files])
+        for f, t in zip(uploaded, texts):
+            if len(t) < 50:
+                st.error(f"Не удалось извлечь текст из файла {f.name}")
+        names = [html.escape(f.name) for f, _ in files]
+        scores = [r["risk_score"] for r in results]
         st.markdown("---")
-        st.markdown('<div class="sec">ИТОГ СРАВНЕНИЯ</div>', unsafe_allow_html=True)
-        diff = r1["risk_score"] - r2["risk_score"]
-        if diff > 0:
-            st.markdown(f'<div class="exp-high"><b>{file1.name}</b> более рискованный (Risk Score: {r1["risk_score"]}/100)</div>', unsafe_allow_html=True)
-        elif diff < 0:
-            st.markdown(f'<div class="exp-high"><b>{file2.name}</b> более рискованный (Risk Score: {r2["risk_score"]}/100)</div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div class="exp-medium">Оба тендера имеют одинаковый уровень риска</div>', unsafe_allow_html=True)
-        if r1.get("components") and r2.get("components"):
-            st.markdown('<div class="sec">СРАВНЕНИЕ КОМПОНЕНТОВ</div>', unsafe_allow_html=True)
-            for name in r1["components"]:
-                v1 = r1["components"].get(name, 0)
-                v2 = r2["components"].get(name, 0)
-                ca, cb = st.columns(2)
-                with ca:
-                    color = "#ff4444" if v1 > v2 else "#6C63FF"
-                    st.markdown(f'<div style="font-size:0.78rem;color:#B8C1EC;">{name}: <b style="color:{color}">{v1}%</b></div>', unsafe_allow_html=True)
-                    st.progress(v1 / 100)
-                with cb:
-                    color = "#ff4444" if v2 > v1 else "#6C63FF"
-                    st.markdown(f'<div style="font-size:0.78rem;color:#B8C1EC;">{name}: <b style="color:{color}">{v2}%</b></div>', unsafe_allow_html=True)
-                    st.progress(v2 / 100)
+        for row in range(0, len(files), 3):
+            for i, col in zip(range(row, min(row + 3, len(files))), st.columns(3)):
+                with col:
+                    st.markdown(f'<p style="text-align:center;font-weight:600;color:#A9B3FF;">{names[i]}</p>', unsafe_allow_html=True)
+                    show_gauge(scores[i], height=240, key=f"compare_gauge_{i}")
+                    s = scores[i]
+                    css = "badge-high" if s >= 70 else "badge-medium" if s >= 40 else "badge-low"
+                    st.markdown(f'<div style="text-align:center"><span class="{css}">{s}/100</span></div>', unsafe_allow_html=True)
+        if len(files) >= 2:
+            st.markdown("---")
+            st.markdown('<div class="sec">ИТОГ СРАВНЕНИЯ</div>', unsafe_allow_html=True)
+            top = max(scores)
+            if min(scores) == top:
+                st.markdown('<div class="exp-medium">Все тендеры имеют одинаковый уровень риска</div>', unsafe_allow_html=True)
+            else:
+                for i in sorted(range(len(files)), key=lambda i: -scores[i]):
+                    css = "exp-high" if scores[i] == top else "exp-medium" if scores[i] >= 40 else "exp-low"
+                    st.markdown(f'<div class="{css}"><b>{names[i]}</b> — Risk Score: {scores[i]}/100</div>', unsafe_allow_html=True)
+            if all(r.get("components") for r in results):
+                st.markdown('<div class="sec">СРАВНЕНИЕ КОМПОНЕНТОВ</div>', unsafe_allow_html=True)
+                for component in results[0]["components"]:
+                    values = [r["components"].get(component, 0) for r in results]
+                    st.markdown(f'<div style="font-size:0.85rem;color:#E6EAFF;font-weight:600;margin-top:0.6rem;">{component}</div>', unsafe_allow_html=True)
+                    for name, v in zip(names, values):
+                        color = "#ff4444" if v == max(values) and v > min(values) else "#6C63FF"
+                        st.markdown(f'<div style="font-size:0.78rem;color:#B8C1EC;">{name}: <b style="color:{color}">{v}%</b></div>', unsafe_allow_html=True)
+                        st.progress(v / 100)
 
 with tab3:
     st.markdown('<div class="sec">ПОСЛЕДНИЕ 5 АНАЛИЗОВ</div>', unsafe_allow_html=True)
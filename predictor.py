@@ -1,43 +1,341 @@
 """Готовый предиктор — импортируй в Streamlit"""
-import pickle, re, numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.preprocessing import MinMaxScaler
+import os, pickle, re, threading, warnings
+import numpy as np
+import onnx_embedder
+import rules
+import stage_metrics
+from document_cache import content_key
+from forest_scorer import FlatIsolationForest
+from similar_index import SIMILAR_DIR, SIMILAR_TOP_K, SimilarIndex
+from embedding_cache import EmbeddingCache, text_key
 from extract_requirements import extract_requirements, REQUIREMENT_LABELS
-from winner_history import check_winner_history
-from legal_compliance import check_legal_compliance, get_legal_summary
-embedder = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-with open("model.pkl", "rb") as f: model = pickle.load(f)
-with open("scaler.pkl", "rb") as f: scaler = pickle.load(f)
-
-def extract_features(text):
-    brand_model_patterns = [
-        r"(Dell|HP|Lenovo|Apple|Samsung|Philips|Siemens|Toyota|BMW|Mercedes)\s+\w+[\s\-]\w+",
-        r"(строго|исключительно|только)\s+[А-ЯA-Z]\w+",
+from winner_history import check_winner_history, get_supplier_index, get_winner_store
+from legal_compliance import LEGAL_RULE_IDS, check_legal_compliance, get_legal_summary, get_violation_spans
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+MODEL_PATH = os.path.join(BASE_DIR, "model.pkl")
+SCALER_PATH = os.path.join(BASE_DIR, "scaler.pkl")
+EMBEDDING_CACHE_DIR = os.environ.get("TENDERAI_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "embeddings"))
+ONNX_DIR = os.environ.get("TENDERAI_ONNX_DIR", os.path.join(BASE_DIR, ".cache", "onnx"))
+EMBEDDER_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# ─────────────────────────────────────────────
+# РЕЕСТР МОДЕЛЕЙ — загрузка при первом обращении
+# ─────────────────────────────────────────────
+
+_models = {}
+_models_lock = threading.RLock()  # RLock: загрузчик "forest" берёт "model" из того же реестра
+
+def _resolve_backend(name):
+    if name not in EMBEDDER_BACKENDS:
+        raise ValueError(f"TENDERAI_EMBEDDER_BACKEND: ожидается одно из {EMBEDDER_BACKENDS}, получено {name!r}")
+    if name != "torch" and not onnx_embedder.available():
+        warnings.warn(f"{name}: onnxruntime не установлен, эмбеддер работает на PyTorch")
+        return "torch"
+    return name
+
+EMBEDDER_BACKEND = _resolve_backend(os.environ.get("TENDERAI_EMBEDDER_BACKEND", "torch"))
+# Квантованные веса дают чуть другие векторы — у них свой раздел кэша эмбеддингов
+EMBEDDER_ID = f"{MODEL_NAME}@int8" if EMBEDDER_BACKEND == "onnx-int8" else MODEL_NAME
+
+def load_embedder(backend="torch"):
+    """Новый эмбеддер заданного бэкенда (см. EMBEDDER_BACKENDS) мимо реестра — для сравнения бэкендов."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(MODEL_NAME)
+    return onnx_embedder.load(MODEL_NAME, ONNX_DIR, int8=backend == "onnx-int8")
+
+def _load_embedder():
+    return load_embedder(EMBEDDER_BACKEND)
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+_LOADERS = {
+    "embedder": _load_embedder,
+    "model": lambda: _load_pickle(MODEL_PATH),
+    # Тот же лес в плоских массивах: оценки побитово как у sklearn, без обхода 200 деревьев в Python
+    "forest": lambda: FlatIsolationForest.from_sklearn(get_model()),
+    "scaler": lambda: _load_pickle(SCALER_PATH),
+    "embedding_cache": lambda: EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDER_ID),
+    "similar_index": lambda: SimilarIndex(SIMILAR_DIR),
+}
+
+def _get(name):
+    obj = _models.get(name)
+    if obj is None:
+        with _models_lock:
+            obj = _models.get(name)
+            if obj is None:
+                obj = _models[name] = _LOADERS[name]()
+    return obj
+
+def get_embedder():
+    return _get("embedder")
+
+def get_model():
+    return _get("model")
+
+def get_forest():
+    return _get("forest")
+
+def get_scaler():
+    return _get("scaler")
+
+def get_embedding_cache():
+    return _get("embedding_cache")
+
+def get_similar_index():
+    return _get("similar_index")
+
+def embedding_cache_stats():
+    """Счётчики попаданий/промахов кэша эмбеддингов — для подбора его размера."""
+    return get_embedding_cache().stats()
+
+def warmup():
+    """Явная предзагрузка всех моделей — для серверов и воркеров."""
+    for name in _LOADERS:
+        _get(name)
+
+def __getattr__(name):
+    # Совместимость со старым `from predictor import embedder, model, scaler`
+    if name in _LOADERS:
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ─────────────────────────────────────────────
+# ПРИЗНАКИ — правила в общем реестре rules.py
+# ─────────────────────────────────────────────
+
+# Паттерны записаны в нижнем регистре: текст приводится к lower() один раз,
+# а без re.IGNORECASE движок ищет литеральные префиксы быстрым поиском.
+# По той же причине первый символ вынесен из квантификатора (\d\d* вместо
+# \d+) — так sre строит фильтр по первому символу, смысл паттерна тот же.
+RESTRICTION_WORDS = ["строго","исключительно","только","авторизованный дилер","официальный представитель","аналоги не принимаются"]
+
+# (признак, делитель, лимит совпадений на паттерн, паттерны):
+# значение признака = min(число совпадений / делитель, 1.0), поэтому
+# правило сканируется только до «делитель» совпадений
+FEATURE_RULES = [
+    ("brand_model", 3, None, [
+        r"(dell|hp|lenovo|apple|samsung|philips|siemens|toyota|bmw|mercedes)\s+\w+[\s\-]\w+",
+        r"(строго|исключительно|только)\s+[а-яa-z]\w+",
         r"артикул\s+[\w\-]+",
         r"серийн\w+\s+номер\s+[\w\-]+",
-        r"модель\s+[A-Z\d][\w\-]+",
-    ]
-    brand_count = sum(len(re.findall(p, text, re.IGNORECASE)) for p in brand_model_patterns)
-    brand_score = min(brand_count / 3, 1.0)
+        r"модель\s+[a-z\d][\w\-]+",
+    ]),
+    # Считаются разные слова, поэтому одного вхождения каждого достаточно
+    ("restriction", 3, 1, [re.escape(w) for w in RESTRICTION_WORDS]),
+    # Жёсткий срок — только факт наличия, поэтому ветки альтернативы ищутся отдельно
+    ("tight_deadline", 1, None, [r"в течени[еи]\s*[1-3]\s*(рабоч|календар)\w+", r"[1-3]\s*(рабочих|календарных|жұмыс|күнтізбелік)?\s*(дн|день|күн)", r"за\s*1\s*день", r"1\s*рабочего\s*дня"]),
+    ("precise_params", 5, None, [r"\d\d*[,.]?\d*\s*(ггц|мгц|гб|мб|gb|дюйм|мм|кг)", r"версия\s+\d+\.\d+", r"\d\d{2,}[x×]\d{3,}", r"артикул\s+[\w\-]{4,}", r"[a-z][a-z]+\d{4,}[\w\-]*"]),
+    ("supplier_lock", 2, None, [r"тоо\s+[\w\s]+", r"бин\s+\d{12}", r"ип\s+[\w\s]+"]),
+]
+for _name, _divisor, _per_pattern, _patterns in FEATURE_RULES:
+    rules.register(f"feature.{_name}", _patterns, limit=_divisor, per_pattern=_per_pattern)
+FEATURE_RULE_IDS = [f"feature.{name}" for name, *_ in FEATURE_RULES]
+
+def extract_features(text, index=None):
+    """index — готовый rules.scan() документа, чтобы не сканировать текст повторно."""
+    if index is None:
+        index = rules.scan(text, FEATURE_RULE_IDS)
+    return {name: min(len(index[f"feature.{name}"]) / divisor, 1.0) for name, divisor, _, _ in FEATURE_RULES}
+
+def embed(texts, batch_size=32):
+    """
+    Эмбеддинги через кэш: трансформер считает только тексты, которых ещё
+    нет в кэше (повторы внутри пачки — один раз).
+    """
+    cache = get_embedding_cache()
+    keys = [text_key(text, EMBEDDER_ID) for text in texts]
+    found = cache.get_many(keys)
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, text)
+    if missing:
+        vecs = get_embedder().encode(list(missing.values()), batch_size=batch_size)
+        fresh = dict(zip(missing, vecs))
+        cache.put_many(fresh)
+        found.update(fresh)
+    return np.stack([found[key] for key in keys])
+
+def embed_and_score(texts, batch_size=32):
+    """Эмбеддинги пачки текстов и их аномальность: один проход эмбеддера и один вызов леса/скейлера."""
+    with stage_metrics.stage("embed"):
+        vecs = embed(texts, batch_size=batch_size)
+    with stage_metrics.stage("forest"):
+        raw = get_forest().decision_function(vecs)
+        anomalies = get_scaler().transform(-raw.reshape(-1, 1))[:, 0]
+    return vecs, anomalies
+
+def anomaly_scores(texts, batch_size=32):
+    return embed_and_score(texts, batch_size=batch_size)[1]
+
+def remember_notices(texts, vectors, results, sources=None):
+    """
+    Добавляет оценённые документы в индекс похожих тендеров — их найдут
+    следующие запросы. Вызывается после build_result, чтобы документ не
+    нашёл сам себя. sources — откуда каждый документ (задача, файл):
+    новая версия из того же источника заменяет в индексе прежние.
+    """
+    if not SIMILAR_TOP_K:
+        return
+    sources = sources or [None] * len(texts)
+    get_similar_index().add_many([{
+        "key": content_key(text),
+        "vector": vector,
+        "name": " ".join(text[:300].split())[:120],
+        "supplier": notice_winner(text, source),
+        "risk_score": result["risk_score"],
+        "source": source,
+    } for text, vector, result, source in zip(texts, vectors, results, sources)])
 
-    restriction_words = ["строго","исключительно","только","авторизованный дилер","официальный представитель","аналоги не принимаются"]
-    restriction_score = min(sum(1 for w in restriction_words if w.lower() in text.lower()) / 3, 1.0)
+def notice_winner(text, source=None):
+    """
+    Победитель закупки, если она уже разыграна и есть в истории побед: по
+    номеру контракта в имени файла или по названию закупки в первой строке
+    текста. Упомянутый в тексте поставщик победителем не считается.
+    """
+    title = next((line.strip() for line in text[:2000].splitlines() if line.strip()), "")
+    keys = [f"id:{os.path.splitext(os.path.basename(source))[0]}"] if source else []
+    return get_winner_store().tender_winner(keys, [title] if title else [])
 
-    tight_deadline = bool(re.search(r"(в течени[еи]\s*[1-3]\s*(рабоч|календар)\w+|[1-3]\s*(рабочих|календарных|жұмыс|күнтізбелік)?\s*(дн|день|күн)|за\s*1\s*день|1\s*рабочего\s*дня)", text, re.IGNORECASE))
-    
-    precise_patterns = [r"\d+[,.]?\d*\s*(ГГц|МГц|ГБ|МБ|GB|дюйм|мм|кг)", r"версия\s+\d+\.\d+", r"\d{3,}[xX×]\d{3,}", r"артикул\s+[\w\-]{4,}", r"[A-Z]{2,}\d{4,}[\w\-]*"]
-    precise_score = min(sum(len(re.findall(p, text, re.IGNORECASE)) for p in precise_patterns) / 5, 1.0)
+def chunk_text(text, max_tokens=None):
+    """
+    Режет текст на окна не длиннее max_tokens токенов (по умолчанию — лимит
+    эмбеддера за вычетом служебных токенов). Токенизация одна на весь текст,
+    поэтому стоимость линейна по длине. Возвращает [(start, end)] в символах.
+    """
+    embedder = get_embedder()
+    max_tokens = max_tokens or embedder.max_seq_length - 2
+    offsets = embedder.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    if len(offsets) <= max_tokens:
+        return [(0, len(text))]
+    return [(offsets[i][0], offsets[min(i + max_tokens, len(offsets)) - 1][1]) for i in range(0, len(offsets), max_tokens)]
 
-    supplier_patterns = [r"ТОО\s+[\w\s]+", r"БИН\s+\d{12}", r"ИП\s+[\w\s]+"]
-    supplier_score = min(sum(len(re.findall(p, text, re.IGNORECASE)) for p in supplier_patterns) / 2, 1.0)
+def predict_single(text, chunked=False, pooling="max", source=None):
+    with stage_metrics.profiled([text]):
+        return predict_batch([text], chunked=chunked, pooling=pooling, sources=[source])[0]
 
-    return {"brand_model": brand_score, "restriction": restriction_score, "tight_deadline": 1.0 if tight_deadline else 0.0, "precise_params": precise_score, "supplier_lock": supplier_score}
+def predict_batch(texts, batch_size=32, chunked=False, pooling="max", sources=None):
+    """
+    Пакетная оценка: тексты кодируются батчами по batch_size, аномальность
+    считается одной матрицей. Возвращает список результатов как у
+    predict_single, в том же порядке. sources — откуда каждый текст (имя
+    задачи или файла): прежние версии того же документа не попадают в
+    «похожие» и заменяются в индексе.
 
-def predict_single(text):
-    vec = embedder.encode([text])
-    raw = model.decision_function(vec)[0]
-    anomaly = float(scaler.transform([[-raw]])[0][0])
-    feats = extract_features(text)
+    chunked=True — вместо неявной обрезки по лимиту токенов каждый документ
+    режется на окна (chunk_text), все окна всех документов идут одним
+    батчем, а оценки окон сводятся через pooling: "max" — самое аномальное
+    окно, "mean" — среднее. В result["chunks"] — какое окно аномальнее всех.
+
+    С включёнными замерами (stage_metrics) в result["timings"] — время
+    стадий документа и его доля в стадиях пачки.
+    """
+    if pooling not in ("max", "mean"):
+        raise ValueError(f"pooling должен быть 'max' или 'mean', получено {pooling!r}")
+    texts = list(texts)
+    if not texts:
+        return []
+    sources = list(sources) if sources is not None else [None] * len(texts)
+    if not chunked:
+        with stage_metrics.collect() as shared:
+            vecs, anomalies = embed_and_score(texts, batch_size=batch_size)
+        results = [
+            build_result(text, float(anomaly), vec, source=source)
+            for text, anomaly, vec, source in zip(texts, anomalies, vecs, sources)
+        ]
+        stage_metrics.share(results, shared)
+        remember_notices(texts, vecs, results, sources)
+        return results
+
+    with stage_metrics.collect() as shared:
+        with stage_metrics.stage("chunking"):
+            spans = [chunk_text(text) for text in texts]
+        vecs, scores = embed_and_score([text[s:e] for text, doc_spans in zip(texts, spans) for s, e in doc_spans], batch_size=batch_size)
+    results, doc_vecs, pos = [], [], 0
+    for text, doc_spans, source in zip(texts, spans, sources):
+        doc_scores = scores[pos:pos + len(doc_spans)]
+        # Для поиска похожих документ представлен средним эмбеддингом своих окон
+        doc_vecs.append(vecs[pos:pos + len(doc_spans)].mean(axis=0))
+        pos += len(doc_spans)
+        worst = int(np.argmax(doc_scores))
+        anomaly = float(doc_scores.max() if pooling == "max" else doc_scores.mean())
+        result = build_result(text, anomaly, doc_vecs[-1], source=source)
+        start, end = doc_spans[worst]
+        result["chunks"] = {
+            "count": len(doc_spans),
+            "pooling": pooling,
+            "most_anomalous": {
+                "index": worst,
+                "start": start,
+                "end": end,
+                "anomaly": round(float(doc_scores[worst]) * 100, 1),
+                "text": text[start:end],
+            },
+        }
+        results.append(result)
+    stage_metrics.share(results, shared)
+    remember_notices(texts, doc_vecs, results, sources)
+    return results
+
+def suspicious_sentences(sentences, limit=5):
+    return [s.strip() for s in sentences if len(s.strip()) > 20 and (
+        re.search(r"\d+[.,]\d+", s) or
+        re.search(r"строго|исключительно|только", s, re.IGNORECASE) or
+        re.search(r"[A-Z]{2,}\d+", s)
+    )][:limit]
+
+def analyze_text(text):
+    """
+    Стадии разбора текста без эмбеддера: совпадения правил, поля
+    требований, упоминания поставщиков, подозрительные предложения. Все они
+    собираются из частей документа — так их пересчитывает incremental.py.
+    """
+    with stage_metrics.stage("rules"):
+        # Правовые правила — все совпадения (для подсветки), остальные — до насыщения
+        index = rules.scan(text, exhaustive=LEGAL_RULE_IDS)
+    with stage_metrics.stage("requirements"):
+        requirements = extract_requirements(text)
+    with stage_metrics.stage("suppliers"):
+        mentions = get_supplier_index().find(text)
+    with stage_metrics.stage("suspicious"):
+        sentences = re.split(r"[.!?\n]", text)
+        suspicious = suspicious_sentences(sentences)
+        precise_numbers = len(re.findall(r"\d+[.,]\d+", text))
+    return {
+        "index": index,
+        "requirements": requirements,
+        "mentions": mentions,
+        "suspicious": suspicious,
+        "sentences": len(sentences),
+        "precise_numbers": precise_numbers,
+    }
+
+def build_result(text, anomaly, vector=None, parts=None, source=None):
+    """
+    Результат оценки по тексту и его аномальности (0..1): все стадии, кроме
+    эмбеддера. vector — эмбеддинг документа: по нему в result["similar"]
+    попадают SIMILAR_TOP_K ближайших ранее разобранных тендеров (почти
+    копии помечены near_copy), кроме прежних версий из того же source. parts — готовый analyze_text(text). С
+    включёнными замерами в result["timings"] — время стадий разбора
+    (stage_metrics.collect).
+    """
+    with stage_metrics.collect() as timings:
+        result = _build_result(text, anomaly, vector, parts, source)
+    if timings is not None:
+        result["timings"] = timings
+    return result
+
+def _build_result(text, anomaly, vector, parts, source):
+    parts = analyze_text(text) if parts is None else parts
+    index = parts["index"]
+    with stage_metrics.stage("features"):
+        feats = extract_features(text, index)
 
     # Увеличили веса бренды + ограничители
     risk = round((
@@ -53,13 +351,6 @@ def predict_single(text):
     elif risk >= 40: level, color, rec = "🟡 СРЕДНИЙ", "orange", "Отдельные признаки специфичности. Рекомендуется дополнительная экспертиза."
     else: level, color, rec = "🟢 НИЗКИЙ", "green", "Документ соответствует стандартным требованиям."
 
-    sentences = re.split(r"[.!?\n]", text)
-    suspicious = [s.strip() for s in sentences if len(s.strip()) > 20 and (
-        re.search(r"\d+[.,]\d+", s) or
-        re.search(r"строго|исключительно|только", s, re.IGNORECASE) or
-        re.search(r"[A-Z]{2,}\d+", s)
-    )][:5]
-
     result = {
         "risk_score": risk,
         "level": level,
@@ -72,17 +363,25 @@ def predict_single(text):
             "Жёсткие сроки": round(feats["tight_deadline"]*100,1),
             "Точные параметры": round(feats["precise_params"]*100,1)
         },
-        "suspicious_sentences": suspicious,
+        "suspicious_sentences": parts["suspicious"],
         "stats": {
             "total_chars": len(text),
-            "precise_numbers": len(re.findall(r"\d+[.,]\d+", text)),
-            "sentences": len(sentences)
+            "precise_numbers": parts["precise_numbers"],
+            "sentences": parts["sentences"]
         }
     }
 
-    result['legal'] = check_legal_compliance(text)
-    result['legal_summary'] = get_legal_summary(result['legal'])
-    result['requirements'] = extract_requirements(text)
+    with stage_metrics.stage("legal"):
+        result['legal'] = check_legal_compliance(text, index, spans=True)
+        result['legal_summary'] = get_legal_summary(result['legal'])
+        result['legal_spans'] = get_violation_spans(result['legal'])
+    result['requirements'] = parts["requirements"]
     result['requirement_labels'] = REQUIREMENT_LABELS
-    result['winners'] = check_winner_history(text)
+    with stage_metrics.stage("winners"):
+        result['winners'] = check_winner_history(text, index, parts["mentions"])
+    if vector is not None and SIMILAR_TOP_K:
+        with stage_metrics.stage("similar"):
+            result['similar'] = get_similar_index().search(
+                vector, exclude_key=content_key(text), exclude_source=source
+            )
     return result
\ No newline at end of file
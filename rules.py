@@ -0,0 +1,225 @@
+import bisect
+import re
+
+# ─────────────────────────────────────────────
+# ОБЩИЙ РЕЕСТР ПРАВИЛ
+# Признаки (predictor), правовые проверки (legal_compliance) и поиск
+# поставщика (winner_history) регистрируют сюда свои паттерны. Документ
+# сканируется один раз, модули читают готовый индекс совпадений.
+# ─────────────────────────────────────────────
+
+RULES = {}
+
+# Когда паттернов с ведущим словом много (сотни статей закона), дешевле один
+# раз собрать словарь слов документа и пропускать паттерны, чьего ведущего
+# слова в нём нет, чем проходить текст каждым. Сбор словаря стоит примерно
+# столько же, сколько ~40 проходов по литеральному префиксу.
+WORD_GATE_MIN_PATTERNS = 48
+_WORD_RE = re.compile(r"\w+")
+_ANCHOR_RE = re.compile(r"\\b(\w+)([?*{]?)")
+
+
+def register(rule_id, patterns, limit=None, per_pattern=None):
+    """
+    Регистрирует правило: список паттернов в порядке приоритета.
+
+    Паттерны пишутся в нижнем регистре и без флагов — scan() применяет их
+    к text.lower(). Сканирование останавливается, как только потребителю
+    достаточно: limit — совпадений на всё правило (1 — «есть или нет»),
+    per_pattern — совпадений на один паттерн. None — без ограничения.
+    """
+    RULES[rule_id] = {"patterns": [_compile(p) for p in patterns], "limit": limit, "per_pattern": per_pattern}
+
+
+def _compile(pattern):
+    """
+    Паттерн с ведущим \\b не получает в sre быстрый поиск по литеральному
+    префиксу. Для него строится фильтр без \\b: каждое настоящее совпадение
+    начинается там, где совпал фильтр, поэтому достаточно проверять
+    паттерн только в этих позициях.
+    """
+    prefilter = re.compile(pattern[2:]) if pattern.startswith(r"\b") else None
+    return re.compile(pattern), prefilter, _anchor(pattern)
+
+
+def _anchor(pattern):
+    """Ведущее слово после \\b: совпадение возможно, только если с него начинается слово документа."""
+    m = _ANCHOR_RE.match(pattern)
+    if not m or _has_top_level_alternation(pattern):
+        return None
+    # Последняя буква под квантификатором ?, * или {} необязательна
+    word = m.group(1)[:-1] if m.group(2) else m.group(1)
+    return word or None
+
+
+def _has_top_level_alternation(pattern):
+    depth, in_class, escaped = 0, False, False
+    for ch in pattern:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif in_class:
+            in_class = ch != "]"
+        elif ch == "[":
+            in_class = True
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            return True
+    return False
+
+
+def _has_word_with_prefix(words, prefix):
+    i = bisect.bisect_left(words, prefix)
+    return i < len(words) and words[i].startswith(prefix)
+
+
+def scan(text, rule_ids=None, exhaustive=False):
+    """
+    Прогоняет правила по документу и возвращает индекс совпадений:
+    {rule_id: [(start, end, groups, pattern_no), ...]}
+
+    Совпадения идут в порядке паттернов, внутри паттерна — по позиции,
+    так что первый элемент — «первый сработавший паттерн, первое вхождение».
+    Одинаковые паттерны разных правил сканируются один раз.
+    exhaustive — True или набор rule_id, для которых limit/per_pattern
+    игнорируются и собираются все совпадения (например, для подсветки в UI).
+    Позиции — в исходном text, даже если lower() изменил его длину.
+    """
+    low = text.lower()
+    back = original_positions(text, low)
+    rule_ids = list(RULES if rule_ids is None else rule_ids)
+    exhaustive = set(rule_ids) if exhaustive is True else set(exhaustive or ())
+    gated = sum(1 for rule_id in rule_ids for _, _, anchor in RULES[rule_id]["patterns"] if anchor)
+    words = sorted(set(_WORD_RE.findall(low))) if gated >= WORD_GATE_MIN_PATTERNS else None
+    scanned = {}  # паттерн -> (совпадения, просканирован ли текст до конца)
+    index = {}
+    for rule_id in rule_ids:
+        rule = RULES[rule_id]
+        full = rule_id in exhaustive
+        hits = []
+        for no, pattern in enumerate(rule["patterns"]):
+            need = None if full else rule["per_pattern"]
+            if rule["limit"] is not None and not full:
+                need = min(need or rule["limit"], rule["limit"] - len(hits))
+                if need <= 0:
+                    break
+            found, complete = scanned.get(pattern, ((), False))
+            if not complete and (need is None or len(found) < need):
+                if words is not None and pattern[2] and not _has_word_with_prefix(words, pattern[2]):
+                    found, complete = [], True
+                else:
+                    found, complete = _finditer(pattern, low, need)
+                scanned[pattern] = (found, complete)
+            if back is None:
+                hits.extend((start, end, groups, no) for start, end, groups in found[:need])
+            else:
+                hits.extend((*restore_span(back, start, end), groups, no) for start, end, groups in found[:need])
+        index[rule_id] = hits
+    return index
+
+
+def original_positions(text, low):
+    """
+    Для low = text.lower(): позиция в text каждой позиции low (и конца),
+    если lower() изменил длину текста («İ» → «i̇»), иначе None — позиции
+    и так совпадают.
+    """
+    if len(low) == len(text):
+        return None
+    back = []
+    for i, char in enumerate(text):
+        back.extend([i] * len(char.lower()))
+    back.append(len(text))
+    return back
+
+
+def restore_span(back, start, end):
+    """Отрезок low → отрезок text по original_positions(); задетый символ берётся целиком."""
+    return back[start], back[end - 1] + 1 if end > start else back[start]
+
+
+def merge(parts, exhaustive=False):
+    """
+    Индекс документа из индексов его частей: parts — [(сдвиг части в
+    документе, scan(часть, exhaustive=True))] по порядку. Лимиты правил
+    применяются как в scan(), поэтому результат совпадает с
+    scan(документ, exhaustive=exhaustive), если ни одно совпадение не
+    пересекает границу частей.
+    """
+    rule_ids = list(parts[0][1]) if parts else list(RULES)
+    exhaustive = set(rule_ids) if exhaustive is True else set(exhaustive or ())
+    index = {}
+    for rule_id in rule_ids:
+        rule = RULES[rule_id]
+        if rule_id in exhaustive:
+            # Все совпадения: сортировка устойчива, внутри паттерна остаётся порядок частей
+            index[rule_id] = sorted(
+                ((start + offset, end + offset, groups, no) for offset, part in parts for start, end, groups, no in part[rule_id]),
+                key=_pattern_no,
+            )
+            continue
+        hits = []
+        for no in range(len(rule["patterns"])):
+            need = rule["per_pattern"]
+            if rule["limit"] is not None:
+                need = min(need or rule["limit"], rule["limit"] - len(hits))
+                if need <= 0:
+                    break
+            taken = 0
+            for offset, part in parts:
+                found = part[rule_id]
+                if not found:
+                    continue
+                # Совпадения части упорядочены по номеру паттерна — его отрезок ищется делением пополам
+                lo = bisect.bisect_left(found, no, key=_pattern_no)
+                hi = bisect.bisect_right(found, no, lo=lo, key=_pattern_no)
+                if need is not None:
+                    hi = min(hi, lo + need - taken)
+                hits.extend((start + offset, end + offset, groups, no) for start, end, groups, _ in found[lo:hi])
+                taken += hi - lo
+                if need is not None and taken >= need:
+                    break
+        index[rule_id] = hits
+    return index
+
+
+def _pattern_no(hit):
+    return hit[3]
+
+
+def _finditer(compiled, text, limit):
+    found = []
+    for m in _iter_matches(compiled, text):
+        found.append((m.start(), m.end(), m.groups()))
+        if limit is not None and len(found) >= limit:
+            return found, False
+    return found, True
+
+
+def _iter_matches(compiled, text):
+    pattern, prefilter, _ = compiled
+    if prefilter is None:
+        yield from pattern.finditer(text)
+        return
+    pos = 0
+    while True:
+        candidate = prefilter.search(text, pos)
+        if candidate is None:
+            return
+        m = pattern.match(text, candidate.start())
+        if m:
+            yield m
+            pos = m.end() if m.end() > m.start() else m.end() + 1
+        else:
+            pos = candidate.start() + 1
+
+
+def first_hit(index, rule_id):
+    """Первое совпадение правила (с учётом приоритета паттернов) или None."""
+    hits = index.get(rule_id)
+    return hits[0] if hits else None
+
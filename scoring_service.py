@@ -0,0 +1,239 @@
+"""HTTP/JSON-сервис оценки тендеров поверх predictor.
+
+Запуск: python scoring_service.py [--host 127.0.0.1] [--port 8300]
+                                  [--max-batch 64] [--max-wait-ms 5] [--workers 4]
+    POST /analyze        {"text": "...", "name": "..."}            → результат predict_single
+    POST /analyze/batch  {"texts": [...], "names": [...]}          → {"results": [...]}
+    name — необязательное имя документа (файл, номер закупки): новая версия
+    документа с тем же именем заменяет прежние в индексе похожих тендеров.
+    GET  /health                                  → состояние и счётчики пачек
+    GET  /metrics[?format=json]                   → гистограммы стадий (Prometheus или JSON),
+                                                    если включены замеры TENDERAI_STAGE_METRICS
+
+Модели загружаются при старте и живут в процессе. Тексты одновременных
+запросов в течение max-wait-ms собираются в одну пачку эмбеддера, а
+правила, правовая проверка, требования и история победителей считаются
+в пуле потоков, пока эмбеддер кодирует следующую пачку. Нагрузочный
+тест — bench_service.py.
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import predictor
+import stage_metrics
+
+MAX_BATCH = 64  # текстов в одной пачке эмбеддера
+MAX_WAIT = 0.005  # секунд ожидания попутчиков после первого запроса пачки
+STAGE_WORKERS = 4
+MAX_BODY = 20 * 1024 * 1024
+REQUEST_TIMEOUT = 120  # секунд
+
+
+class MicroBatcher:
+    """
+    Общая очередь текстов перед эмбеддером. submit() возвращает Future со
+    списком результатов в порядке текстов; поток пачек забирает запросы,
+    пока в пачке меньше max_batch текстов и не прошло max_wait секунд с
+    первого, кодирует их одним вызовом и отдаёт остальные стадии пулу.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_wait=MAX_WAIT, workers=STAGE_WORKERS, encode_batch=32):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.encode_batch = encode_batch
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stages")
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    def submit(self, texts, sources=None):
+        """sources — имена документов для predictor.build_result(source=...)."""
+        future = Future()
+        texts = list(texts)
+        self._queue.put((texts, list(sources) if sources is not None else [None] * len(texts), future))
+        return future
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        items = [self._queue.get()]
+        size = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            items.append(item)
+            size += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = [item for item in self._collect() if item[2].set_running_or_notify_cancel()]
+            texts = [text for request_texts, _, _ in items for text in request_texts]
+            try:
+                with stage_metrics.collect() as shared:
+                    vecs, anomalies = predictor.embed_and_score(texts, batch_size=self.encode_batch) if texts else ([], [])
+            except Exception as e:  # ошибка пачки — ответ каждому её запросу, сервис работает дальше
+                for _, _, future in items:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            pos = 0
+            for request_texts, sources, future in items:
+                part = slice(pos, pos + len(request_texts))
+                self._pool.submit(self._finish, request_texts, sources, anomalies[part], vecs[part], future, shared, len(texts))
+                pos += len(request_texts)
+
+    def _finish(self, texts, sources, anomalies, vecs, future, shared, batch_size):
+        """shared — замеры стадий пачки эмбеддера (stage_metrics.collect), batch_size — её размер."""
+        try:
+            with stage_metrics.profiled(texts):
+                results = [
+                    predictor.build_result(text, float(anomaly), vec, source=source)
+                    for text, source, anomaly, vec in zip(texts, sources, anomalies, vecs)
+                ]
+            stage_metrics.share(results, shared, batch_size)
+            predictor.remember_notices(texts, vecs, results, sources)
+            future.set_result(results)
+        except Exception as e:
+            future.set_exception(e)
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: клиент не платит за соединение на каждый запрос
+    batcher = None
+    started = time.time()
+    verbose = False
+
+    def _send(self, status, payload):
+        self._send_body(status, json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        self._send(status, {"error": message})
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path in ("/metrics", "/metrics?format=json"):
+            if not stage_metrics.enabled():
+                return self._error(404, "замеры стадий выключены: задайте TENDERAI_STAGE_METRICS=1")
+            if self.path.endswith("json"):
+                return self._send(200, stage_metrics.summary())
+            return self._send_body(200, stage_metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        if self.path != "/health":
+            return self._error(404, "неизвестный путь")
+        batcher = self.batcher
+        self._send(200, {
+            "status": "ok",
+            "uptime": round(time.time() - self.started, 1),
+            "batches": batcher.batches,
+            "texts": batcher.texts,
+            "mean_batch": round(batcher.texts / max(batcher.batches, 1), 2),
+            "pending": batcher.pending(),
+            "embedding_cache": predictor.embedding_cache_stats(),
+        })
+
+    def do_POST(self):
+        if self.path not in ("/analyze", "/analyze/batch"):
+            return self._error(404, "неизвестный путь")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) ждал бы, пока клиент закроет соединение
+            self.close_connection = True
+            return self._error(400, "некорректный Content-Length")
+        if length > MAX_BODY:
+            self.close_connection = True  # тело не читается — соединение дальше не годится
+            return self._error(413, f"тело запроса больше {MAX_BODY} байт")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            return self._error(400, "тело запроса — не JSON-объект")
+
+        batch = self.path == "/analyze/batch"
+        texts = body.get("texts") if batch else [body.get("text")]
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return self._error(400, "ожидается {\"texts\": [строки]}" if batch else "ожидается {\"text\": строка}")
+        sources = body.get("names", [None] * len(texts)) if batch else [body.get("name")]
+        if (
+            not isinstance(sources, list) or len(sources) != len(texts)
+            or not all(source is None or isinstance(source, str) for source in sources)
+        ):
+            return self._error(400, "ожидается {\"names\": [строки]} по числу текстов" if batch else "name — строка")
+        try:
+            results = self.batcher.submit(texts, sources).result(timeout=REQUEST_TIMEOUT) if texts else []
+        except TimeoutError:
+            return self._error(504, "оценка не уложилась в отведённое время")
+        except Exception as e:
+            return self._error(500, f"{type(e).__name__}: {e}")
+        for result in results:
+            result.pop("requirement_labels", None)  # одинаковые подписи для всех документов
+        self._send(200, {"results": results} if batch else results[0])
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # залп одновременных подключений не должен получать отказ
+
+
+def make_server(host="127.0.0.1", port=8300, max_batch=MAX_BATCH, max_wait=MAX_WAIT, workers=STAGE_WORKERS):
+    """Сервер с прогретыми моделями; запуск — serve_forever()."""
+    predictor.warmup()
+    # Первый прогон компилирует правила и открывает базу победителей — не за счёт клиента
+    text = "Прогрев эмбеддера мимо кэша: поставка строго Dell XPS 13, ТОО ТехноПарк, БИН 123456789012."
+    predictor.get_embedder().encode([text])
+    predictor.build_result(text, 0.0)
+    handler = type("Handler", (ScoringHandler,), {"batcher": MicroBatcher(max_batch, max_wait, workers)})
+    return ScoringServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="текстов в одной пачке эмбеддера")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT * 1000, help="ожидание попутчиков, мс")
+    parser.add_argument("--workers", type=int, default=STAGE_WORKERS, help="потоков для правил и проверок")
+    parser.add_argument("-v", "--verbose", action="store_true", help="журнал каждого запроса")
+    args = parser.parse_args()
+
+    ScoringHandler.verbose = args.verbose
+    server = make_server(args.host, args.port, args.max_batch, args.max_wait_ms / 1000, args.workers)
+    print(f"слушаю http://{args.host}:{server.server_port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""Индекс похожих тендеров: эмбеддинги всех разобранных документов на диске и поиск IVF.
+
+Запуск: python similar_index.py [--train [--nlist N]] [--dir каталог]
+Без ключей печатает размер индекса; --train заново обучает кластеры по
+всем строкам — стоит запускать, когда индекс вырос в несколько раз с
+прошлого обучения (первое обучение на TRAIN_MIN строках идёт само).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows — межпроцессная блокировка недоступна
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIMILAR_DIR = os.environ.get("TENDERAI_SIMILAR_DIR", os.path.join(BASE_DIR, ".cache", "similar"))
+SIMILAR_TOP_K = int(os.environ.get("TENDERAI_SIMILAR_TOP_K", 5))  # 0 — не искать и не пополнять индекс
+SIMILAR_MIN = 0.9  # косинус, с которого документ считается копией
+NPROBE = 16  # кластеров, просматриваемых при поиске
+TRAIN_MIN = 4096  # до стольких строк — прямой перебор, затем кластеры обучаются сами
+TAIL_LIMIT = 20000  # строк вне списков кластеров, после которых списки пересобираются
+TRAIN_SAMPLE = 65536
+TRAIN_ITERATIONS = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notices (
+    id          INTEGER PRIMARY KEY,  -- номер строки в vectors.f16
+    key         TEXT NOT NULL UNIQUE, -- ключ текста (document_cache.content_key)
+    name        TEXT,
+    supplier    TEXT,
+    risk_score  REAL,
+    added       REAL NOT NULL,
+    source      TEXT,                 -- откуда документ (задача, файл): новая версия заменяет прежние
+    replaced    INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+# Колонки, добавленные после первых версий индекса, — для уже созданных баз
+MIGRATIONS = [
+    ("source", "ALTER TABLE notices ADD COLUMN source TEXT"),
+    ("replaced", "ALTER TABLE notices ADD COLUMN replaced INTEGER NOT NULL DEFAULT 0"),
+]
+INDEXES = "CREATE INDEX IF NOT EXISTS notices_source ON notices (source) WHERE source IS NOT NULL;"
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def _kmeans(sample, nlist, iterations, rng):
+    """Сферический k-means: центроиды единичной длины, близость — скалярное произведение."""
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=nlist) == 0
+        # Пустой кластер получает случайную точку — иначе он так и останется пустым
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class SimilarIndex:
+    """
+    Каталог <path>:
+        vectors.f16    — нормированные эмбеддинги float16, строка на документ
+        lists.i32      — кластер каждой строки (-1 — кластеров ещё нет)
+        notices.sqlite — метаданные строк: id = номер строки
+        centroids.f32, postings.i32, offsets.i64 — центроиды, номера строк
+                         по кластерам и границы кластеров в postings
+    Строки только дописываются; центроиды и списки заменяются целиком при
+    перестройке. Новая версия документа из того же источника (source —
+    задача или файл) помечает прежние строки replaced, и поиск их
+    пропускает. Поиск: косинус с запросом у строк NPROBE ближайших
+    кластеров плюс прямой перебор строк, добавленных после последней
+    перестройки. Векторы читаются через memmap — в память попадают только
+    строки кандидатов, поэтому индекс на миллионы документов не грузится
+    целиком. Одним каталогом могут пользоваться несколько процессов.
+    """
+
+    def __init__(self, path=SIMILAR_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f16")
+        self._lists_path = os.path.join(path, "lists.i32")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(path, "notices.sqlite"), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(notices)")}
+        with self._conn:
+            for column, sql in MIGRATIONS:
+                if column not in columns:
+                    self._conn.execute(sql)
+        self._conn.executescript(INDEXES)
+        self._mmap = None
+        self._version = None  # версия загруженных центроидов и списков
+        self._centroids = self._postings = self._offsets = None
+
+    # ─────────────────────────────────────────────
+    # ДИСК
+    # ─────────────────────────────────────────────
+
+    def _meta(self):
+        return {row["key"]: json.loads(row["value"]) for row in self._conn.execute("SELECT key, value FROM meta")}
+
+    def _set_meta(self, **values):
+        self._conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            [(key, json.dumps(value)) for key, value in values.items()],
+        )
+
+    def _rows(self):
+        return self._conn.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM notices").fetchone()[0]
+
+    def _vectors(self, rows, dim):
+        if self._mmap is None or self._mmap.shape[0] < rows:
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(rows, dim))
+        return self._mmap
+
+    def _replace(self, name, array):
+        tmp = os.path.join(self.path, f"{name}.{os.getpid()}.tmp")
+        array.tofile(tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def _load_lists(self, meta):
+        if meta.get("version") == self._version:
+            return
+        if meta.get("nlist"):
+            dim = meta["dim"]
+            self._centroids = np.fromfile(os.path.join(self.path, "centroids.f32"), dtype=np.float32).reshape(-1, dim)
+            self._postings = np.memmap(os.path.join(self.path, "postings.i32"), dtype=np.int32, mode="r")
+            self._offsets = np.fromfile(os.path.join(self.path, "offsets.i64"), dtype=np.int64)
+        self._version = meta.get("version")
+
+    def _write_lock(self):
+        lock = open(os.path.join(self.path, "write.lock"), "w")
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock
+
+    def _post(self, rows, nlist, version):
+        # Списки кластеров: номера строк, упорядоченные по кластеру
+        lists = np.fromfile(self._lists_path, dtype=np.int32, count=rows)
+        order = np.argsort(lists, kind="stable").astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=nlist))]).astype(np.int64)
+        self._replace("postings.i32", order)
+        self._replace("offsets.i64", offsets)
+        self._set_meta(posted=rows, version=version + 1)
+
+    # ─────────────────────────────────────────────
+    # ПУБЛИЧНЫЙ API
+    # ─────────────────────────────────────────────
+
+    def add_many(self, items):
+        """
+        Добавляет документы: [{"key", "vector", "name", "supplier",
+        "risk_score", "source"}]. Уже известные ключи не добавляются
+        повторно. Документ с source заменяет прежние версии из того же
+        источника: последним в нём становится этот ключ.
+        """
+        with self._lock, self._write_lock():
+            known = {row[0] for row in self._conn.execute(
+                "SELECT key FROM notices WHERE key IN (SELECT value FROM json_each(?))", (json.dumps([item["key"] for item in items]),)
+            )}
+            fresh = list({item["key"]: item for item in items if item["key"] not in known}.values())
+            if fresh:
+                self._append(fresh)
+            versions = {item["source"]: item["key"] for item in items if item.get("source")}
+            if versions:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE notices SET source = ?, replaced = 0 WHERE key = ?", [(source, key) for source, key in versions.items()]
+                    )
+                    self._conn.executemany(
+                        "UPDATE notices SET replaced = 1 WHERE source = ? AND key != ? AND NOT replaced", list(versions.items())
+                    )
+
+    def _append(self, fresh):
+        vectors = _normalize([item["vector"] for item in fresh])
+        meta = self._meta()
+        if "dim" not in meta:
+            self._set_meta(dim=vectors.shape[1], version=0)
+            meta = self._meta()
+        elif meta["dim"] != vectors.shape[1]:
+            raise ValueError(f"размерность {vectors.shape[1]}, а в индексе {meta['dim']}")
+        rows = self._rows()
+        self._load_lists(meta)
+        lists = np.argmax(vectors @ self._centroids.T, axis=1) if meta.get("nlist") else np.full(len(fresh), -1)
+        # Обрезка до числа строк в базе снимает хвост записи, оборванной падением процесса
+        self._mmap = None
+        for path, data, size in (
+            (self._vectors_path, vectors.astype(np.float16), 2 * meta["dim"]),
+            (self._lists_path, lists.astype(np.int32), 4),
+        ):
+            with open(path, "ab") as f:
+                f.truncate(rows * size)
+                f.write(data.tobytes())
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO notices (id, key, name, supplier, risk_score, added, source) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(rows + i, item["key"], item.get("name"), item.get("supplier"), item.get("risk_score"), now, item.get("source"))
+                 for i, item in enumerate(fresh)],
+            )
+            total = rows + len(fresh)
+            if not meta.get("nlist") and total >= TRAIN_MIN:
+                self._train(total, meta)
+            elif meta.get("nlist") and total - meta["posted"] > TAIL_LIMIT:
+                self._post(total, meta["nlist"], meta["version"])
+
+    def add(self, key, vector, name=None, supplier=None, risk_score=None, source=None):
+        self.add_many([{"key": key, "vector": vector, "name": name, "supplier": supplier, "risk_score": risk_score, "source": source}])
+
+    def _train(self, rows, meta, nlist=None, seed=0):
+        dim = meta["dim"]
+        vectors = self._vectors(rows, dim)
+        rng = np.random.default_rng(seed)
+        nlist = nlist or int(min(max(4 * np.sqrt(rows), 16), 4096))
+        picked = np.sort(rng.choice(rows, min(rows, TRAIN_SAMPLE), replace=False))
+        centroids = _kmeans(vectors[picked].astype(np.float32), nlist, TRAIN_ITERATIONS, rng)
+        lists = np.concatenate([
+            np.argmax(vectors[start:start + 65536].astype(np.float32) @ centroids.T, axis=1)
+            for start in range(0, rows, 65536)
+        ]).astype(np.int32)
+        self._replace("centroids.f32", centroids)
+        self._replace("lists.i32", lists)
+        self._set_meta(nlist=nlist)
+        self._post(rows, nlist, meta["version"])
+
+    def train(self, nlist=None):
+        """Заново обучает кластеры по всем строкам и пересобирает списки."""
+        with self._lock, self._write_lock(), self._conn:
+            rows = self._rows()
+            if rows:
+                self._train(rows, self._meta(), nlist)
+
+    def search(self, vector, k=SIMILAR_TOP_K, exclude_key=None, nprobe=NPROBE, min_similarity=None, exclude_source=None):
+        """
+        Ближайшие документы: [{"id", "name", "supplier", "risk_score",
+        "added", "similarity", "near_copy"}] по убыванию косинуса; near_copy —
+        сходство не ниже SIMILAR_MIN. exclude_key — ключ самого
+        запроса, чтобы документ не находил сам себя, exclude_source — его
+        источник, чтобы не находились прежние версии того же документа.
+        Заменённые версии не возвращаются.
+        """
+        with self._lock:
+            meta = self._meta()
+            rows = self._rows()
+            if not rows or k <= 0:
+                return []
+            self._load_lists(meta)
+            query = _normalize([vector])[0]
+            if meta.get("nlist"):
+                probe = np.argpartition(-(self._centroids @ query), min(nprobe, meta["nlist"]) - 1)[:nprobe]
+                candidates = np.concatenate(
+                    [self._postings[self._offsets[i]:self._offsets[i + 1]] for i in probe]
+                    + [np.arange(meta["posted"], rows, dtype=np.int32)]
+                )
+                candidates.sort()  # чтение memmap по возрастанию адресов
+            else:
+                candidates = np.arange(rows)
+            scores = self._vectors(rows, meta["dim"])[candidates].astype(np.float32) @ query
+            result, seen, want = [], 0, k + 1
+            # Кандидатов берётся с запасом на пропущенные строки; не хватило — вчетверо больше
+            while seen < len(scores) and len(result) < k:
+                want = min(want, len(scores))
+                top = np.argsort(-scores)[:want] if want == len(scores) else np.argpartition(-scores, want - 1)[:want]
+                top = top[np.argsort(-scores[top])][seen:]
+                found = {row["id"]: row for row in self._conn.execute(
+                    "SELECT * FROM notices WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(candidates[top].tolist()),)
+                )}
+                for i in top:
+                    row = found[int(candidates[i])]
+                    if min_similarity is not None and scores[i] < min_similarity:
+                        return result[:k]
+                    if row["key"] == exclude_key or row["replaced"] or (exclude_source and row["source"] == exclude_source):
+                        continue
+                    result.append({
+                        "id": row["id"],
+                        "name": row["name"],
+                        "supplier": row["supplier"],
+                        "risk_score": row["risk_score"],
+                        "added": time.strftime("%Y-%m-%d", time.localtime(row["added"])),
+                        "similarity": round(float(scores[i]), 3),
+                        "near_copy": bool(scores[i] >= SIMILAR_MIN),
+                    })
+                seen, want = want, 4 * want
+        return result[:k]
+
+    def stats(self):
+        with self._lock:
+            meta = self._meta()
+            return {"documents": self._rows(), "clusters": meta.get("nlist", 0), "posted": meta.get("posted", 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", default=SIMILAR_DIR, help="каталог индекса (по умолчанию TENDERAI_SIMILAR_DIR)")
+    parser.add_argument("--train", action="store_true", help="заново обучить кластеры")
+    parser.add_argument("--nlist", type=int, help="число кластеров (по умолчанию 4·√N)")
+    args = parser.parse_args()
+    index = SimilarIndex(args.dir)
+    if args.train:
+        start = time.perf_counter()
+        index.train(args.nlist)
+        print(f"кластеры обучены за {time.perf_counter() - start:.1f} с")
+    print(index.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Замеры стадий анализа: время, CPU и память каждой стадии, гистограммы и профили самых медленных документов.
+
+Запуск: python stage_metrics.py ФАЙЛ [ФАЙЛ ...] [--memory] [--profile-dir каталог] [--slowest 10]
+                                [--format table|json|prometheus]
+Разбирает и оценивает документы по одному (predict_single) с включёнными
+замерами и печатает сводку по стадиям.
+
+В приложении замеры включаются переменной TENDERAI_STAGE_METRICS (по
+умолчанию выключены, и стадии ничего не стоят):
+    1      — время по часам и процессорное время потока для каждой стадии;
+    memory — плюс пик памяти стадии через tracemalloc (выделения памяти
+             при этом заметно дороже). Пик у tracemalloc один на процесс,
+             поэтому стадии разных потоков (пул стадий scoring_service,
+             поток эмбеддера) в этом режиме идут по очереди; в пик всё равно
+             попадают выделения потоков вне стадий — точные цифры даёт
+             запуск этого модуля, где документы оцениваются по одному.
+Результат оценки получает поле timings: {стадия: {"wall_ms", "cpu_ms",
+"peak_kb"}}. Стадии эмбеддера и леса считаются на всю пачку — документ
+получает свою долю времени и пометку batch с размером пачки (если в ней
+больше одного документа). Те же
+замеры копятся в гистограммах процесса: prometheus_text() и summary().
+TENDERAI_PROFILE_DIR — каталог, куда сохраняются профили cProfile (.prof)
+и сводки (.txt, в режиме memory — с ростом памяти по строкам кода)
+PROFILE_SLOWEST самых медленных вызовов оценки (TENDERAI_PROFILE_SLOWEST,
+0 — профили не снимаются).
+"""
+import argparse
+import bisect
+import contextlib
+import cProfile
+import heapq
+import itertools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+MODES = ("1", "memory")
+PROFILE_SLOWEST = int(os.environ.get("TENDERAI_PROFILE_SLOWEST", 10))
+WALL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # секунд
+MEMORY_BUCKETS = tuple(1024 * 4 ** i for i in range(1, 11))  # 4 КБ … 1 ГБ
+METRICS = {
+    "wall": ("tenderai_stage_wall_seconds", "Время стадии по часам", WALL_BUCKETS),
+    "cpu": ("tenderai_stage_cpu_seconds", "Процессорное время потока в стадии", WALL_BUCKETS),
+    "peak": ("tenderai_stage_peak_bytes", "Пик памяти, выделенной в стадии (tracemalloc)", MEMORY_BUCKETS),
+}
+
+_state = {"enabled": False, "memory": False, "profile_dir": None}
+_local = threading.local()
+_lock = threading.Lock()
+_memory_lock = threading.RLock()  # в режиме memory стадии потоков идут по очереди
+_histograms = {}  # (метрика, стадия) → Histogram
+_profile_lock = threading.Lock()  # cProfile — один на процесс, параллельные вызовы не профилируются
+_slowest = []  # куча (время, номер, путь без расширения)
+_sequence = itertools.count()
+_NULL = contextlib.nullcontext()
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин, как в Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        return list(itertools.accumulate(self.counts))
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q (для +Inf — максимум)."""
+        rank = q * self.count
+        for bound, total in zip(self.buckets + (self.max,), self.cumulative()):
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def configure(mode=None, profile_dir=None, slowest=None):
+    """
+    Включает замеры: mode — None или "0" (выключить), "1" или "memory" (см. в
+    начале модуля); profile_dir — каталог профилей самых медленных вызовов.
+    """
+    global PROFILE_SLOWEST
+    mode = None if mode in ("", "0") else mode
+    if mode not in (None,) + MODES:
+        raise ValueError(f"TENDERAI_STAGE_METRICS: ожидается одно из {MODES}, получено {mode!r}")
+    _state["enabled"] = mode is not None
+    _state["memory"] = mode == "memory"
+    if _state["memory"] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _state["profile_dir"] = profile_dir if _state["enabled"] else None
+    if profile_dir and _state["enabled"]:
+        os.makedirs(profile_dir, exist_ok=True)
+    if slowest is not None:
+        PROFILE_SLOWEST = slowest
+
+
+def enabled():
+    return _state["enabled"]
+
+
+# ─────────────────────────────────────────────
+# ЗАМЕРЫ СТАДИЙ
+# ─────────────────────────────────────────────
+
+class _Stage:
+    __slots__ = ("name", "wall", "cpu", "memory")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.memory = None
+        if _state["memory"]:
+            # Пик общий на процесс: стадии не вкладываются друг в друга, а
+            # стадии других потоков ждут, пока эта не закончится
+            _memory_lock.acquire()
+            self.memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        peak = None
+        if self.memory is not None:
+            peak = tracemalloc.get_traced_memory()[1] - self.memory
+            _memory_lock.release()
+        _record(self.name, wall, cpu, peak)
+
+
+def stage(name):
+    """Контекст одной стадии; без включённых замеров — пустой."""
+    return _Stage(name) if _state["enabled"] else _NULL
+
+
+def _record(name, wall, cpu, peak):
+    values = {"wall": wall, "cpu": cpu}
+    if peak is not None:
+        values["peak"] = max(peak, 0)
+    with _lock:
+        for metric, value in values.items():
+            histogram = _histograms.get((metric, name))
+            if histogram is None:
+                histogram = _histograms[(metric, name)] = Histogram(METRICS[metric][2])
+            histogram.observe(value)
+    stack = getattr(_local, "stack", None)
+    if stack:
+        timings = stack[-1].setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0})
+        timings["wall_ms"] = round(timings["wall_ms"] + wall * 1000, 3)
+        timings["cpu_ms"] = round(timings["cpu_ms"] + cpu * 1000, 3)
+        if peak is not None:
+            timings["peak_kb"] = max(timings.get("peak_kb", 0.0), round(values["peak"] / 1024, 1))
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Собирает стадии, прошедшие в этом потоке внутри блока: отдаёт словарь
+    {стадия: {"wall_ms", "cpu_ms", "peak_kb"}}, заполненный к выходу из
+    блока; без включённых замеров — None. Вложенный collect() забирает
+    стадии себе.
+    """
+    if not _state["enabled"]:
+        yield None
+        return
+    timings = {}
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(timings)
+    try:
+        yield timings
+    finally:
+        stack.pop()
+
+
+def share(results, shared, size=None):
+    """
+    Добавляет в timings результатов стадии, общие для пачки из size
+    документов (по умолчанию — len(results)): время делится поровну, пик
+    памяти остаётся пиком пачки.
+    """
+    if not shared:
+        return
+    size = size or len(results)
+    for result in results:
+        timings = result.setdefault("timings", {})
+        for name, values in shared.items():
+            timings[name] = {
+                "wall_ms": round(values["wall_ms"] / size, 3),
+                "cpu_ms": round(values["cpu_ms"] / size, 3),
+                **({"peak_kb": values["peak_kb"]} if "peak_kb" in values else {}),
+            }
+            if size > 1:
+                timings[name]["batch"] = size
+
+
+# ─────────────────────────────────────────────
+# ПРОФИЛИ САМЫХ МЕДЛЕННЫХ ВЫЗОВОВ
+# ─────────────────────────────────────────────
+
+@contextlib.contextmanager
+def profiled(texts):
+    """
+    Профилирует оценку texts под cProfile, если задан каталог профилей, и
+    сохраняет профиль, если вызов вошёл в PROFILE_SLOWEST самых медленных. Пока
+    профилируется один блок, параллельные идут без профиля.
+    """
+    if not _state["profile_dir"] or PROFILE_SLOWEST <= 0 or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+    try:
+        before = tracemalloc.take_snapshot() if _state["memory"] else None
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            _keep_if_slow(_label(texts), time.perf_counter() - start, profile, before)
+    finally:
+        _profile_lock.release()
+
+
+def _keep_if_slow(label, wall, profile, before):
+    if PROFILE_SLOWEST <= 0 or (len(_slowest) >= PROFILE_SLOWEST and wall <= _slowest[0][0]):
+        return
+    base = os.path.join(_state["profile_dir"], f"{wall * 1000:09.1f}ms-{next(_sequence)}")
+    profile.dump_stats(base + ".prof")
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(f"{label}\n{wall * 1000:.1f} мс\n\n")
+        if before is not None:
+            f.write("Рост памяти по строкам кода (tracemalloc):\n")
+            growth = [stat for stat in _own_traces(tracemalloc.take_snapshot()).compare_to(_own_traces(before), "lineno") if stat.size_diff > 0]
+            for stat in growth[:25]:
+                f.write(f"  {stat}\n")
+            f.write("\n")
+        pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(30)
+    heapq.heappush(_slowest, (wall, base))
+    while len(_slowest) > PROFILE_SLOWEST:
+        _, old = heapq.heappop(_slowest)
+        for ext in (".prof", ".txt"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(old + ext)
+
+
+def _own_traces(snapshot):
+    """Снимок без выделений самих профилировщиков."""
+    return snapshot.filter_traces([tracemalloc.Filter(False, module.__file__) for module in (tracemalloc, cProfile, pstats)] + [
+        tracemalloc.Filter(False, __file__),
+    ])
+
+
+def _label(texts):
+    """Подпись вызова в сводке профиля: число документов и начало первого."""
+    head = " ".join(texts[0][:80].split()) if texts else ""
+    return f"{len(texts)} док.: {head}"
+
+
+# ─────────────────────────────────────────────
+# ВЫГРУЗКА
+# ─────────────────────────────────────────────
+
+def _snapshot():
+    with _lock:
+        return {key: (h.buckets, h.cumulative(), h.sum, h.count, h.max, h) for key, h in sorted(_histograms.items())}
+
+
+def prometheus_text():
+    """Гистограммы в текстовом формате Prometheus."""
+    lines, snapshot = [], _snapshot()
+    for metric, (name, help_text, _) in METRICS.items():
+        items = [(stage_name, data) for (kind, stage_name), data in snapshot.items() if kind == metric]
+        if not items:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for stage_name, (buckets, cumulative, total, count, _, _) in items:
+            for bound, value in zip(buckets, cumulative):
+                lines.append(f'{name}_bucket{{stage="{stage_name}",le="{bound:g}"}} {value}')
+            lines.append(f'{name}_bucket{{stage="{stage_name}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage_name}"}} {total:.9g}')
+            lines.append(f'{name}_count{{stage="{stage_name}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """Гистограммы для JSON: {метрика: {стадия: {"count", "sum", "mean", "p50", "p90", "p99", "max", "buckets"}}}."""
+    result = {}
+    for (metric, stage_name), (buckets, cumulative, total, count, top, histogram) in _snapshot().items():
+        result.setdefault(METRICS[metric][0], {})[stage_name] = {
+            "count": count,
+            "sum": round(total, 6),
+            "mean": round(total / max(count, 1), 6),
+            **{f"p{round(q * 100)}": round(histogram.quantile(q), 6) for q in (0.5, 0.9, 0.99)},
+            "max": round(top, 6),
+            "buckets": {**{f"{bound:g}": value for bound, value in zip(buckets, cumulative)}, "+Inf": count},
+        }
+    return result
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+configure(os.environ.get("TENDERAI_STAGE_METRICS"), os.environ.get("TENDERAI_PROFILE_DIR"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="документы PDF/DOCX")
+    parser.add_argument("--memory", action="store_true", help="замерять и пик памяти стадий (tracemalloc)")
+    parser.add_argument("--profile-dir", help="сохранять профили самых медленных документов сюда")
+    parser.add_argument("--slowest", type=int, default=PROFILE_SLOWEST, help="сколько профилей хранить")
+    parser.add_argument("--format", choices=("table", "json", "prometheus"), default="table")
+    args = parser.parse_args()
+
+    # Запущенный скриптом модуль — это __main__, а predictor пишет замеры в импортированный stage_metrics
+    import stage_metrics as metrics
+    from document_text import extract_text
+    from predictor import predict_single, warmup
+
+    metrics.configure("memory" if args.memory else "1", args.profile_dir, args.slowest)
+    warmup()
+    for path in args.files:
+        text = extract_text(path)
+        if not text.strip():
+            print(f"пропущен {path}: пустой текст", file=sys.stderr)
+            continue
+        result = predict_single(text)
+        total = sum(values["wall_ms"] for values in result["timings"].values())
+        print(f"{path}: {len(text):,} символов, {total:.1f} мс по стадиям", file=sys.stderr)
+    if args.format == "prometheus":
+        print(metrics.prometheus_text(), end="")
+    elif args.format == "json":
+        print(json.dumps(metrics.summary(), ensure_ascii=False, indent=2))
+    else:
+        stats = metrics.summary()
+        wall, cpu = stats["tenderai_stage_wall_seconds"], stats["tenderai_stage_cpu_seconds"]
+        peak = stats.get("tenderai_stage_peak_bytes", {})
+        print(f"{'стадия':<14}{'вызовов':>8}{'среднее, мс':>13}{'p90, мс':>10}{'CPU, мс':>10}{'пик, КБ':>10}")
+        for name, row in sorted(wall.items(), key=lambda item: -item[1]["sum"]):
+            memory = f"{peak[name]['max'] / 1024:10.0f}" if name in peak else f"{'—':>10}"
+            print(
+                f"{name:<14}{row['count']:>8}{row['mean'] * 1000:>13.2f}{row['p90'] * 1000:>10.1f}"
+                f"{cpu[name]['mean'] * 1000:>10.2f}{memory}"
+            )
+
+
+if __name__ == "__main__":
+    main()
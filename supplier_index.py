@@ -0,0 +1,232 @@
+"""
+Индекс поставщиков: поиск упоминаний по названию и БИН.
+
+Два пути поиска по названию (bench_suppliers.py, текст 1 МБ, мс):
+
+    названий в базе        10     32     64    100    200   1000  50000
+    регулярка на название  35     66    111     99    188   1034      —
+    проход по словам      134    126    130     80     79     86     90
+    исходный перебор       25     25     25     21     17     21     98
+
+Регулярка на название стоит ~1.5 мс на МБ и растёт с базой, проход по
+словам (split текста, отбор слов-начал названий, спуск по бору) от базы
+почти не зависит. Точка безубыточности — 64–100 названий, отсюда
+SCAN_MAX_NAMES. Исходный перебор дешевле, потому что делает меньше:
+ищет одну первую фразу «ТОО …» и возвращает одно название, без позиций,
+без БИН и без упоминаний без ОПФ. Для find() это нижняя граница: одни
+lower() и проход регулярки БИН по тому же тексту занимают ~20 мс.
+"""
+import itertools
+import re
+
+from rules import original_positions, restore_span
+
+# Организационно-правовые формы не отличают одного поставщика от другого —
+# в названиях они отбрасываются, иначе «ТОО» совпадало бы с любым ТОО
+LEGAL_FORMS = {
+    "тоо", "ип", "ао", "оао", "зао", "ооо", "пк", "гкп", "ргп", "гу", "кгу", "ко",
+    "жшс", "ақ", "too", "llp", "jsc", "llc", "ltd", "inc",
+}
+
+_WORD_RE = re.compile(r"\w+")
+_WORD_CHAR_RE = re.compile(r"\w")
+_GAP_RE = re.compile(r"(\W+)")
+_LAST_WORD_RE = re.compile(r"(\w+)\W*\Z")
+# Без ретроспективной проверки sre ищет первую цифру быстрым фильтром,
+# поэтому граница слева проверяется вручную
+_BIN_RE = re.compile(r"\d\d{11}(?!\d)")
+_generations = itertools.count()
+# До стольких названий find() ищет каждое своей регуляркой, дальше — проходом
+# по словам текста (замеры — в docstring модуля)
+SCAN_MAX_NAMES = 64
+# Между ОПФ и названием — только пробелы и кавычки: «ТОО Альфа», «ТОО «Альфа»»
+_FORM_GAP_RE = re.compile(r"[\s«»\"“”„'‘’]*")
+_OPENING_QUOTES = "«\"“„'‘"
+
+
+def _lower(text):
+    # ё→е не меняет длину; lower() изредка меняет («İ»), см. rules.original_positions
+    return text.lower().replace("ё", "е")
+
+
+def normalize_name(name):
+    """Название → кортеж значимых слов: нижний регистр, ё→е, без кавычек и ОПФ."""
+    return tuple(w for w in _WORD_RE.findall(_lower(name)) if w not in LEGAL_FORMS)
+
+
+def normalize_bin(value):
+    """БИН/ИИН → 12 цифр или None."""
+    digits = re.sub(r"\D", "", str(value or ""))
+    return digits if len(digits) == 12 else None
+
+
+class SupplierIndex:
+    """
+    Бор над словами нормализованных названий плюс словарь БИН →
+    поставщик. Небольшая база (до SCAN_MAX_NAMES названий) ищется по
+    регулярке на название, большая — одним проходом по словам текста,
+    стоимость которого от размера базы почти не зависит.
+    """
+
+    def __init__(self, suppliers=()):
+        self._goto = [{}]
+        self._names = [[]]  # key названий, оканчивающихся в узле
+        self._patterns = None  # регулярки небольшой базы — строятся в build()
+        self._built = False
+        self._bins = {}
+        # Номер состояния: свой у каждого экземпляра и новый после каждого
+        # add() — по нему кэшируют результаты find()
+        self.generation = next(_generations)
+        for key, name, bin_value in suppliers:
+            self.add(key, name, bin_value)
+
+    def __len__(self):
+        return sum(len(names) for names in self._names)
+
+    def add(self, key, name, bin_value=None):
+        """Добавляет поставщика; key — что вернуть при совпадении (обычно название в базе)."""
+        self.generation = next(_generations)
+        bin_value = normalize_bin(bin_value)
+        if bin_value:
+            self._bins[bin_value] = key
+        words = normalize_name(name)
+        if not words:
+            return
+        state = 0
+        for word in words:
+            nxt = self._goto[state].get(word)
+            if nxt is None:
+                nxt = self._goto[state][word] = len(self._goto)
+                self._goto.append({})
+                self._names.append([])
+            state = nxt
+        self._names[state].append(key)
+        self._built = False
+
+    def build(self):
+        """
+        Готовит поиск: для базы до SCAN_MAX_NAMES названий — регулярку на
+        каждое (его слова подряд через небуквенные символы). find()
+        вызывает его сам после add(); при работе из нескольких потоков
+        индекс стоит собрать заранее — дальше find() его только читает.
+        """
+        patterns = None
+        if len(self) <= SCAN_MAX_NAMES:
+            patterns = []
+            stack = [(0, ())]
+            while stack:
+                state, words = stack.pop()
+                if self._names[state]:
+                    patterns.append((re.compile(r"\W+".join(map(re.escape, words))), len(words), self._names[state]))
+                stack.extend((nxt, words + (word,)) for word, nxt in self._goto[state].items())
+        self._patterns = patterns
+        self._built = True
+
+    def find(self, text):
+        """
+        Все упоминания поставщиков в тексте:
+        [{"key", "start", "end", "via": "bin" | "name"}, ...]
+        Сначала совпадения по БИН, затем по названию — по позиции, при
+        одинаковом начале более длинное название раньше. Название из одного
+        значимого слова («ТОО Казахстан» → «казахстан») засчитывается,
+        только если перед ним стоит ОПФ или открывающая кавычка — иначе
+        его находил бы каждый «Закон Республики Казахстан».
+        """
+        if not self._built:
+            self.build()
+        low = _lower(text)
+        by_bin = []
+        if self._bins:
+            for m in _BIN_RE.finditer(low):
+                if m.start() and low[m.start() - 1].isdigit():
+                    continue
+                key = self._bins.get(m.group())
+                if key is not None:
+                    by_bin.append({"key": key, "start": m.start(), "end": m.end(), "via": "bin"})
+        by_name = self._by_pattern(low) if self._patterns is not None else self._by_words(low)
+        by_name.sort(key=lambda hit: (hit["start"], -hit["end"]))
+        back = original_positions(text, low)
+        if back is not None:
+            for hit in by_bin + by_name:
+                hit["start"], hit["end"] = restore_span(back, hit["start"], hit["end"])
+        return by_bin + by_name
+
+    def _by_pattern(self, low):
+        found = []
+        for pattern, length, keys in self._patterns:
+            pos = 0
+            while True:
+                m = pattern.search(low, pos)
+                if m is None:
+                    break
+                start, end = m.span()
+                pos = start + 1  # названия могут перекрываться, как в проходе по словам
+                # Границы слов — вручную: с ретроспективной проверкой sre теряет быстрый поиск префикса
+                if (start and _WORD_CHAR_RE.match(low, start - 1)) or _WORD_CHAR_RE.match(low, end):
+                    continue
+                if length == 1 and not _named_in_context(low, *_previous_word(low, start), start):
+                    continue
+                found.extend({"key": key, "start": start, "end": end, "via": "name"} for key in keys)
+        return found
+
+    def _by_words(self, low):
+        # Текст — одним split на C: слова на чётных местах, промежутки между
+        # ними на нечётных. Тоже на C отбираются слова, с которых начинается
+        # хоть одно название, и только от них идёт спуск по бору
+        goto, names, root = self._goto, self._names, self._goto[0]
+        parts = _GAP_RE.split(low)
+        words = parts[::2]
+        hits = []  # (номер первого слова, номер последнего слова, key)
+        for first in itertools.compress(itertools.count(), map(root.__contains__, words)):
+            state, last = root[words[first]], first
+            while True:
+                hits.extend((first, last, key) for key in names[state])
+                last += 1
+                state = goto[state].get(words[last]) if last < len(words) else None
+                if state is None:
+                    break
+        if not hits:
+            return []
+        # Позиции в символах — суммы длин частей, и только до последнего найденного слова
+        ends = list(itertools.accumulate(map(len, itertools.islice(parts, 2 * max(last for _, last, _ in hits) + 1))))
+        found = []
+        for first, last, key in hits:
+            start = ends[2 * first - 1] if first else 0
+            if first == last and not _named_in_context(low, words[first - 1] if first else None, ends[2 * first - 2] if first else 0, start):
+                continue
+            found.append({"key": key, "start": start, "end": ends[2 * last], "via": "name"})
+        return found
+
+
+def _previous_word(low, start):
+    """Слово перед позицией start и его конец; (None, 0), если слов перед ней нет."""
+    lo = max(start - 256, 0)
+    m = _LAST_WORD_RE.search(low, lo, start)
+    if lo and (m is None or m.start() == lo):  # слово могло начаться раньше окна
+        m = _LAST_WORD_RE.search(low, 0, start)
+    return (m.group(1), m.end(1)) if m else (None, 0)
+
+
+def _named_in_context(low, previous, gap_start, start):
+    """Слово с позиции start — название: перед ним ОПФ previous через пробелы и кавычки или открывающая кавычка."""
+    gap = low[gap_start:start]
+    if previous in LEGAL_FORMS and _FORM_GAP_RE.fullmatch(gap):
+        return True
+    quote = gap.rstrip()[-1:]
+    return bool(quote) and quote in _OPENING_QUOTES
+
+
+def merge_mentions(parts):
+    """
+    Упоминания в документе из find() его частей: parts — [(сдвиг части в
+    документе, упоминания)] по порядку. Порядок — как у find() по всему
+    документу; совпадает с ним, если ни одно название не пересекает
+    границу частей.
+    """
+    by_bin, by_name = [], []
+    for offset, mentions in parts:
+        for hit in mentions:
+            (by_bin if hit["via"] == "bin" else by_name).append(dict(hit, start=hit["start"] + offset, end=hit["end"] + offset))
+    by_name.sort(key=lambda hit: (hit["start"], -hit["end"]))
+    return by_bin + by_name
+
@@ -1,8 +1,17 @@
-import re
+import os
+import threading
+
+import rules
+from supplier_index import SupplierIndex
+from winner_store import WinnerStore, format_amount
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# База, собранная из выгрузки goszakup; если файла нет — демо-данные ниже в памяти
+WINNER_DB_PATH = os.environ.get("TENDERAI_WINNER_DB", os.path.join(BASE_DIR, ".cache", "winners.sqlite"))
 
 # ─────────────────────────────────────────────
 # ЗАХАРДКОЖЕННЫЕ ДЕМО-ДАННЫЕ
-# В реальной версии — подключение к goszakup API
+# Используются, пока нет базы WINNER_DB_PATH (её заполняет import_awards.py)
 # ─────────────────────────────────────────────
 
 WINNER_DATABASE = {
@@ -14,57 +23,122 @@ WINNER_DATABASE = {
             {"tender": "Закупка компьютерной техники", "amount": "15,600,000 тг", "customer": "ГУ Управление образования Туркестанской области", "year": 2024},
             {"tender": "Закупка ноутбуков для классов", "amount": "12,750,000 тг", "customer": "ГУ Управление образования Туркестанской области", "year": 2024},
         ],
-        "risk": "high"
     },
     "ТОО ДельтаСервис": {
         "wins": [
             {"tender": "Ремонт оргтехники", "amount": "1,200,000 тг", "customer": "Акимат Туркестанской области", "year": 2023},
             {"tender": "Техническое обслуживание", "amount": "980,000 тг", "customer": "Акимат Туркестанской области", "year": 2024},
         ],
-        "risk": "medium"
     },
     "ТОО АлматыТрейд": {
         "wins": [
             {"tender": "Поставка канцтоваров", "amount": "450,000 тг", "customer": "Школа №5 г. Туркестан", "year": 2024},
         ],
-        "risk": "low"
     },
 }
 
-# Ключевые слова для определения поставщика из текста
-SUPPLIER_KEYWORDS = [
-    r"(ТОО\s+[\w\s]{3,30})",
-    r"сервисн\w+\s+центр[^\n\.]{0,30}",
-    r"через\s+(ТОО\s+[\w\s]{3,20})",
-]
+# Для демо — признаки тендера высокого риска
+# (в нижнем регистре — применяются к text.lower(), см. rules.py)
+DEMO_HIGH_RISK_PATTERNS = [r"(dell|строго|авторизованн\w+\s+дилер)"]
+
+rules.register("winner.demo_high_risk", DEMO_HIGH_RISK_PATTERNS, limit=1)
+WINNER_RULE_IDS = ["winner.demo_high_risk"]
+
+# Пороги риска по оценке сговора из графа WinnerStore (0–1: доля побед
+# у заказчика, умноженная на серию подряд, см. COLLUSION_STREAK)
+HIGH_RISK_SCORE = 0.8
+MEDIUM_RISK_SCORE = 0.5
+MEDIUM_RISK_WINS = 2
+
+_state = {}
+_state_lock = threading.Lock()
+
+
+def _load_demo(store):
+    store.add_awards(
+        dict(win, supplier=name, supplier_bin=data.get("bin"))
+        for name, data in WINNER_DATABASE.items()
+        for win in data["wins"]
+    )
+
 
+def get_winner_store():
+    """Хранилище истории побед: WINNER_DB_PATH или, если его нет, демо-данные в памяти."""
+    store = _state.get("store")
+    if store is None:
+        with _state_lock:
+            store = _state.get("store")
+            if store is None:
+                demo = not os.path.exists(WINNER_DB_PATH)
+                if demo:
+                    store = WinnerStore()
+                    _load_demo(store)
+                else:
+                    store = WinnerStore(WINNER_DB_PATH)
+                _state["demo"] = demo
+                _state["store"] = store
+    return store
 
-def check_winner_history(text):
+
+def get_supplier_index():
+    """Индекс названий и БИН всех поставщиков хранилища — строится один раз."""
+    index = _state.get("index")
+    if index is None:
+        store = get_winner_store()
+        with _state_lock:
+            index = _state.get("index")
+            if index is None:
+                index = SupplierIndex((name, name, bin_value) for name, bin_value in store.iter_suppliers())
+                index.build()
+                _state["index"] = index
+    return index
+
+
+def reset_winner_store():
+    """Сбрасывает хранилище и индекс — после импорта новой выгрузки."""
+    with _state_lock:
+        store = _state.pop("store", None)
+        _state.pop("index", None)
+        _state.pop("demo", None)
+    if store is not None:
+        store.close()
+
+
+def _risk_level(summary):
+    if summary["collusion_score"] >= HIGH_RISK_SCORE:
+        return "high"
+    if summary["collusion_score"] >= MEDIUM_RISK_SCORE or summary["wins"] >= MEDIUM_RISK_WINS:
+        return "medium"
+    return "low"
+
+
+def check_winner_history(text, index=None, mentions=None):
     """
     Проверяет историю побед поставщика упомянутого в тендере.
     Возвращает словарь с историей и уровнем риска.
+    index — готовый rules.scan() документа, чтобы не сканировать текст повторно.
+    mentions — готовый get_supplier_index().find(text).
     """
-    # Ищем упоминание поставщика в тексте
-    detected_supplier = None
-    for pattern in SUPPLIER_KEYWORDS:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            found = match.group(0).strip()
-            # Проверяем есть ли в базе
-            for supplier_name in WINNER_DATABASE:
-                if any(word.lower() in found.lower() for word in supplier_name.split()):
-                    detected_supplier = supplier_name
-                    break
-        if detected_supplier:
-            break
+    if index is None:
+        index = rules.scan(text, WINNER_RULE_IDS)
+    store = get_winner_store()
+    demo = _state["demo"]
+
+    # Ищем поставщиков из базы в тексте: сначала по БИН, затем по названию
+    if mentions is None:
+        mentions = get_supplier_index().find(text)
+    detected_supplier = mentions[0]["key"] if mentions else None
+    matched_by = mentions[0]["via"] if mentions else None
 
     # Если не нашли конкретного — проверяем по умолчанию для демо
-    if not detected_supplier:
+    if not detected_supplier and demo:
         # Для демо — если тендер высокого риска показываем ТехноПарк
-        if re.search(r"(Dell|строго|авторизованн\w+\s+дилер)", text, re.IGNORECASE):
+        if index["winner.demo_high_risk"]:
             detected_supplier = "ТОО ТехноПарк Астана"
+            matched_by = "demo"
 
-    if not detected_supplier:
+    summary = store.supplier(detected_supplier) if detected_supplier else None
+    if not summary:
         return {
             "found": False,
             "message": "Поставщик в тексте не определён",
@@ -73,29 +147,40 @@ def check_winner_history(text):
             "risk_level": "unknown"
         }
 
-    data = WINNER_DATABASE[detected_supplier]
-    wins = data["wins"]
-    risk = data["risk"]
-    same_customer_wins = [w for w in wins if w["customer"] == wins[0]["customer"]]
+    wins = [dict(w, amount=format_amount(w["amount"])) for w in store.wins(summary["id"])]
+    risk = _risk_level(summary)
 
     if risk == "high":
         flag = "🔴"
-        message = f"Поставщик побеждал у одного заказчика {len(same_customer_wins)} раз подряд — возможный сговор"
+        message = (
+            f"Поставщик выиграл {summary['collusion_customer_wins']} из {summary['collusion_customer_total']} закупок "
+            f"заказчика, {summary['collusion_customer_streak']} раз подряд — возможный сговор"
+        )
     elif risk == "medium":
         flag = "🟡"
-        message = f"Поставщик имеет {len(wins)} победы — рекомендуется проверка"
+        message = f"Поставщик имеет {summary['wins']} победы — рекомендуется проверка"
     else:
         flag = "🟢"
-        message = f"Поставщик имеет {len(wins)} победу — история чистая"
+        message = f"Поставщик имеет {summary['wins']} победу — история чистая"
 
-    return {
+    result = {
         "found": True,
         "supplier": detected_supplier,
         "flag": flag,
         "message": message,
         "wins": wins,
-        "total_wins": len(wins),
-        "same_customer_wins": len(same_customer_wins),
+        "total_wins": summary["wins"],
+        "total_amount": summary["total_amount"],
+        "same_customer_wins": summary["top_customer_wins"],
+        "top_customer": summary["top_customer"],
+        "streak": summary["streak"],
+        "collusion_score": round(summary["collusion_score"], 2),
+        "collusion_customer": summary["collusion_customer"],
+        "customer_share": summary["collusion_customer_wins"] / summary["collusion_customer_total"],
+        "customer_hhi": summary["collusion_customer_hhi"],
         "risk_level": risk,
-        "demo_note": "⚠️ Демо-данные. В продакшене — реальные данные из goszakup.gov.kz"
+        "matched_by": matched_by,
     }
+    if demo:
+        result["demo_note"] = "⚠️ Демо-данные. В продакшене — реальные данные из goszakup.gov.kz"
+    return result
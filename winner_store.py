@@ -0,0 +1,487 @@
+"""Хранилище истории побед: SQLite с типизированными суммами и готовыми агрегатами."""
+import json
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppliers (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    bin  TEXT
+);
+CREATE INDEX IF NOT EXISTS suppliers_bin ON suppliers (bin);
+
+CREATE TABLE IF NOT EXISTS customers (
+    id   INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    bin  TEXT
+);
+CREATE INDEX IF NOT EXISTS customers_bin ON customers (bin);
+
+CREATE TABLE IF NOT EXISTS awards (
+    id          INTEGER PRIMARY KEY,
+    supplier_id INTEGER NOT NULL REFERENCES suppliers (id),
+    customer_id INTEGER NOT NULL REFERENCES customers (id),
+    tender      TEXT,
+    amount      INTEGER,  -- тенге
+    year        INTEGER,
+    key         TEXT      -- ключ контракта: повторная загрузка того же контракта пропускается
+);
+CREATE UNIQUE INDEX IF NOT EXISTS awards_key ON awards (key) WHERE key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS awards_supplier ON awards (supplier_id, year);
+CREATE INDEX IF NOT EXISTS awards_tender ON awards (tender);
+-- Покрывающий и в порядке закупок заказчика (год, id): граф агрегатов
+-- строится проходом по нему без сортировки и без чтения таблицы
+CREATE INDEX IF NOT EXISTS awards_customer ON awards (customer_id, year, id, supplier_id, amount);
+
+-- Сколько записей источника уже загружено — для продолжения прерванного импорта
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+    source TEXT PRIMARY KEY,
+    size   INTEGER,
+    rows   INTEGER NOT NULL
+);
+
+-- Агрегаты — двудольный граф «поставщик — заказчик»: рёбра pair_stats,
+-- узлы customer_stats и supplier_stats. add_awards() обновляет только
+-- затронутые узлы; refresh_aggregates() строит граф заново после
+-- массовой загрузки
+CREATE TABLE IF NOT EXISTS pair_stats (
+    supplier_id  INTEGER NOT NULL,
+    customer_id  INTEGER NOT NULL,
+    wins         INTEGER NOT NULL,
+    total_amount INTEGER NOT NULL,
+    first_year   INTEGER,
+    last_year    INTEGER,
+    streak       INTEGER NOT NULL,  -- самая длинная серия побед подряд у заказчика
+    PRIMARY KEY (supplier_id, customer_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pair_stats_customer ON pair_stats (customer_id);
+
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id      INTEGER PRIMARY KEY,
+    wins             INTEGER NOT NULL,
+    total_amount     INTEGER NOT NULL,
+    suppliers        INTEGER NOT NULL,
+    wins_sq          INTEGER NOT NULL,  -- сумма квадратов побед поставщиков: HHI = wins_sq / wins² × 10000
+    -- Последняя закупка по порядку (год, id) и серия на ней: новые победы
+    -- продолжают серию без перечитывания истории заказчика
+    last_year        INTEGER,
+    last_award_id    INTEGER,
+    last_supplier_id INTEGER,
+    run              INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS supplier_stats (
+    supplier_id       INTEGER PRIMARY KEY,
+    wins              INTEGER NOT NULL,
+    total_amount      INTEGER NOT NULL,
+    customers         INTEGER NOT NULL,
+    top_customer_id   INTEGER,
+    top_customer_wins INTEGER NOT NULL,
+    streak            INTEGER NOT NULL,
+    first_year        INTEGER,
+    last_year         INTEGER,
+    collusion_score       REAL,     -- наибольшая оценка среди рёбер поставщика
+    collusion_customer_id INTEGER   -- заказчик на этом ребре
+);
+CREATE INDEX IF NOT EXISTS supplier_stats_collusion ON supplier_stats (collusion_customer_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Оценка ребра — доля побед поставщика у заказчика, умноженная на
+# min(серия, COLLUSION_STREAK) / COLLUSION_STREAK. Победы других
+# поставщиков у того же заказчика её только уменьшают, поэтому при
+# дозагрузке пересчитываются лишь поставщики, чьё самое рискованное ребро ведёт
+# к затронутому заказчику
+COLLUSION_STREAK = 3
+
+# Узлы поставщиков из рёбер pair_stats — одним GROUP BY; {where}
+# ограничивает пересчёт затронутыми поставщиками
+SUPPLIER_STATS_SQL = """
+INSERT INTO supplier_stats
+WITH edges AS (
+    SELECT p.*, CAST(p.wins AS REAL) / c.wins * MIN(p.streak, {streak}) / {streak} AS score
+    FROM pair_stats p JOIN customer_stats c ON c.customer_id = p.customer_id
+    WHERE {where}
+), ranked AS (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY supplier_id ORDER BY wins DESC, streak DESC, customer_id) AS place,
+              ROW_NUMBER() OVER (PARTITION BY supplier_id ORDER BY score DESC, customer_id) AS risk_place
+    FROM edges
+)
+SELECT supplier_id, SUM(wins), SUM(total_amount), COUNT(*),
+       MAX(CASE WHEN place = 1 THEN customer_id END),
+       MAX(CASE WHEN place = 1 THEN wins END),
+       MAX(streak), MIN(first_year), MAX(last_year),
+       MAX(score), MAX(CASE WHEN risk_place = 1 THEN customer_id END)
+FROM ranked GROUP BY supplier_id
+"""
+
+
+def parse_amount(value):
+    """
+    Сумма из строки вида "12,750,000 тг", "1 234 567,89 ₸" или числа →
+    целые тенге (None, если цифр нет). Запятая считается десятичной,
+    только если она одна и после неё не три цифры.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else int(round(value))
+    s = re.sub(r"[^\d,.]", "", str(value))
+    if not re.search(r"\d", s):
+        return None
+    if "," in s and "." in s:
+        decimal = max(s.rfind(","), s.rfind("."))
+        s = re.sub(r"[,.]", "", s[:decimal]) + "." + s[decimal + 1:]
+    elif s.count(",") == 1 and not re.search(r",\d{3}$", s):
+        s = s.replace(",", ".")
+    elif s.count(".") == 1 and not re.search(r"\.\d{3}$", s):
+        pass
+    else:
+        s = re.sub(r"[,.]", "", s)
+    return int(round(float(s)))
+
+
+def format_amount(amount):
+    return "—" if amount is None else f"{amount:,} тг"
+
+
+def _order(year, award_id):
+    # Порядок закупок заказчика, как в ORDER BY year, id: год NULL — раньше всех
+    return (year is not None, year or 0, award_id)
+
+
+def _new_customer():
+    # Строка customer_stats без customer_id для заказчика без побед
+    return [0, 0, 0, 0, None, None, None, 0]
+
+
+def _fold(customer, pairs, rows):
+    """
+    Дописывает победы одного заказчика (supplier_id, amount, year, id),
+    идущие по порядку после уже учтённых, в его узел customer (строка
+    customer_stats без id) и рёбра pairs {supplier_id: [победы, сумма,
+    первый год, последний год, серия]}.
+    """
+    wins, total, suppliers, wins_sq, last_year, last_id, prev, run = customer
+    for supplier, amount, year, award_id in rows:
+        run = run + 1 if supplier == prev else 1
+        prev = supplier
+        pair = pairs.get(supplier)
+        if pair is None:
+            pair = pairs[supplier] = [0, 0, year, year, 0]
+            suppliers += 1
+        wins_sq += 2 * pair[0] + 1
+        pair[0] += 1
+        pair[1] += amount or 0
+        if year is not None:
+            pair[2] = year if pair[2] is None else min(pair[2], year)
+            pair[3] = year if pair[3] is None else max(pair[3], year)
+        pair[4] = max(pair[4], run)
+        wins += 1
+        total += amount or 0
+        last_year, last_id = year, award_id
+    customer[:] = [wins, total, suppliers, wins_sq, last_year, last_id, prev, run]
+
+
+class WinnerStore:
+    """
+    История побед в SQLite. Одно соединение на хранилище под блокировкой
+    (Streamlit и воркеры вызывают из разных потоков); в памяти держатся
+    только запрошенные строки, поэтому история из миллионов контрактов
+    не раздувает процесс. Поиск поставщика — по первичному или
+    уникальному ключу, агрегаты читаются готовыми из pair_stats и
+    supplier_stats.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA cache_size=-65536")  # 64 МБ: вставки в индексы по случайным ключам
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _entity_ids(self, table, entities):
+        """
+        {название: id} для пачки названий ({название: БИН}). Если БИН уже
+        есть в базе — берётся его запись, как бы ни было записано название;
+        иначе запись ищется по названию, новые добавляются, пустой БИН у
+        существующих заполняется. Несколько запросов на пачку вместо
+        поиска по одному.
+        """
+        bins = {bin_value for bin_value in entities.values() if bin_value}
+        by_bin = {}
+        if bins:
+            rows = self._conn.execute(f"SELECT bin, id FROM {table} WHERE bin IN (SELECT value FROM json_each(?))", (json.dumps(list(bins)),))
+            by_bin = dict(rows.fetchall())
+        ids = {name: by_bin[bin_value] for name, bin_value in entities.items() if bin_value in by_bin}
+        rest = [(name, bin_value) for name, bin_value in entities.items() if name not in ids]
+        if rest:
+            self._conn.executemany(
+                f"""
+                INSERT INTO {table} (name, bin) VALUES (?, ?)
+                ON CONFLICT (name) DO UPDATE SET bin = excluded.bin WHERE bin IS NULL AND excluded.bin IS NOT NULL
+                """,
+                rest,
+            )
+            rows = self._conn.execute(f"SELECT name, id FROM {table} WHERE name IN (SELECT value FROM json_each(?))", (json.dumps([name for name, _ in rest]),))
+            ids.update(rows.fetchall())
+        return ids
+
+    def add_awards(self, awards, checkpoint=None, update_aggregates=True):
+        """
+        Дописывает победы одной транзакцией и возвращает, сколько из них
+        новых. Каждая — словарь с ключами supplier, customer и
+        необязательными supplier_bin, customer_bin, tender, amount (строка
+        или число), year, key. Победа с уже загруженным key пропускается.
+        checkpoint — (источник, размер, строк прочитано): сохраняется в той
+        же транзакции, поэтому после сбоя импорт продолжается ровно с
+        последней записанной пачки. Граф агрегатов обновляется в той же
+        транзакции; update_aggregates=False — массовая загрузка без
+        обновления, агрегаты считаются устаревшими до refresh_aggregates().
+        """
+        awards = list(awards)
+        suppliers, customers = {}, {}
+        for award in awards:
+            if not suppliers.get(award["supplier"]):
+                suppliers[award["supplier"]] = award.get("supplier_bin")
+            if not customers.get(award["customer"]):
+                customers[award["customer"]] = award.get("customer_bin")
+        with self._lock, self._conn:
+            supplier_ids = self._entity_ids("suppliers", suppliers)
+            customer_ids = self._entity_ids("customers", customers)
+            after_id = self._conn.execute("SELECT MAX(id) FROM awards").fetchone()[0] or 0
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO awards (supplier_id, customer_id, tender, amount, year, key) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (supplier_ids[a["supplier"]], customer_ids[a["customer"]], a.get("tender"),
+                     parse_amount(a.get("amount")), int(a["year"]) if a.get("year") else None, a.get("key"))
+                    for a in awards
+                ),
+            )
+            if checkpoint:
+                self._conn.execute(
+                    "INSERT INTO import_checkpoints (source, size, rows) VALUES (?, ?, ?) "
+                    "ON CONFLICT (source) DO UPDATE SET size = excluded.size, rows = excluded.rows",
+                    checkpoint,
+                )
+            if not update_aggregates:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('aggregates_stale', '1')")
+            elif not self._stale():
+                self._update_aggregates(after_id)
+        return max(cursor.rowcount, 0) if awards else 0
+
+    def _stale(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'aggregates_stale'").fetchone()
+        return bool(row and row[0] == "1")
+
+    def aggregates_stale(self):
+        """True, если после массовой загрузки нужен refresh_aggregates()."""
+        with self._lock:
+            return self._stale()
+
+    def get_checkpoint(self, source):
+        """(размер, строк прочитано) последнего импорта источника или None."""
+        with self._lock:
+            row = self._conn.execute("SELECT size, rows FROM import_checkpoints WHERE source = ?", (source,)).fetchone()
+        return (row["size"], row["rows"]) if row else None
+
+    def refresh_aggregates(self):
+        """
+        Строит граф агрегатов заново. Победы читаются одним проходом по
+        индексу (заказчик, год, id): серия — подряд идущие закупки
+        заказчика, выигранные одним поставщиком. В памяти — только рёбра
+        текущего заказчика, они пишутся в базу при переходе к следующему.
+        """
+        with self._lock, self._conn:
+            for table in ("pair_stats", "customer_stats", "supplier_stats"):
+                self._conn.execute(f"DELETE FROM {table}")
+            customers = []
+            self._conn.executemany("INSERT INTO pair_stats VALUES (?, ?, ?, ?, ?, ?, ?)", self._pair_stats(customers))
+            self._conn.executemany("INSERT INTO customer_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", customers)
+            self._update_supplier_stats()
+            self._conn.execute("DELETE FROM meta WHERE key = 'aggregates_stale'")
+
+    def _pair_stats(self, customers):
+        rows = self._conn.execute("SELECT customer_id, supplier_id, amount, year, id FROM awards ORDER BY customer_id, year, id")
+        for customer_id, group in groupby(rows, itemgetter(0)):
+            customer, pairs = _new_customer(), {}
+            _fold(customer, pairs, (row[1:] for row in group))
+            customers.append((customer_id, *customer))
+            yield from ((s, customer_id, *stats) for s, stats in pairs.items())
+
+    def _update_aggregates(self, after_id):
+        """
+        Дописывает в граф победы с id > after_id. Узел заказчика продолжает
+        серию с сохранённой последней закупки, из рёбер читаются только
+        пары новых побед. Если новая победа по порядку (год, id) раньше
+        последней учтённой — выгрузка задним числом, — заказчик
+        пересчитывается по своим победам целиком. Затем пересчитываются
+        узлы поставщиков, которых это могло задеть: с новыми победами,
+        соседи пересчитанных заказчиков и те, чьё самое рискованное ребро ведёт к
+        затронутому заказчику.
+        """
+        conn = self._conn
+        # Новые строки — диапазоном по id; ORDER BY в запросе увёл бы план
+        # на полный проход по индексу заказчиков, поэтому сортировка здесь
+        rows = conn.execute("SELECT customer_id, supplier_id, amount, year, id FROM awards WHERE id > ?", (after_id,)).fetchall()
+        if not rows:
+            return
+        rows.sort(key=lambda row: (row[0], *_order(row[3], row[4])))
+        new = {customer_id: [tuple(row)[1:] for row in group] for customer_id, group in groupby(rows, itemgetter(0))}
+        states = {
+            row[0]: list(row)[1:]
+            for row in conn.execute(
+                "SELECT * FROM customer_stats WHERE customer_id IN (SELECT value FROM json_each(?))", (json.dumps(list(new)),)
+            )
+        }
+        appended = {
+            customer_id: awards for customer_id, awards in new.items()
+            if customer_id not in states or _order(*awards[0][2:]) > _order(*states[customer_id][4:6])
+        }
+        affected, pair_rows, customer_rows = set(), [], []
+
+        for customer_id in new.keys() - appended.keys():
+            affected.update(s for (s,) in conn.execute("SELECT supplier_id FROM pair_stats WHERE customer_id = ?", (customer_id,)))
+            conn.execute("DELETE FROM pair_stats WHERE customer_id = ?", (customer_id,))
+            customer, pairs = _new_customer(), {}
+            _fold(customer, pairs, conn.execute(
+                "SELECT supplier_id, amount, year, id FROM awards WHERE customer_id = ? ORDER BY year, id", (customer_id,)
+            ))
+            customer_rows.append((customer_id, *customer))
+            pair_rows.extend((s, customer_id, *stats) for s, stats in pairs.items())
+            affected.update(pairs)
+
+        if appended:
+            keys = json.dumps([[s, c] for c, awards in appended.items() for s in {award[0] for award in awards}])
+            edges = defaultdict(dict)
+            for s, c, *stats in conn.execute(
+                """
+                SELECT * FROM pair_stats WHERE (supplier_id, customer_id) IN
+                    (SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?))
+                """,
+                (keys,),
+            ):
+                edges[c][s] = stats
+            for customer_id, awards in appended.items():
+                customer = states.get(customer_id) or _new_customer()
+                pairs = edges[customer_id]
+                _fold(customer, pairs, awards)
+                customer_rows.append((customer_id, *customer))
+                pair_rows.extend((s, customer_id, *stats) for s, stats in pairs.items())
+                affected.update(award[0] for award in awards)
+            affected.update(s for (s,) in conn.execute(
+                "SELECT supplier_id FROM supplier_stats WHERE collusion_customer_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(appended)),),
+            ))
+
+        conn.executemany("INSERT OR REPLACE INTO pair_stats VALUES (?, ?, ?, ?, ?, ?, ?)", pair_rows)
+        conn.executemany("INSERT OR REPLACE INTO customer_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", customer_rows)
+        self._update_supplier_stats(affected)
+
+    def _update_supplier_stats(self, supplier_ids=None):
+        """Пересчитывает узлы поставщиков из их рёбер: всех или только supplier_ids."""
+        if supplier_ids is None:
+            self._conn.execute("DELETE FROM supplier_stats")
+            self._conn.execute(SUPPLIER_STATS_SQL.format(where="1", streak=COLLUSION_STREAK))
+            return
+        ids = json.dumps(list(supplier_ids))
+        self._conn.execute("DELETE FROM supplier_stats WHERE supplier_id IN (SELECT value FROM json_each(?))", (ids,))
+        self._conn.execute(
+            SUPPLIER_STATS_SQL.format(where="p.supplier_id IN (SELECT value FROM json_each(?))", streak=COLLUSION_STREAK), (ids,)
+        )
+
+    def supplier(self, name=None, bin_value=None):
+        """
+        Сводка по поставщику (по названию или БИН) или None: победы,
+        главный заказчик, серия и оценка сговора с ребром, на котором она
+        достигается (доля побед у заказчика, серия, HHI заказчика 0–10000).
+        """
+        column, value = ("bin", bin_value) if bin_value else ("name", name)
+        with self._lock:
+            row = self._conn.execute(
+                f"""
+                SELECT s.id, s.name, s.bin, st.wins, st.total_amount, st.customers,
+                       c.name AS top_customer, st.top_customer_wins, st.streak,
+                       p.streak AS top_customer_streak, st.first_year, st.last_year,
+                       st.collusion_score, rc.name AS collusion_customer,
+                       rp.wins AS collusion_customer_wins, rp.streak AS collusion_customer_streak,
+                       rs.wins AS collusion_customer_total, rs.wins_sq * 10000 / (rs.wins * rs.wins) AS collusion_customer_hhi
+                FROM suppliers s
+                JOIN supplier_stats st ON st.supplier_id = s.id
+                LEFT JOIN customers c ON c.id = st.top_customer_id
+                LEFT JOIN pair_stats p ON p.supplier_id = s.id AND p.customer_id = st.top_customer_id
+                LEFT JOIN customers rc ON rc.id = st.collusion_customer_id
+                LEFT JOIN pair_stats rp ON rp.supplier_id = s.id AND rp.customer_id = st.collusion_customer_id
+                LEFT JOIN customer_stats rs ON rs.customer_id = st.collusion_customer_id
+                WHERE s.{column} = ?
+                """,
+                (value,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def wins(self, supplier_id, limit=20):
+        """Последние limit побед поставщика в хронологическом порядке."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT a.tender, a.amount, a.year, c.name AS customer
+                FROM awards a JOIN customers c ON c.id = a.customer_id
+                WHERE a.supplier_id = ?
+                ORDER BY a.year DESC, a.id DESC LIMIT ?
+                """,
+                (supplier_id, limit),
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def tender_winner(self, keys=(), tenders=()):
+        """
+        Победитель уже разыгранной закупки или None: по ключу контракта
+        (как у import_awards — "id:<номер>") или по точному названию
+        закупки; из нескольких — последний.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT s.name FROM awards a JOIN suppliers s ON s.id = a.supplier_id
+                WHERE a.key IN (SELECT value FROM json_each(?)) OR a.tender IN (SELECT value FROM json_each(?))
+                ORDER BY a.year DESC, a.id DESC LIMIT 1
+                """,
+                (json.dumps(list(keys)), json.dumps(list(tenders))),
+            ).fetchone()
+        return row["name"] if row else None
+
+    def iter_suppliers(self, batch_size=10000):
+        """(название, БИН) всех поставщиков — порциями, без выборки таблицы целиком."""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, name, bin FROM suppliers WHERE id > ? ORDER BY id LIMIT ?", (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row["name"], row["bin"]
+            last = rows[-1]["id"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("suppliers", "customers", "awards")
+            }